@@ -0,0 +1,308 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from collections import Counter
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Union,
+)
+
+import numpy as np
+from rapidfuzz.distance import Levenshtein
+
+from .columnar import ColumnarTranscript, to_columnar
+
+if TYPE_CHECKING:
+    from cdp_backend.pipeline.transcript_model import Transcript
+
+###############################################################################
+
+# Aligned word id of a reference word the hypothesis dropped
+DELETED = -1
+
+AlignmentInput = Union[str, List[str], "Transcript", Dict[str, Any], ColumnarTranscript]
+
+###############################################################################
+
+
+class HypothesisStats(NamedTuple):
+    # The name the hypothesis was provided under
+    name: str
+    substitutions: int
+    deletions: int
+    insertions: int
+    # Number of words in the reference / hypothesis
+    n_reference_words: int
+    n_hypothesis_words: int
+
+    @property
+    def word_error_rate(self) -> float:
+        """
+        Returns
+        -------
+        float
+            (substitutions + deletions + insertions) / number of reference words
+        """
+        if self.n_reference_words == 0:
+            return 0.0 if self.n_hypothesis_words == 0 else float("inf")
+        n_errors = self.substitutions + self.deletions + self.insertions
+        return n_errors / self.n_reference_words
+
+
+class MultiAlignment(NamedTuple):
+    """
+    Several hypotheses aligned to the same reference, as a word lattice with one
+    column per reference word.
+
+    Words are stored as ids into vocabulary, shared by the reference and every
+    hypothesis, so columns can be compared across hypotheses directly. When the
+    words were normalized before aligning, column and consensus return the first
+    form each normalized word was seen in (the reference's, if it has the word).
+    """
+
+    # Hypothesis names, in the order of the aligned rows
+    names: List[str]
+    # Id to word (normalized)
+    vocabulary: List[str]
+    # Id to the first form the word was seen in, before normalizing
+    surface_forms: List[str]
+    # Word id of each reference word, shape (n_reference_words,)
+    reference: np.ndarray
+    # Word id each hypothesis has in each reference column, DELETED if dropped
+    # Shape (n_hypotheses, n_reference_words)
+    aligned: np.ndarray
+    # Per hypothesis, words inserted before a reference column
+    # (n_reference_words for after the last word)
+    insertions: List[Dict[int, List[int]]]
+    # Per hypothesis error counts, in the order of names
+    stats: List[HypothesisStats]
+
+    @property
+    def n_reference_words(self) -> int:
+        return len(self.reference)
+
+    @property
+    def correct(self) -> np.ndarray:
+        """
+        Returns
+        -------
+        np.ndarray
+            Whether each hypothesis has the reference word in each column.
+            Shape (n_hypotheses, n_reference_words).
+        """
+        return self.aligned == self.reference
+
+    def agreement_positions(self) -> np.ndarray:
+        """
+        Returns
+        -------
+        np.ndarray
+            Reference positions where every hypothesis has the same word
+            (or every hypothesis dropped the word).
+        """
+        if len(self.names) == 0:
+            return np.arange(self.n_reference_words)
+        return np.flatnonzero((self.aligned == self.aligned[0]).all(axis=0))
+
+    def disagreement_positions(self) -> np.ndarray:
+        """
+        Returns
+        -------
+        np.ndarray
+            Reference positions where at least two hypotheses differ.
+        """
+        if len(self.names) == 0:
+            return np.arange(0)
+        return np.flatnonzero((self.aligned != self.aligned[0]).any(axis=0))
+
+    def all_wrong_positions(self) -> np.ndarray:
+        """
+        Returns
+        -------
+        np.ndarray
+            Reference positions that no hypothesis got right.
+        """
+        return np.flatnonzero(~self.correct.any(axis=0))
+
+    def column(self, position: int) -> Dict[str, Optional[str]]:
+        """
+        Parameters
+        ----------
+        position: int
+            The reference position.
+
+        Returns
+        -------
+        Dict[str, Optional[str]]
+            The word each hypothesis has at the position, None if dropped.
+        """
+        return {
+            name: None if word_id == DELETED else self.surface_forms[word_id]
+            for name, word_id in zip(self.names, self.aligned[:, position].tolist())
+        }
+
+    def consensus(self) -> List[str]:
+        """
+        Combine the hypotheses by majority vote in each lattice slot (ROVER).
+
+        Returns
+        -------
+        List[str]
+            The voted word sequence.
+
+        Notes
+        -----
+        A reference column keeps its most common hypothesis word, and is dropped
+        if dropping it is most common. Ties go to the earliest hypothesis.
+        Insertions are kept where more than half of the hypotheses inserted the
+        same words before a column.
+        """
+        n_hypotheses = len(self.names)
+        words: List[str] = []
+        for position in range(self.n_reference_words + 1):
+            inserted = Counter(
+                tuple(hypothesis_insertions[position])
+                for hypothesis_insertions in self.insertions
+                if position in hypothesis_insertions
+            )
+            if len(inserted) > 0:
+                inserted_ids, count = inserted.most_common(1)[0]
+                if count * 2 > n_hypotheses:
+                    words.extend(
+                        self.surface_forms[word_id] for word_id in inserted_ids
+                    )
+
+            if position == self.n_reference_words:
+                break
+
+            if n_hypotheses == 0:
+                words.append(self.surface_forms[self.reference[position]])
+                continue
+
+            word_id, _ = Counter(self.aligned[:, position].tolist()).most_common(1)[0]
+            if word_id != DELETED:
+                words.append(self.surface_forms[word_id])
+
+        return words
+
+
+###############################################################################
+
+
+def _tokens(
+    words: AlignmentInput,
+    word_split_func: Callable[[str], Iterable[str]],
+) -> List[str]:
+    if isinstance(words, str):
+        return list(word_split_func(words))
+    if isinstance(words, list):
+        return words
+    return to_columnar(words).word_text
+
+
+def align_hypotheses(
+    reference: AlignmentInput,
+    hypotheses: Mapping[str, AlignmentInput],
+    word_split_func: Callable[[str], Iterable[str]] = str.split,
+    normalize: Optional[Callable[[str], str]] = None,
+) -> MultiAlignment:
+    """
+    Align several hypotheses against the same reference in one shared word lattice.
+
+    The reference is tokenized and encoded once. Each hypothesis is then aligned
+    to it with a single word level edit distance pass, with no line or per-line
+    word diffs and no text similarity score.
+
+    Parameters
+    ----------
+    reference: Union[str, List[str], Transcript, Dict[str, Any], ColumnarTranscript]
+        The ground truth, as text, a list of words, or a transcript.
+    hypotheses: Mapping[str, Union[str, List[str], Transcript, ...]]
+        The hypotheses to align, by name, e.g. {"gsr": ..., "whisper-base": ...}.
+    word_split_func: Callable[[str], Iterable[str]]
+        Function used to split text into words.
+        Default is str.split()
+    normalize: Optional[Callable[[str], str]]
+        Function applied to every word before aligning, e.g. str.lower.
+        Columns and the consensus keep the words' original form.
+        Default: None (align words as is)
+
+    Returns
+    -------
+    MultiAlignment
+        The word lattice, per hypothesis error counts, and positions where the
+        hypotheses agree or disagree.
+
+    See Also
+    --------
+    whisper_experiments.diff.transcript_differences
+        Full word and sentence level differences of a single pair.
+    """
+    vocabulary: List[str] = []
+    surface_forms: List[str] = []
+    word_ids: Dict[str, int] = {}
+
+    def _encode(words: List[str]) -> List[int]:
+        normalized = words if normalize is None else [normalize(word) for word in words]
+        encoded = []
+        for word, normalized_word in zip(words, normalized):
+            word_id = word_ids.get(normalized_word)
+            if word_id is None:
+                word_id = word_ids[normalized_word] = len(vocabulary)
+                vocabulary.append(normalized_word)
+                surface_forms.append(word)
+            encoded.append(word_id)
+        return encoded
+
+    reference_ids = _encode(_tokens(reference, word_split_func))
+    reference_array = np.asarray(reference_ids, dtype=np.int64)
+    names = list(hypotheses)
+    aligned = np.full((len(names), len(reference_ids)), DELETED, dtype=np.int64)
+    all_insertions = []
+    all_stats = []
+    for row, name in enumerate(names):
+        hypothesis_ids = _encode(_tokens(hypotheses[name], word_split_func))
+        insertions: Dict[int, List[int]] = {}
+        n_insertions = 0
+        for opcode in Levenshtein.opcodes(reference_ids, hypothesis_ids):
+            if opcode.tag in ("equal", "replace"):
+                aligned[row, opcode.src_start : opcode.src_end] = hypothesis_ids[
+                    opcode.dest_start : opcode.dest_end
+                ]
+            elif opcode.tag == "insert":
+                insertions.setdefault(opcode.src_start, []).extend(
+                    hypothesis_ids[opcode.dest_start : opcode.dest_end]
+                )
+                n_insertions += opcode.dest_end - opcode.dest_start
+
+        n_deletions = int((aligned[row] == DELETED).sum())
+        n_correct = int((aligned[row] == reference_array).sum())
+        all_insertions.append(insertions)
+        all_stats.append(
+            HypothesisStats(
+                name=name,
+                substitutions=len(reference_ids) - n_correct - n_deletions,
+                deletions=n_deletions,
+                insertions=n_insertions,
+                n_reference_words=len(reference_ids),
+                n_hypothesis_words=len(hypothesis_ids),
+            )
+        )
+
+    return MultiAlignment(
+        names=names,
+        vocabulary=vocabulary,
+        surface_forms=surface_forms,
+        reference=reference_array,
+        aligned=aligned,
+        insertions=all_insertions,
+        stats=all_stats,
+    )
@@ -0,0 +1,489 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from functools import partial
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Union
+
+import numpy as np
+import pandas as pd
+from rapidfuzz.distance import Levenshtein
+
+from .columnar import ColumnarTranscript, to_columnar
+from .compare import (
+    GROUND_TRUTH_SOURCE,
+    TRANSCRIPT_PATH_SUFFIX,
+    Normalizations,
+    normalize_text,
+    transcript_sources,
+)
+from .serialization import read_transcript_dict
+
+if TYPE_CHECKING:
+    from cdp_backend.pipeline.transcript_model import Transcript
+
+###############################################################################
+
+# Lower bounds of the sentence length and word frequency buckets
+SENTENCE_LENGTH_BINS = [1, 5, 10, 20, 40]
+WORD_FREQUENCY_BINS = [0, 1, 2, 5, 10, 100, 1000]
+
+###############################################################################
+
+
+class Operations:
+    correct = "correct"
+    substitution = "substitution"
+    deletion = "deletion"
+    insertion = "insertion"
+
+
+# In the order of the codes stored in AlignmentFields.operation
+ALL_OPERATIONS = [
+    Operations.correct,
+    Operations.substitution,
+    Operations.deletion,
+    Operations.insertion,
+]
+
+_CORRECT, _SUBSTITUTION, _DELETION, _INSERTION = range(len(ALL_OPERATIONS))
+
+
+class AlignmentFields:
+    id_ = "id"
+    source = "source"
+    # One of Operations
+    operation = "operation"
+    # Position of the word in the reference / hypothesis words
+    # -1 for an inserted / deleted word
+    reference_index = "reference_index"
+    hypothesis_index = "hypothesis_index"
+    # The (normalized) reference word, or the hypothesis word for insertions
+    word = "word"
+    # Start time of the reference word, or the hypothesis word for insertions
+    time = "time"
+    # Confidence of the hypothesis sentence the word is in (or next to)
+    confidence = "confidence"
+    # Number of words in the reference sentence the word is in (or next to)
+    sentence_length = "sentence_length"
+
+
+class Breakdowns:
+    confidence_decile = "confidence_decile"
+    minute = "minute"
+    sentence_length = "sentence_length"
+    word_frequency = "word_frequency"
+
+
+ALL_BREAKDOWNS = [
+    getattr(Breakdowns, attr) for attr in dir(Breakdowns) if "__" not in attr
+]
+
+
+class ErrorRateFields:
+    n_reference_words = "n_reference_words"
+    substitutions = "substitutions"
+    deletions = "deletions"
+    insertions = "insertions"
+    word_error_rate = "word_error_rate"
+
+
+###############################################################################
+
+
+def _nearest(indices: np.ndarray, n: int) -> np.ndarray:
+    # Clip a position that may be one past the end back onto the words
+    return np.clip(indices, 0, max(n - 1, 0))
+
+
+def word_alignment_frame(
+    reference: Union["Transcript", Dict[str, Any], ColumnarTranscript],
+    hypothesis: Union["Transcript", Dict[str, Any], ColumnarTranscript],
+    normalize: Optional[Callable[[str], str]] = None,
+) -> pd.DataFrame:
+    """
+    Align two transcripts word by word and join every aligned slot to the word
+    and sentence columns of both transcripts.
+
+    Parameters
+    ----------
+    reference: Union[Transcript, Dict[str, Any], ColumnarTranscript]
+        The ground truth transcript.
+    hypothesis: Union[Transcript, Dict[str, Any], ColumnarTranscript]
+        The transcript to score, e.g. the GSR transcript.
+    normalize: Optional[Callable[[str], str]]
+        Function applied to each word before aligning, e.g. str.lower.
+        Default: None (align words as is)
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per reference word (correct, substituted, or deleted) followed
+        by one row per inserted hypothesis word. See AlignmentFields.
+
+    Notes
+    -----
+    Deleted words take the confidence of the next hypothesis word, inserted
+    words take the sentence length of the next reference word.
+    Words that normalize to an empty string are left out of the frame, the
+    indices of the other words still point into the full transcripts.
+    """
+    columns_1 = to_columnar(reference)
+    columns_2 = to_columnar(hypothesis)
+    words_1 = columns_1.word_text
+    words_2 = columns_2.word_text
+    # Positions of the aligned words in the transcripts' word columns
+    kept_1 = np.arange(len(words_1))
+    kept_2 = np.arange(len(words_2))
+    if normalize is not None:
+        # Each distinct word is only normalized once, words that normalize to
+        # nothing (e.g. punctuation only) are dropped rather than aligned
+        normalized = {word: normalize(word) for word in {*words_1, *words_2}}
+        kept_1 = np.flatnonzero([normalized[word] != "" for word in words_1])
+        kept_2 = np.flatnonzero([normalized[word] != "" for word in words_2])
+        words_1 = [normalized[words_1[i]] for i in kept_1]
+        words_2 = [normalized[words_2[i]] for i in kept_2]
+    n_1 = len(words_1)
+    n_2 = len(words_2)
+
+    # Only the edits come back from the alignment, everything else is correct
+    editops = Levenshtein.editops(words_1, words_2).as_list()
+    tags = np.asarray([tag for tag, _, _ in editops], dtype=object)
+    positions_1 = np.asarray([src for _, src, _ in editops], dtype=np.int64)
+    positions_2 = np.asarray([dest for _, _, dest in editops], dtype=np.int64)
+    is_replace = tags == "replace"
+    is_delete = tags == "delete"
+    is_insert = tags == "insert"
+
+    operations_1 = np.full(n_1, _CORRECT, dtype=np.int8)
+    operations_1[positions_1[is_replace]] = _SUBSTITUTION
+    operations_1[positions_1[is_delete]] = _DELETION
+
+    # Each reference word lines up with the hypothesis word after shifting by
+    # the insertions at or before it and the deletions before it
+    inserted_before = np.cumsum(np.bincount(positions_1[is_insert], minlength=n_1 + 1))[
+        :n_1
+    ]
+    deleted_before = np.cumsum(np.bincount(positions_1[is_delete], minlength=n_1 + 1))[
+        :n_1
+    ] - (operations_1 == _DELETION)
+    aligned_2 = np.arange(n_1) + inserted_before - deleted_before
+
+    inserted_1 = positions_1[is_insert]
+    inserted_2 = positions_2[is_insert]
+    n_inserted = len(inserted_2)
+
+    # Join each slot to the columns of the word it is in or next to
+    has_1 = n_1 > 0
+    has_2 = n_2 > 0
+    join_1 = (
+        kept_1[_nearest(np.concatenate([np.arange(n_1), inserted_1]), n_1)]
+        if has_1
+        else np.zeros(len(inserted_1), dtype=np.int64)
+    )
+    join_2 = (
+        kept_2[_nearest(np.concatenate([aligned_2, inserted_2]), n_2)]
+        if has_2
+        else np.zeros(n_1, dtype=np.int64)
+    )
+
+    sentence_lengths = np.diff(columns_1.word_offsets)
+    reference_sentence_length = (
+        sentence_lengths[columns_1.word_sentence_index[join_1]]
+        if has_1
+        else np.zeros(len(join_1), dtype=np.int64)
+    )
+    hypothesis_confidence = (
+        columns_2.sentence_confidence[columns_2.word_sentence_index[join_2]]
+        if has_2
+        else np.full(len(join_2), np.nan)
+    )
+    time = np.concatenate(
+        [
+            columns_1.word_start_time[kept_1],
+            columns_2.word_start_time[kept_2[inserted_2]] if has_2 else np.zeros(0),
+        ]
+    )
+    word_text = np.asarray(words_1 + words_2, dtype=object)
+    word = word_text[np.concatenate([np.arange(n_1), n_1 + inserted_2])]
+
+    operation_codes = np.concatenate(
+        [operations_1, np.full(n_inserted, _INSERTION, dtype=np.int8)]
+    )
+    return pd.DataFrame(
+        {
+            AlignmentFields.operation: pd.Categorical.from_codes(
+                operation_codes, categories=ALL_OPERATIONS
+            ),
+            AlignmentFields.reference_index: np.concatenate(
+                [kept_1, np.full(n_inserted, -1)]
+            ),
+            AlignmentFields.hypothesis_index: np.concatenate(
+                [
+                    np.where(operations_1 == _DELETION, -1, join_2[:n_1]),
+                    join_2[n_1:],
+                ]
+            ),
+            AlignmentFields.word: word,
+            AlignmentFields.time: time,
+            AlignmentFields.confidence: hypothesis_confidence,
+            AlignmentFields.sentence_length: reference_sentence_length,
+        }
+    )
+
+
+def _align_session(
+    session_id: str,
+    source: str,
+    reference_path: str,
+    hypothesis_path: str,
+    normalization: str,
+) -> pd.DataFrame:
+    normalize = (
+        None
+        if normalization == Normalizations.none
+        else partial(normalize_text, normalization=normalization)
+    )
+    frame = word_alignment_frame(
+        read_transcript_dict(reference_path),
+        read_transcript_dict(hypothesis_path),
+        normalize=normalize,
+    )
+    frame.insert(0, AlignmentFields.source, source)
+    frame.insert(0, AlignmentFields.id_, session_id)
+    return frame
+
+
+def dataset_alignment_frame(
+    sessions: pd.DataFrame,
+    sources: Optional[List[str]] = None,
+    normalization: str = Normalizations.none,
+) -> pd.DataFrame:
+    """
+    Build the word alignment frame of every transcript source of every session
+    against the session's ground truth.
+
+    Parameters
+    ----------
+    sessions: pd.DataFrame
+        The full dataset, see data.load_cdp_whisper_experiment_data.
+        Transcript path columns must point to local files.
+    sources: Optional[List[str]]
+        The transcript sources to align, e.g. ["gsr"].
+        Default: None (every "{source}_transcript_path" column)
+    normalization: str
+        One of Normalizations, applied to every word of both transcripts.
+        Default: "none"
+
+    Returns
+    -------
+    pd.DataFrame
+        The concatenated word alignment frames, with AlignmentFields.id_ and
+        AlignmentFields.source columns. See word_alignment_frame.
+
+    Raises
+    ------
+    ValueError
+        Unknown source.
+    """
+    from .data import FullDatasetFields
+
+    available = transcript_sources(sessions.columns)
+    if sources is None:
+        sources = list(available)
+    unknown = [source for source in sources if source not in available]
+    if len(unknown) > 0:
+        raise ValueError(
+            f"Unknown transcript sources: {unknown}. Options: {list(available)}"
+        )
+
+    reference_column = f"{GROUND_TRUTH_SOURCE}{TRANSCRIPT_PATH_SUFFIX}"
+    frames = [
+        _align_session(
+            session_id,
+            source,
+            str(reference_path),
+            str(hypothesis_path),
+            normalization,
+        )
+        for session_id, reference_path, *hypothesis_paths in zip(
+            sessions[FullDatasetFields.id_],
+            sessions[reference_column],
+            *(sessions[available[source]] for source in sources),
+        )
+        for source, hypothesis_path in zip(sources, hypothesis_paths)
+    ]
+    if len(frames) == 0:
+        return _empty_dataset_frame()
+
+    frame = pd.concat(frames, ignore_index=True)
+    frame[AlignmentFields.operation] = pd.Categorical(
+        frame[AlignmentFields.operation], categories=ALL_OPERATIONS
+    )
+    return frame
+
+
+def _empty_dataset_frame() -> pd.DataFrame:
+    frame = word_alignment_frame({"sentences": []}, {"sentences": []})
+    frame.insert(0, AlignmentFields.source, pd.Series(dtype=object))
+    frame.insert(0, AlignmentFields.id_, pd.Series(dtype=object))
+    return frame
+
+
+###############################################################################
+
+
+def error_rates(
+    frame: pd.DataFrame, by: Union[str, List[Any], pd.Series]
+) -> pd.DataFrame:
+    """
+    Count errors and compute the word error rate of each group of an alignment
+    frame.
+
+    Parameters
+    ----------
+    frame: pd.DataFrame
+        A word alignment frame, see word_alignment_frame.
+    by: Union[str, List[Any], pd.Series]
+        Anything pd.DataFrame.groupby accepts, e.g. a column name or a series of
+        bucket labels aligned with the frame.
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per group, see ErrorRateFields. The error rate of a group is its
+        errors over its reference words (inf if it has insertions only).
+    """
+    operations = frame[AlignmentFields.operation]
+    counts = pd.DataFrame(
+        {
+            ErrorRateFields.n_reference_words: operations != Operations.insertion,
+            ErrorRateFields.substitutions: operations == Operations.substitution,
+            ErrorRateFields.deletions: operations == Operations.deletion,
+            ErrorRateFields.insertions: operations == Operations.insertion,
+        },
+        index=frame.index,
+    ).astype(np.int64)
+    rates = counts.groupby(by, observed=True).sum()
+
+    n_errors = (
+        rates[ErrorRateFields.substitutions]
+        + rates[ErrorRateFields.deletions]
+        + rates[ErrorRateFields.insertions]
+    )
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rates[ErrorRateFields.word_error_rate] = (
+            n_errors / rates[ErrorRateFields.n_reference_words]
+        ).where(n_errors > 0, 0.0)
+    return rates
+
+
+def _labels(bins: List[int]) -> List[str]:
+    labels = []
+    for low, high in zip(bins, bins[1:]):
+        labels.append(str(low) if high == low + 1 else f"{low}-{high - 1}")
+    labels.append(f"{bins[-1]}+")
+    return labels
+
+
+def _bucket(values: pd.Series, bins: List[int]) -> pd.Series:
+    return pd.cut(
+        values,
+        bins=bins + [np.inf],
+        right=False,
+        labels=_labels(bins),
+    )
+
+
+def breakdown_buckets(frame: pd.DataFrame, breakdown: str) -> pd.Series:
+    """
+    Bucket every row of a word alignment frame for one breakdown.
+
+    Parameters
+    ----------
+    frame: pd.DataFrame
+        A word alignment frame, see word_alignment_frame.
+    breakdown: str
+        One of Breakdowns.
+
+    Returns
+    -------
+    pd.Series
+        The bucket of each row:
+
+        * confidence_decile: the decile of the hypothesis sentence confidence
+          (NaN where the hypothesis has no confidence)
+        * minute: the minute of the meeting the word starts in
+        * sentence_length: the length bucket of the reference sentence
+        * word_frequency: how often the word appears in the reference words
+          of the whole frame
+
+    Raises
+    ------
+    ValueError
+        Unknown breakdown.
+    """
+    if breakdown == Breakdowns.confidence_decile:
+        confidence = frame[AlignmentFields.confidence]
+        if confidence.notna().sum() == 0:
+            return pd.Series(np.nan, index=frame.index, name=breakdown)
+        return pd.qcut(confidence, 10, duplicates="drop").rename(breakdown)
+    if breakdown == Breakdowns.minute:
+        return (frame[AlignmentFields.time] // 60).astype(np.int64).rename(breakdown)
+    if breakdown == Breakdowns.sentence_length:
+        return _bucket(
+            frame[AlignmentFields.sentence_length], SENTENCE_LENGTH_BINS
+        ).rename(breakdown)
+    if breakdown == Breakdowns.word_frequency:
+        words = frame[AlignmentFields.word]
+        is_reference = frame[AlignmentFields.operation] != Operations.insertion
+        frequencies = words[is_reference].value_counts()
+        return _bucket(words.map(frequencies).fillna(0), WORD_FREQUENCY_BINS).rename(
+            breakdown
+        )
+
+    raise ValueError(f"Unknown breakdown: '{breakdown}'. Options: {ALL_BREAKDOWNS}")
+
+
+def error_breakdowns(
+    frame: pd.DataFrame,
+    breakdowns: Optional[List[str]] = None,
+    by_source: bool = True,
+) -> Dict[str, pd.DataFrame]:
+    """
+    Compute error rates bucketed by confidence decile, minute of meeting,
+    sentence length, and word frequency.
+
+    Parameters
+    ----------
+    frame: pd.DataFrame
+        A word alignment frame, see word_alignment_frame and
+        dataset_alignment_frame.
+    breakdowns: Optional[List[str]]
+        The Breakdowns to compute.
+        Default: None (all of them)
+    by_source: bool
+        Whether to also group by AlignmentFields.source, if the frame has it.
+        Default: True
+
+    Returns
+    -------
+    Dict[str, pd.DataFrame]
+        Breakdown name to error rates per bucket, see error_rates.
+
+    Examples
+    --------
+    >>> sessions = data.load_cdp_whisper_experiment_data()
+    ... frame = dataset_alignment_frame(sessions, normalization="basic")
+    ... error_breakdowns(frame)["confidence_decile"]
+    """
+    if breakdowns is None:
+        breakdowns = ALL_BREAKDOWNS
+
+    results = {}
+    for breakdown in breakdowns:
+        by: List[Any] = [breakdown_buckets(frame, breakdown)]
+        if by_source and AlignmentFields.source in frame.columns:
+            by.insert(0, frame[AlignmentFields.source])
+        results[breakdown] = error_rates(frame, by)
+
+    return results
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import zipfile
+from pathlib import Path
+from typing import Iterable, Tuple, Union
+
+###############################################################################
+
+DEFAULT_COMPRESSLEVEL = 6
+
+# Members that are already compressed gain nothing from deflate
+STORED_SUFFIXES = (".gz", ".zst", ".zip", ".parquet")
+
+ArchiveSource = Union[str, Path, bytes]
+
+###############################################################################
+
+
+def _compress_type(arcname: str) -> int:
+    if arcname.endswith(STORED_SUFFIXES):
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+def write_zip_archive(
+    members: Iterable[Tuple[str, ArchiveSource]],
+    archive_path: Union[str, Path],
+    compresslevel: int = DEFAULT_COMPRESSLEVEL,
+) -> Path:
+    """
+    Write a zip archive directly from source files (or in-memory data).
+
+    Parameters
+    ----------
+    members: Iterable[Tuple[str, Union[str, Path, bytes]]]
+        Pairs of archive member name and either the path to the file to store
+        or the data to store. Consumed lazily, one member at a time.
+    archive_path: Union[str, Path]
+        The path to write the archive to.
+    compresslevel: int
+        The deflate compression level (0-9).
+        Members ending in an already compressed suffix are stored as-is.
+        Default: 6
+
+    Returns
+    -------
+    Path
+        The path to the written archive.
+
+    Notes
+    -----
+    Members are written in the order provided. Source files are copied into
+    the archive in chunks rather than read into memory whole. The archive is
+    written to a temporary file next to archive_path and moved into place once
+    complete.
+    """
+    archive_path = Path(archive_path)
+    temp_path = archive_path.with_name(f".{archive_path.name}.tmp")
+    try:
+        with zipfile.ZipFile(
+            temp_path, "w", compresslevel=compresslevel, allowZip64=True
+        ) as archive:
+            for arcname, source in members:
+                if isinstance(source, bytes):
+                    archive.writestr(
+                        arcname, source, compress_type=_compress_type(arcname)
+                    )
+                else:
+                    archive.write(
+                        source, arcname, compress_type=_compress_type(arcname)
+                    )
+
+        os.replace(temp_path, archive_path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+    return archive_path
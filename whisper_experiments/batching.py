@@ -0,0 +1,557 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import pickle
+import queue
+import threading
+import time
+import wave
+from concurrent.futures import Future
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+import numpy as np
+
+from .cache import DiskCache, audio_key, callable_identity
+
+###############################################################################
+
+log = logging.getLogger(__name__)
+
+###############################################################################
+
+# Whisper decodes fixed 30 second windows of 16 kHz audio
+WHISPER_SAMPLE_RATE = 16_000
+WHISPER_WINDOW_SECONDS = 30.0
+# Seconds per Whisper timestamp token
+WHISPER_TIME_PRECISION = 0.02
+
+DEFAULT_MAX_BATCH_SIZE = 8
+DEFAULT_MAX_WAIT_SECONDS = 0.05
+
+###############################################################################
+
+
+class AudioWindow(NamedTuple):
+    session_id: str
+    # Position of the window in its session
+    window_index: int
+    # Offset of the window in the session audio, in seconds
+    start_time: float
+    end_time: float
+    # Mono float32 samples at the decoder's sample rate
+    samples: np.ndarray
+
+
+class DecodedSegment(NamedTuple):
+    # Seconds from the start of the session
+    start_time: float
+    end_time: float
+    text: str
+
+
+class WindowResult(NamedTuple):
+    session_id: str
+    window_index: int
+    start_time: float
+    end_time: float
+    segments: List[DecodedSegment]
+    # The number of windows decoded in the same pass as this one
+    batch_size: int
+
+
+# Decodes a batch of windows in one pass, returning (start, end, text)
+# segments per window with times relative to the window start
+BatchDecoder = Callable[[List[np.ndarray]], List[List[Tuple[float, float, str]]]]
+
+###############################################################################
+
+
+def split_windows(
+    session_id: str,
+    samples: np.ndarray,
+    sample_rate: int = WHISPER_SAMPLE_RATE,
+    window_seconds: float = WHISPER_WINDOW_SECONDS,
+) -> Iterator[AudioWindow]:
+    """
+    Split a session's audio into consecutive fixed length windows.
+
+    Parameters
+    ----------
+    session_id: str
+        The session the audio belongs to.
+    samples: np.ndarray
+        Mono samples of the whole session (or of one chunk of it).
+    sample_rate: int
+        The sample rate of the samples.
+        Default: 16000
+    window_seconds: float
+        The length of each window. The last window may be shorter.
+        Default: 30.0
+
+    Yields
+    ------
+    AudioWindow
+        The windows, in order. Samples are views into the input array.
+    """
+    window_length = int(window_seconds * sample_rate)
+    for window_index, start in enumerate(range(0, len(samples), window_length)):
+        window_samples = samples[start : start + window_length]
+        yield AudioWindow(
+            session_id=session_id,
+            window_index=window_index,
+            start_time=start / sample_rate,
+            end_time=(start + len(window_samples)) / sample_rate,
+            samples=window_samples,
+        )
+
+
+class DynamicBatcher:
+    """
+    Collect audio windows submitted from any number of chunks, sessions, or
+    threads into batches decoded in a single pass.
+
+    A batch is decoded as soon as it holds max_batch_size windows, or once its
+    oldest window has waited max_wait_seconds. Each submitted window gets a
+    future resolving to its own segments, shifted to session timestamps.
+    """
+
+    def __init__(
+        self,
+        decode_batch: BatchDecoder,
+        max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+        max_wait_seconds: float = DEFAULT_MAX_WAIT_SECONDS,
+    ):
+        """
+        Parameters
+        ----------
+        decode_batch: BatchDecoder
+            Decodes a list of windows' samples in one pass, see
+            whisper_batch_decoder.
+        max_batch_size: int
+            The maximum number of windows per pass.
+            Default: 8
+        max_wait_seconds: float
+            The longest a window waits for its batch to fill up.
+            Default: 0.05
+        """
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be at least 1, got {max_batch_size}")
+
+        self.decode_batch = decode_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait_seconds = max_wait_seconds
+        self.n_batches = 0
+        self.n_windows = 0
+        self._queue: "queue.Queue[Optional[Tuple[AudioWindow, Future]]]" = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, window: AudioWindow) -> "Future[WindowResult]":
+        """
+        Queue a window for decoding.
+
+        Parameters
+        ----------
+        window: AudioWindow
+            The window to decode.
+
+        Returns
+        -------
+        Future[WindowResult]
+            Resolves to the window's segments once its batch is decoded, or to
+            the decoder's exception if the batch failed.
+        """
+        if self._closed:
+            raise RuntimeError("Cannot submit to a closed DynamicBatcher")
+
+        future: "Future[WindowResult]" = Future()
+        self._queue.put((window, future))
+        return future
+
+    def _run(self) -> None:
+        done = False
+        while not done:
+            # Block for the first window of a batch, then wait at most
+            # max_wait_seconds after it for the batch to fill up
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = time.monotonic() + self.max_wait_seconds
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    done = True
+                    break
+                batch.append(item)
+
+            self._decode(batch)
+
+    def _decode(self, batch: List[Tuple[AudioWindow, "Future[WindowResult]"]]) -> None:
+        try:
+            decoded = self.decode_batch([window.samples for window, _ in batch])
+            if len(decoded) != len(batch):
+                raise ValueError(
+                    f"Decoder returned {len(decoded)} results for {len(batch)} windows"
+                )
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+
+        self.n_batches += 1
+        self.n_windows += len(batch)
+        for (window, future), segments in zip(batch, decoded):
+            future.set_result(
+                WindowResult(
+                    session_id=window.session_id,
+                    window_index=window.window_index,
+                    start_time=window.start_time,
+                    end_time=window.end_time,
+                    segments=[
+                        DecodedSegment(
+                            start_time=window.start_time + start_time,
+                            end_time=min(window.start_time + end_time, window.end_time),
+                            text=text,
+                        )
+                        for start_time, end_time, text in segments
+                    ],
+                    batch_size=len(batch),
+                )
+            )
+
+    def close(self) -> None:
+        """
+        Decode the windows still queued and stop the batching thread.
+        """
+        if not self._closed:
+            self._closed = True
+            self._queue.put(None)
+            self._thread.join()
+
+    def __enter__(self) -> "DynamicBatcher":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+def transcribe_sessions(
+    sessions_audio: Mapping[str, np.ndarray],
+    decode_batch: BatchDecoder,
+    sample_rate: int = WHISPER_SAMPLE_RATE,
+    window_seconds: float = WHISPER_WINDOW_SECONDS,
+    max_batch_size: int = DEFAULT_MAX_BATCH_SIZE,
+    max_wait_seconds: float = DEFAULT_MAX_WAIT_SECONDS,
+) -> Dict[str, List[DecodedSegment]]:
+    """
+    Decode the audio of several sessions with batches that mix windows from
+    every session.
+
+    Parameters
+    ----------
+    sessions_audio: Mapping[str, np.ndarray]
+        Session id to mono samples of the session.
+    decode_batch: BatchDecoder
+        Decodes a list of windows' samples in one pass, see
+        whisper_batch_decoder.
+    sample_rate: int
+        The sample rate of the samples.
+        Default: 16000
+    window_seconds: float
+        The length of each decoded window.
+        Default: 30.0
+    max_batch_size: int
+        The maximum number of windows per pass.
+        Default: 8
+    max_wait_seconds: float
+        The longest a window waits for its batch to fill up.
+        Default: 0.05
+
+    Returns
+    -------
+    Dict[str, List[DecodedSegment]]
+        Session id to the session's segments in time order, with session
+        timestamps.
+    """
+    segments: Dict[str, List[DecodedSegment]] = {
+        session_id: [] for session_id in sessions_audio
+    }
+    with DynamicBatcher(decode_batch, max_batch_size, max_wait_seconds) as batcher:
+        # Every window is queued up front so batches fill across sessions
+        futures = [
+            batcher.submit(window)
+            for session_id, samples in sessions_audio.items()
+            for window in split_windows(
+                session_id, samples, sample_rate, window_seconds
+            )
+        ]
+
+        # Futures are in window order within each session
+        for future in futures:
+            result = future.result()
+            segments[result.session_id].extend(result.segments)
+
+    log.debug(f"Decoded {batcher.n_windows} windows in {batcher.n_batches} batches")
+    return segments
+
+
+def _window_bytes(samples: np.ndarray) -> bytes:
+    # Hash windows as float32 so equal audio gets equal keys whatever its dtype
+    return np.ascontiguousarray(samples, dtype=np.float32).tobytes()
+
+
+def cached_batch_decoder(decode_batch: BatchDecoder, cache: DiskCache) -> BatchDecoder:
+    """
+    Wrap a batch decoder so that each window's segments are stored on disk and
+    only windows never decoded before reach the decoder.
+
+    Parameters
+    ----------
+    decode_batch: BatchDecoder
+        The decoder to wrap. Its cache key comes from callable_identity, so
+        decoders with settings should provide a `cache_identity` attribute
+        naming the model and every decoding option, see whisper_batch_decoder.
+    cache: DiskCache
+        The cache to store segments in.
+
+    Returns
+    -------
+    BatchDecoder
+        A decoder with the same results and identity as decode_batch.
+        Identical windows in one batch (e.g. silence) are decoded once.
+    """
+    decoder_identity = callable_identity(decode_batch)
+
+    def cached_decode_batch(
+        windows: List[np.ndarray],
+    ) -> List[List[Tuple[float, float, str]]]:
+        keys = [
+            audio_key(_window_bytes(samples), decoder=decoder_identity)
+            for samples in windows
+        ]
+        segments: Dict[str, List[Tuple[float, float, str]]] = {}
+        missing: Dict[str, np.ndarray] = {}
+        for key, samples in zip(keys, windows):
+            if key in segments or key in missing:
+                continue
+            stored = cache.get(key)
+            if stored is None:
+                missing[key] = samples
+            else:
+                segments[key] = pickle.loads(stored)
+
+        if len(missing) > 0:
+            decoded = decode_batch(list(missing.values()))
+            for key, window_segments in zip(missing, decoded):
+                cache.set(
+                    key, pickle.dumps(window_segments, protocol=pickle.HIGHEST_PROTOCOL)
+                )
+                segments[key] = window_segments
+
+        log.debug(f"Decoded {len(missing)} of {len(windows)} windows, rest cached")
+        return [segments[key] for key in keys]
+
+    setattr(cached_decode_batch, "cache_identity", decoder_identity)
+    return cached_decode_batch
+
+
+###############################################################################
+
+
+def _timestamped_segments(
+    tokens: List[int],
+    timestamp_begin: int,
+    decode_tokens: Callable[[List[int]], str],
+    duration: float,
+) -> List[Tuple[float, float, str]]:
+    # Text between a pair of timestamp tokens is one segment,
+    # text with no closing timestamp runs to the end of the window
+    segments = []
+    start_time: Optional[float] = None
+    last_timestamp = 0.0
+    text_tokens: List[int] = []
+    for token in tokens:
+        if token < timestamp_begin:
+            text_tokens.append(token)
+            continue
+
+        last_timestamp = (token - timestamp_begin) * WHISPER_TIME_PRECISION
+        if start_time is None:
+            start_time = last_timestamp
+        else:
+            if len(text_tokens) > 0:
+                segments.append(
+                    (start_time, last_timestamp, decode_tokens(text_tokens).strip())
+                )
+            start_time = None
+            text_tokens = []
+
+    if len(text_tokens) > 0:
+        segments.append(
+            (
+                last_timestamp if start_time is None else start_time,
+                duration,
+                decode_tokens(text_tokens).strip(),
+            )
+        )
+
+    return segments
+
+
+def whisper_batch_decoder(
+    model_name: str = "tiny",
+    device: Optional[str] = None,
+    feature_cache: Optional[DiskCache] = None,
+    **decode_options: Any,
+) -> BatchDecoder:
+    """
+    Load a Whisper model and return a decoder that runs a whole batch of windows
+    through the encoder and decoder in one pass.
+
+    Parameters
+    ----------
+    model_name: str
+        The Whisper model to load, e.g. "tiny", "base", "small".
+        Default: "tiny"
+    device: Optional[str]
+        The torch device to run on.
+        Default: None (CUDA if available, else CPU)
+    feature_cache: Optional[DiskCache]
+        A cache for the encoder output of each window, keyed by the window's
+        audio and the model. Windows found in it skip the encoder, so decoding
+        the same audio with other options only reruns the decoder.
+        Default: None (always run the encoder)
+    decode_options: Any
+        Extra whisper.DecodingOptions, e.g. language="en".
+
+    Returns
+    -------
+    BatchDecoder
+        The batch decoder, to pass to DynamicBatcher, transcribe_sessions, or
+        cached_batch_decoder. Its `cache_identity` names the model, the whisper
+        version, and every decoding option.
+        Windows must be 16 kHz float32 samples of at most 30 seconds.
+    """
+    # Heavy imports, only needed once decoding starts
+    import torch
+    import whisper
+    from whisper.tokenizer import get_tokenizer
+
+    model = whisper.load_model(model_name, device=device)
+    decode_options.setdefault("fp16", model.device.type == "cuda")
+    options = whisper.DecodingOptions(without_timestamps=False, **decode_options)
+    tokenizer = get_tokenizer(
+        model.is_multilingual, language=options.language, task=options.task
+    )
+    model_identity = f"whisper.{model_name}=={whisper.__version__}"
+    feature_dtype = torch.float16 if options.fp16 else torch.float32
+
+    def log_mel(windows: List[np.ndarray]) -> Any:
+        return torch.stack(
+            [
+                whisper.log_mel_spectrogram(
+                    whisper.pad_or_trim(torch.from_numpy(samples.astype(np.float32)))
+                )
+                for samples in windows
+            ]
+        ).to(model.device)
+
+    def audio_features(windows: List[np.ndarray], cache: DiskCache) -> Any:
+        # Encode only the windows without stored features
+        keys = [
+            audio_key(_window_bytes(samples), model=model_identity, stage="encoder")
+            for samples in windows
+        ]
+        features: List[Any] = []
+        missing = []
+        for index, key in enumerate(keys):
+            stored = cache.get(key)
+            if stored is None:
+                missing.append(index)
+                features.append(None)
+            else:
+                features.append(torch.from_numpy(pickle.loads(stored)))
+
+        if len(missing) > 0:
+            mel = log_mel([windows[index] for index in missing])
+            encoded = model.embed_audio(mel.to(feature_dtype))
+            for index, window_features in zip(missing, encoded):
+                features[index] = window_features
+                cache.set(
+                    keys[index],
+                    pickle.dumps(
+                        window_features.cpu().numpy(), protocol=pickle.HIGHEST_PROTOCOL
+                    ),
+                )
+
+        return torch.stack(
+            [
+                window_features.to(device=model.device, dtype=feature_dtype)
+                for window_features in features
+            ]
+        )
+
+    def decode_batch(
+        windows: List[np.ndarray],
+    ) -> List[List[Tuple[float, float, str]]]:
+        with torch.no_grad():
+            # whisper.decode skips the encoder when given encoder output
+            if feature_cache is None:
+                results = whisper.decode(model, log_mel(windows), options)
+            else:
+                results = whisper.decode(
+                    model, audio_features(windows, feature_cache), options
+                )
+
+        return [
+            _timestamped_segments(
+                result.tokens,
+                tokenizer.timestamp_begin,
+                tokenizer.decode,
+                len(samples) / WHISPER_SAMPLE_RATE,
+            )
+            for samples, result in zip(windows, results)
+        ]
+
+    setattr(decode_batch, "cache_identity", f"{model_identity}:{options!r}")
+    return decode_batch
+
+
+def read_wav(path: str) -> np.ndarray:
+    """
+    Read a 16-bit PCM WAV file as mono float32 samples in [-1, 1].
+
+    Parameters
+    ----------
+    path: str
+        The WAV file. It must already be at the decoder's sample rate.
+
+    Returns
+    -------
+    np.ndarray
+        The samples, with channels averaged.
+    """
+    with wave.open(str(path), "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"Only 16-bit WAV files are supported: {path}")
+        n_channels = wav.getnchannels()
+        samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16)
+
+    samples = samples.reshape(-1, n_channels).mean(axis=1)
+    return (samples / 32768.0).astype(np.float32)
@@ -0,0 +1,621 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import importlib.util
+import json
+import logging
+import math
+import platform
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from functools import lru_cache, partial
+from operator import attrgetter
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from . import __version__
+from .align import align_hypotheses
+from .diff import (
+    DiffEngines,
+    text_differences,
+    transcript_differences,
+    word_differences,
+)
+from .fuzzy import fuzzy_word_differences
+from .serialization import (
+    ALL_TRANSCRIPT_FORMATS,
+    TRANSCRIPT_FORMAT_SUFFIXES,
+    TranscriptFormats,
+    read_transcript,
+    read_transcript_dict,
+    write_transcript,
+)
+from .synthetic import generate_transcript_pair, transcript_text
+
+###############################################################################
+
+log = logging.getLogger(__name__)
+
+###############################################################################
+
+DEFAULT_BENCHMARKS_DIR = Path("benchmarks/")
+DEFAULT_HISTORY_PATH = DEFAULT_BENCHMARKS_DIR / "history.jsonl"
+DEFAULT_BASELINE_PATH = DEFAULT_BENCHMARKS_DIR / "baseline.json"
+DEFAULT_SYNTHETIC_MINUTES = (10, 60, 240)
+DEFAULT_SYNTHETIC_SESSIONS = 10_000
+DEFAULT_REPEATS = 3
+
+# Whisper decoding throughput is measured on this much synthetic audio
+BATCHED_DECODE_MINUTES = 4
+BATCHED_DECODE_BATCH_SIZES = (1, 2, 4, 8, 16)
+BATCHED_DECODE_WHISPER_MODEL = "tiny"
+DEFAULT_TIME_TOLERANCE = 0.25
+DEFAULT_MEMORY_TOLERANCE = 0.10
+
+###############################################################################
+
+
+class BenchmarkResult(NamedTuple):
+    # The operation benchmarked, e.g. "text_differences"
+    name: str
+    # The input the operation was benchmarked with, e.g. "session-354368917e5c"
+    case: str
+    # Fastest wall time of all repeats
+    seconds: float
+    # Mean wall time of all repeats
+    mean_seconds: float
+    # Peak traced Python memory allocation of a single (separate) run
+    peak_memory_bytes: int
+    # Number of timed runs
+    repeats: int
+
+    @property
+    def key(self) -> str:
+        """
+        Returns
+        -------
+        str
+            The identifier used to match this result against a baseline.
+        """
+        return f"{self.name}/{self.case}"
+
+
+class Regression(NamedTuple):
+    # The BenchmarkResult.key that regressed
+    key: str
+    # Either "seconds" or "peak_memory_bytes"
+    metric: str
+    baseline: float
+    current: float
+
+    def __str__(self) -> str:
+        change = (self.current - self.baseline) / self.baseline * 100
+        return (
+            f"{self.key} {self.metric}: "
+            f"{self.baseline:.4g} -> {self.current:.4g} (+{change:.1f}%)"
+        )
+
+
+###############################################################################
+
+
+def measure(
+    name: str,
+    case: str,
+    func: Callable[[], Any],
+    repeats: int = DEFAULT_REPEATS,
+) -> BenchmarkResult:
+    """
+    Time a function and record the peak memory it allocates.
+
+    Parameters
+    ----------
+    name: str
+        The operation being benchmarked.
+    case: str
+        The input the operation is benchmarked with.
+    func: Callable[[], Any]
+        A function with all inputs already bound to run.
+    repeats: int
+        The number of timed runs.
+        Default: 3
+
+    Returns
+    -------
+    BenchmarkResult
+        The timing and memory results.
+
+    Notes
+    -----
+    Memory is measured in an extra, untimed run because tracing allocations
+    slows down the traced code.
+    """
+    timings = []
+    for _ in range(repeats):
+        start_time = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start_time)
+
+    tracemalloc.start()
+    try:
+        func()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return BenchmarkResult(
+        name=name,
+        case=case,
+        seconds=min(timings),
+        mean_seconds=sum(timings) / len(timings),
+        peak_memory_bytes=peak_memory,
+        repeats=repeats,
+    )
+
+
+def _transcript_text(transcript_path: Path) -> str:
+    transcript = read_transcript_dict(transcript_path)
+    return "\n".join(sentence["text"] for sentence in transcript["sentences"])
+
+
+# Builds a case's inputs and returns the function to measure
+BenchmarkSetup = Callable[[], Callable[[], Any]]
+# Builds (once) an input shared by several cases
+LazyInput = Callable[[], Any]
+
+
+def _call(func: Callable[..., Any], *inputs: LazyInput, **kwargs: Any) -> Any:
+    return func(*(get_input() for get_input in inputs), **kwargs)
+
+
+def _lazy(func: Callable[..., Any], *inputs: LazyInput, **kwargs: Any) -> LazyInput:
+    # An input built from other inputs by the first case that needs it
+    return lru_cache(maxsize=1)(partial(_call, func, *inputs, **kwargs))
+
+
+def _bind(
+    func: Callable[..., Any], *inputs: LazyInput, **kwargs: Any
+) -> Callable[[], Any]:
+    # Set up a case: build its inputs and bind them to the measured function
+    return partial(func, *(get_input() for get_input in inputs), **kwargs)
+
+
+def _archived_session_ids() -> List[str]:
+    # Read from the archive's table alone, the transcripts are only unpacked
+    # once a session case runs
+    import zipfile
+
+    import pandas as pd
+
+    from .data import ARCHIVED_DATA_PATH, FullDatasetFields
+
+    with zipfile.ZipFile(ARCHIVED_DATA_PATH) as archive:
+        with archive.open("data.parquet") as open_f:
+            sessions = pd.read_parquet(open_f, columns=[FullDatasetFields.id_])
+    return sessions[FullDatasetFields.id_].tolist()
+
+
+def _session_path(sessions: Any, session_id: str, column: str) -> Path:
+    from .data import FullDatasetFields
+
+    return sessions.loc[sessions[FullDatasetFields.id_] == session_id, column].iloc[0]
+
+
+def _iter_benchmarks(
+    synthetic_minutes: Tuple[int, ...],
+    include_sessions: bool,
+    storage_dir: Path,
+) -> Iterator[Tuple[str, str, BenchmarkSetup]]:
+    # Inputs are lazy and only built by the setup of a case that is run, so
+    # filtered out cases cost nothing
+
+    # Diffs on synthetic sessions of increasing length
+    for minutes in synthetic_minutes:
+        pair = _lazy(generate_transcript_pair, duration=minutes * 60)
+        ground_truth = _lazy(attrgetter("ground_truth"), pair)
+        hypothesis = _lazy(attrgetter("hypothesis"), pair)
+        text_1 = _lazy(transcript_text, ground_truth)
+        text_2 = _lazy(transcript_text, hypothesis)
+        words_1, words_2 = _lazy(str.split, text_1), _lazy(str.split, text_2)
+        case = f"synthetic-{minutes}min"
+        yield "text_differences", case, partial(_bind, text_differences, text_1, text_2)
+        yield "text_differences_token", case, partial(
+            _bind, text_differences, text_1, text_2, engine=DiffEngines.token
+        )
+        yield "word_differences", case, partial(
+            _bind, _consume_word_differences, words_1, words_2
+        )
+        yield "fuzzy_word_differences", case, partial(
+            _bind, fuzzy_word_differences, words_1, words_2
+        )
+        yield "transcript_differences", case, partial(
+            _bind, transcript_differences, ground_truth, hypothesis
+        )
+
+    # One reference against several hypotheses
+    for minutes in synthetic_minutes:
+        yield "align_hypotheses", f"synthetic-{minutes}min-3-hypotheses", partial(
+            _bind,
+            align_hypotheses,
+            _lazy(_synthetic_reference, minutes=minutes),
+            _lazy(_synthetic_hypotheses, minutes=minutes),
+        )
+
+    # Whisper decoding throughput against batch size, only with openai-whisper
+    # (and torch) installed. Throughput is the number of windows in the case
+    # name over the measured seconds.
+    if (
+        importlib.util.find_spec("whisper") is not None
+        and importlib.util.find_spec("torch") is not None
+    ):
+        from .batching import WHISPER_WINDOW_SECONDS
+
+        samples = _lazy(_batched_decode_samples, storage_dir=storage_dir)
+        n_windows = math.ceil(BATCHED_DECODE_MINUTES * 60 / WHISPER_WINDOW_SECONDS)
+        for batch_size in BATCHED_DECODE_BATCH_SIZES:
+            yield "whisper_batched_decode", (
+                f"synthetic-{n_windows}-windows-batch-{batch_size}"
+            ), partial(_bind, _batched_decode, samples, batch_size=batch_size)
+
+    # Dataset plumbing on a large sessions table
+    yield "resolve_transcript_paths", (
+        f"synthetic-{DEFAULT_SYNTHETIC_SESSIONS}-sessions"
+    ), partial(
+        _bind,
+        _resolve_transcript_paths,
+        _lazy(_synthetic_sessions, n_sessions=DEFAULT_SYNTHETIC_SESSIONS),
+        root=storage_dir,
+    )
+
+    if not include_sessions:
+        return
+
+    # Archive loading
+    archive_dir = storage_dir / "archive"
+    yield "load_cdp_whisper_experiment_data", "archive", partial(
+        _bind, _load_archive, archive_dir=archive_dir
+    )
+
+    # Parsing and diffs on the real sessions
+    from .data import FullDatasetFields
+
+    sessions = _lazy(_load_archive, archive_dir=archive_dir)
+    for session_id in _archived_session_ids():
+        case = f"session-{session_id}"
+        gt_path = _lazy(
+            _session_path,
+            sessions,
+            session_id=session_id,
+            column=FullDatasetFields.ground_truth_transcript_path,
+        )
+        gsr_path = _lazy(
+            _session_path,
+            sessions,
+            session_id=session_id,
+            column=FullDatasetFields.gsr_transcript_path,
+        )
+        yield "parse_transcript", case, partial(_bind, _parse_transcript, gsr_path)
+
+        # Writing and reading each storage format
+        gsr_transcript = _lazy(read_transcript, gsr_path)
+        for transcript_format in ALL_TRANSCRIPT_FORMATS:
+            # zstd is optional
+            if (
+                transcript_format == TranscriptFormats.zstd
+                and importlib.util.find_spec("zstandard") is None
+            ):
+                continue
+
+            format_path = storage_dir / (
+                f"{session_id}{TRANSCRIPT_FORMAT_SUFFIXES[transcript_format]}"
+            )
+            format_case = f"{case}-{transcript_format}"
+            yield "write_transcript", format_case, partial(
+                _bind,
+                write_transcript,
+                gsr_transcript,
+                path=format_path,
+                transcript_format=transcript_format,
+            )
+            yield "read_transcript", format_case, partial(
+                _bind,
+                read_transcript,
+                _lazy(
+                    write_transcript,
+                    gsr_transcript,
+                    path=format_path,
+                    transcript_format=transcript_format,
+                ),
+            )
+
+        yield "text_differences", case, partial(
+            _bind,
+            text_differences,
+            _lazy(_transcript_text, gt_path),
+            _lazy(_transcript_text, gsr_path),
+        )
+        yield "transcript_differences", case, partial(
+            _bind,
+            transcript_differences,
+            _lazy(read_transcript_dict, gt_path),
+            _lazy(read_transcript_dict, gsr_path),
+        )
+
+
+def _synthetic_reference(minutes: int) -> Dict[str, Any]:
+    return generate_transcript_pair(duration=minutes * 60).ground_truth
+
+
+def _synthetic_hypotheses(minutes: int) -> Dict[str, Dict[str, Any]]:
+    return {
+        f"substitution-rate-{rate}": generate_transcript_pair(
+            duration=minutes * 60, substitution_rate=rate
+        ).hypothesis
+        for rate in (0.02, 0.05, 0.1)
+    }
+
+
+def _batched_decode_samples(storage_dir: Path) -> Any:
+    from .batching import read_wav
+
+    pair = generate_transcript_pair(
+        duration=BATCHED_DECODE_MINUTES * 60,
+        audio_path=storage_dir / "batched-decode.wav",
+    )
+    return read_wav(str(pair.audio_path))
+
+
+def _synthetic_sessions(n_sessions: int) -> Any:
+    import pandas as pd
+
+    from .data import FullDatasetFields
+
+    session_ids = [f"{i:012x}" for i in range(n_sessions)]
+    return pd.DataFrame(
+        {
+            FullDatasetFields.id_: session_ids,
+            FullDatasetFields.ground_truth_transcript_path: [
+                f"{session_id}/ground-truth.json" for session_id in session_ids
+            ],
+            FullDatasetFields.gsr_transcript_path: [
+                f"{session_id}/gsr.json.gz" for session_id in session_ids
+            ],
+        }
+    )
+
+
+def _resolve_transcript_paths(sessions: Any, root: Path) -> Any:
+    from .data import _resolve_transcript_paths
+
+    return _resolve_transcript_paths(sessions.copy(), root)
+
+
+def _load_archive(archive_dir: Path) -> Any:
+    from .data import load_cdp_whisper_experiment_data
+
+    return load_cdp_whisper_experiment_data(storage_dir=archive_dir)
+
+
+def _consume_word_differences(words_1: List[str], words_2: List[str]) -> None:
+    for _ in word_differences(words_1, words_2):
+        pass
+
+
+@lru_cache(maxsize=1)
+def _whisper_decoder(model_name: str) -> Any:
+    # Loaded on first use so filtered out runs don't download a model
+    from .batching import whisper_batch_decoder
+
+    return whisper_batch_decoder(model_name)
+
+
+def _batched_decode(samples: Any, batch_size: int) -> Any:
+    from .batching import transcribe_sessions
+
+    return transcribe_sessions(
+        {"synthetic": samples},
+        _whisper_decoder(BATCHED_DECODE_WHISPER_MODEL),
+        max_batch_size=batch_size,
+    )
+
+
+def _parse_transcript(path: Path) -> Any:
+    # Heavy import only needed for archive benchmarks
+    from cdp_backend.pipeline.transcript_model import Transcript
+
+    # Decoded like any stored format, then parsed by the model itself
+    # (read_transcript is the fast path)
+    return Transcript.from_dict(read_transcript_dict(path))
+
+
+def run_benchmarks(
+    repeats: int = DEFAULT_REPEATS,
+    synthetic_minutes: Tuple[int, ...] = DEFAULT_SYNTHETIC_MINUTES,
+    include_sessions: bool = True,
+    name_filter: Optional[str] = None,
+) -> List[BenchmarkResult]:
+    """
+    Run the benchmark suite for the diff and data loading hot paths.
+
+    Parameters
+    ----------
+    repeats: int
+        The number of timed runs per benchmark.
+        Default: 3
+    synthetic_minutes: Tuple[int, ...]
+        The session lengths (in minutes) to generate for the synthetic benchmarks.
+        Default: (10, 60, 240)
+    include_sessions: bool
+        Whether to run the benchmarks that use the bundled archive sessions.
+        Default: True
+    name_filter: Optional[str]
+        Only run benchmarks whose key (name/case) contains this string.
+        Default: None (run all)
+
+    Returns
+    -------
+    List[BenchmarkResult]
+        The result of every benchmark run.
+    """
+    results = []
+    storage_dir = Path(tempfile.mkdtemp(prefix="whisper-experiments-benchmarks-"))
+    try:
+        for name, case, setup in _iter_benchmarks(
+            synthetic_minutes, include_sessions, storage_dir
+        ):
+            # Checked before setup, so filtered out cases build no inputs
+            if name_filter is not None and name_filter not in f"{name}/{case}":
+                continue
+
+            log.info(f"Running benchmark: {name}/{case}")
+            results.append(measure(name, case, setup(), repeats=repeats))
+    finally:
+        shutil.rmtree(storage_dir)
+
+    return results
+
+
+###############################################################################
+
+
+def append_history(
+    results: List[BenchmarkResult],
+    history_path: Path = DEFAULT_HISTORY_PATH,
+) -> Path:
+    """
+    Append a benchmark run to the JSON Lines history file.
+
+    Parameters
+    ----------
+    results: List[BenchmarkResult]
+        The results of the run.
+    history_path: Path
+        The path to the history file.
+        Default: benchmarks/history.jsonl
+
+    Returns
+    -------
+    Path
+        The path to the history file.
+    """
+    history_path.parent.mkdir(parents=True, exist_ok=True)
+    record = {
+        "timestamp": datetime.utcnow().isoformat(),
+        "version": __version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": [result._asdict() for result in results],
+    }
+    with open(history_path, "a") as open_f:
+        open_f.write(json.dumps(record) + "\n")
+
+    return history_path
+
+
+def load_history(history_path: Path = DEFAULT_HISTORY_PATH) -> List[Dict[str, Any]]:
+    """
+    Load every benchmark run stored in the history file.
+
+    Parameters
+    ----------
+    history_path: Path
+        The path to the history file.
+        Default: benchmarks/history.jsonl
+
+    Returns
+    -------
+    List[Dict[str, Any]]
+        The stored runs, oldest first.
+    """
+    with open(history_path, "r") as open_f:
+        return [json.loads(line) for line in open_f if line.strip()]
+
+
+def save_baseline(
+    results: List[BenchmarkResult],
+    baseline_path: Path = DEFAULT_BASELINE_PATH,
+) -> Path:
+    """
+    Store benchmark results as the baseline to compare future runs against.
+
+    Parameters
+    ----------
+    results: List[BenchmarkResult]
+        The results to store.
+    baseline_path: Path
+        The path to store the baseline to.
+        Default: benchmarks/baseline.json
+
+    Returns
+    -------
+    Path
+        The path to the baseline file.
+    """
+    baseline_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(baseline_path, "w") as open_f:
+        json.dump(
+            {result.key: result._asdict() for result in results},
+            open_f,
+            indent=4,
+        )
+
+    return baseline_path
+
+
+def find_regressions(
+    results: List[BenchmarkResult],
+    baseline_path: Path = DEFAULT_BASELINE_PATH,
+    time_tolerance: float = DEFAULT_TIME_TOLERANCE,
+    memory_tolerance: float = DEFAULT_MEMORY_TOLERANCE,
+) -> List[Regression]:
+    """
+    Compare benchmark results against the stored baseline.
+
+    Parameters
+    ----------
+    results: List[BenchmarkResult]
+        The results to check.
+    baseline_path: Path
+        The path to the stored baseline.
+        Default: benchmarks/baseline.json
+    time_tolerance: float
+        Allowed fractional slow down before a result is flagged.
+        Default: 0.25
+    memory_tolerance: float
+        Allowed fractional peak memory increase before a result is flagged.
+        Default: 0.10
+
+    Returns
+    -------
+    List[Regression]
+        Every metric that regressed beyond its tolerance.
+        Results without a baseline entry are skipped.
+    """
+    with open(baseline_path, "r") as open_f:
+        baseline = json.load(open_f)
+
+    regressions = []
+    for result in results:
+        if result.key not in baseline:
+            continue
+
+        for metric, tolerance in (
+            ("seconds", time_tolerance),
+            ("peak_memory_bytes", memory_tolerance),
+        ):
+            baseline_value = baseline[result.key][metric]
+            current_value = getattr(result, metric)
+            if baseline_value > 0 and current_value > baseline_value * (1 + tolerance):
+                regressions.append(
+                    Regression(
+                        key=result.key,
+                        metric=metric,
+                        baseline=baseline_value,
+                        current=current_value,
+                    )
+                )
+
+    return regressions
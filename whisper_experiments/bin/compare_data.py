@@ -0,0 +1,184 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import sys
+import traceback
+from pathlib import Path
+
+from whisper_experiments.compare import ALL_NORMALIZATIONS, Normalizations
+from whisper_experiments.diff import ALL_DIFF_ENGINES, DiffEngines
+
+###############################################################################
+
+log = logging.getLogger(__name__)
+
+###############################################################################
+
+
+class Args(argparse.Namespace):
+    def __init__(self) -> None:
+        self.__parse()
+
+    def __parse(self) -> None:
+        p = argparse.ArgumentParser(
+            prog="compare_cdp_whisper_experiments_data",
+            description=(
+                "Compare every transcript source of every session against the "
+                "ground truth, streaming per session metrics and per line "
+                "differences to disk."
+            ),
+        )
+        p.add_argument(
+            "--data-dir",
+            type=Path,
+            default=None,
+            help=(
+                "An unpacked or generated data directory (holding data.parquet) "
+                "to compare. Default: unpack and compare the packaged archive."
+            ),
+        )
+        p.add_argument(
+            "--storage-dir",
+            type=Path,
+            default=Path("cdp-whisper-experiments-data/"),
+            help=(
+                "Where to unpack the packaged archive when no --data-dir is "
+                "provided. Emptied before unpacking."
+            ),
+        )
+        p.add_argument(
+            "-o",
+            "--output-dir",
+            type=Path,
+            default=Path("cdp-whisper-experiments-comparisons/"),
+            help="The directory to write the metrics and diffs to.",
+        )
+        p.add_argument(
+            "--metrics-format",
+            choices=["parquet", "csv"],
+            default="parquet",
+            help="The file format to write the per session metrics in.",
+        )
+        p.add_argument(
+            "--no-diffs",
+            action="store_true",
+            help="Only write the metrics, not the per line differences.",
+        )
+        p.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            default=None,
+            help="The number of worker processes. Default: the number of CPUs.",
+        )
+        p.add_argument(
+            "--engine",
+            choices=ALL_DIFF_ENGINES,
+            default=DiffEngines.token,
+            help="The line diff engine, see whisper_experiments.diff.DiffEngines.",
+        )
+        p.add_argument(
+            "--normalization",
+            choices=ALL_NORMALIZATIONS,
+            default=Normalizations.none,
+            help=(
+                "Normalize both transcripts before comparing, 'basic' lowercases "
+                "and strips punctuation."
+            ),
+        )
+        p.add_argument(
+            "-s",
+            "--session",
+            dest="session_ids",
+            action="append",
+            default=None,
+            help=(
+                "A session id to compare. May be provided multiple times. "
+                "Default: every session."
+            ),
+        )
+        p.add_argument(
+            "--source",
+            dest="sources",
+            action="append",
+            default=None,
+            help=(
+                "A transcript source to compare, e.g. 'gsr'. May be provided "
+                "multiple times. Default: every source."
+            ),
+        )
+        p.add_argument(
+            "--debug",
+            action="store_true",
+            help="Run with debug logging",
+        )
+        p.parse_args(namespace=self)
+
+
+###############################################################################
+
+
+def _compare_data(args: Args) -> None:
+    # Imported here so that argument parsing (and --help) doesn't pay
+    # for pandas and pyarrow imports
+    from whisper_experiments import compare, data
+
+    if args.data_dir is not None:
+        sessions = data.load_unpacked_data(args.data_dir)
+    else:
+        sessions = data.load_cdp_whisper_experiment_data(storage_dir=args.storage_dir)
+
+    metrics_path = args.output_dir / f"metrics.{args.metrics_format}"
+    diffs_path = None if args.no_diffs else args.output_dir / "diffs.jsonl"
+    metrics = compare.compare_sessions(
+        sessions,
+        metrics_path=metrics_path,
+        diffs_path=diffs_path,
+        engine=args.engine,
+        normalization=args.normalization,
+        sources=args.sources,
+        session_ids=args.session_ids,
+        max_workers=args.workers,
+    )
+    log.info(f"Stored metrics for {len(metrics)} comparisons to: {metrics_path}")
+    if diffs_path is not None:
+        log.info(f"Stored line differences to: {diffs_path}")
+
+    summary = metrics.groupby(compare.MetricsFields.source)[
+        compare.MetricsFields.word_error_rate
+    ].describe()
+    log.info(f"Word error rate by source:\n{summary}")
+
+
+def main() -> None:
+    try:
+        args = Args()
+
+        # Handle logging
+        if args.debug:
+            log_level = logging.DEBUG
+        else:
+            log_level = logging.INFO
+
+        logging.basicConfig(
+            level=log_level,
+            format="[%(levelname)4s: %(module)s:%(lineno)4s %(asctime)s] %(message)s",
+        )
+
+        # Run
+        _compare_data(args)
+
+    except Exception as e:
+        log.error("=============================================")
+        log.error("\n\n" + traceback.format_exc())
+        log.error("=============================================")
+        log.error("\n\n" + str(e) + "\n")
+        log.error("=============================================")
+        sys.exit(1)
+
+
+# Allow running this file as a standalone
+if __name__ == "__main__":
+    main()
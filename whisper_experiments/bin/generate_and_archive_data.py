@@ -6,8 +6,7 @@ import logging
 import sys
 import traceback
 from pathlib import Path
-
-from whisper_experiments import data, model
+from typing import List, Optional
 
 ###############################################################################
 
@@ -42,6 +41,52 @@ class Args(argparse.Namespace):
             action="store_true",
             help="Pull and generate comparison transcripts for only five sessions.",
         )
+        p.add_argument(
+            "-i",
+            "--instance",
+            dest="instances",
+            action="append",
+            default=None,
+            help=(
+                "A CDP infrastructure slug to pull sessions from. "
+                "May be provided multiple times to pull from many instances. "
+                "Default: the Seattle instance."
+            ),
+        )
+        p.add_argument(
+            "--start-datetime",
+            type=str,
+            default="2020-08-01",
+            help="The start of the range to pull sessions from for each instance.",
+        )
+        p.add_argument(
+            "--end-datetime",
+            type=str,
+            default="2020-11-01",
+            help=(
+                "The end of the range to pull sessions from for each instance. "
+                "Ignored if --test is provided without any --instance."
+            ),
+        )
+        p.add_argument(
+            "--snapshot-dir",
+            type=Path,
+            default=None,
+            help=(
+                "Local snapshot directory to read sessions and ground truth "
+                "transcripts from. Only sessions missing from the snapshot are "
+                "pulled from the CDP instance."
+            ),
+        )
+        p.add_argument(
+            "--object-store-dir",
+            type=Path,
+            default=None,
+            help=(
+                "Content-addressed store to commit this run to as a new version. "
+                "Only transcripts that changed since previous versions are written."
+            ),
+        )
         p.add_argument(
             "--debug",
             action="store_true",
@@ -56,10 +101,31 @@ class Args(argparse.Namespace):
 def _generate_and_archive_data(
     test: bool,
     credentials_path: str,
+    snapshot_dir: Optional[Path] = None,
+    instances: Optional[List[str]] = None,
+    start_datetime: str = "2020-08-01",
+    end_datetime: str = "2020-11-01",
+    object_store_dir: Optional[Path] = None,
 ) -> Path:
+    # Imported here so that argument parsing (and --help) doesn't pay
+    # for pandas, cdp_data, and the speech recognition model imports
+    from whisper_experiments import data, model
+    from whisper_experiments.snapshot import InstanceRange, SessionSnapshot
+
     # Pull basic dataset and transcripts
     log.info("Pulling sessions and ground truth transcripts.")
-    sessions = data.get_ground_truth_dataset(test=test)
+    snapshot = SessionSnapshot(snapshot_dir) if snapshot_dir is not None else None
+    instance_ranges = None
+    if instances is not None:
+        instance_ranges = [
+            InstanceRange(instance, start_datetime, end_datetime)
+            for instance in instances
+        ]
+    sessions = data.get_ground_truth_dataset(
+        test=test,
+        snapshot=snapshot,
+        instance_ranges=instance_ranges,
+    )
 
     # Fill dataset with google generated transcripts
     log.info("Generating Google Speech Recognition transcripts.")
@@ -71,6 +137,15 @@ def _generate_and_archive_data(
     # TODO: add Whisper
 
     # Create archive
+    if object_store_dir is not None:
+        from whisper_experiments.object_store import ObjectStore
+
+        log.info("Committing new version to object store.")
+        store = ObjectStore(object_store_dir)
+        version = store.commit(sessions)
+        log.info("Creating and storing data archive.")
+        return store.export_archive(version.version)
+
     log.info("Creating and storing data archive.")
     return data._archive_dataset(sessions)
 
@@ -94,6 +169,11 @@ def main() -> None:
         _generate_and_archive_data(
             test=args.test,
             credentials_path=args.credentials_path,
+            snapshot_dir=args.snapshot_dir,
+            instances=args.instances,
+            start_datetime=args.start_datetime,
+            end_datetime=args.end_datetime,
+            object_store_dir=args.object_store_dir,
         )
 
     except Exception as e:
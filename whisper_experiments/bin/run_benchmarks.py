@@ -0,0 +1,167 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import sys
+import traceback
+from pathlib import Path
+
+from whisper_experiments import benchmarks
+
+###############################################################################
+
+log = logging.getLogger(__name__)
+
+###############################################################################
+
+
+class Args(argparse.Namespace):
+    def __init__(self) -> None:
+        self.__parse()
+
+    def __parse(self) -> None:
+        p = argparse.ArgumentParser(
+            prog="run_cdp_whisper_experiments_benchmarks",
+            description=(
+                "Benchmark the diff and data loading hot paths, store the results "
+                "to the benchmark history, and check for regressions against "
+                "the stored baseline."
+            ),
+        )
+        p.add_argument(
+            "-r",
+            "--repeats",
+            type=int,
+            default=benchmarks.DEFAULT_REPEATS,
+            help="The number of timed runs per benchmark.",
+        )
+        p.add_argument(
+            "-f",
+            "--filter",
+            dest="name_filter",
+            type=str,
+            default=None,
+            help="Only run benchmarks whose name/case contains this string.",
+        )
+        p.add_argument(
+            "--synthetic-minutes",
+            type=int,
+            nargs="+",
+            default=list(benchmarks.DEFAULT_SYNTHETIC_MINUTES),
+            help="The session lengths (in minutes) of the synthetic benchmarks.",
+        )
+        p.add_argument(
+            "--no-sessions",
+            action="store_true",
+            help="Skip the benchmarks that use the bundled archive sessions.",
+        )
+        p.add_argument(
+            "--history-path",
+            type=Path,
+            default=benchmarks.DEFAULT_HISTORY_PATH,
+            help="The JSON Lines file to append the results to.",
+        )
+        p.add_argument(
+            "--baseline-path",
+            type=Path,
+            default=benchmarks.DEFAULT_BASELINE_PATH,
+            help="The stored baseline to check for regressions against.",
+        )
+        p.add_argument(
+            "--save-baseline",
+            action="store_true",
+            help="Store the results of this run as the new baseline.",
+        )
+        p.add_argument(
+            "--time-tolerance",
+            type=float,
+            default=benchmarks.DEFAULT_TIME_TOLERANCE,
+            help="Allowed fractional slow down before a benchmark is flagged.",
+        )
+        p.add_argument(
+            "--memory-tolerance",
+            type=float,
+            default=benchmarks.DEFAULT_MEMORY_TOLERANCE,
+            help="Allowed fractional peak memory increase before flagging a benchmark.",
+        )
+        p.add_argument(
+            "--debug",
+            action="store_true",
+            help="Run with debug logging",
+        )
+        p.parse_args(namespace=self)
+
+
+###############################################################################
+
+
+def main() -> None:
+    try:
+        args = Args()
+
+        # Handle logging
+        if args.debug:
+            log_level = logging.DEBUG
+        else:
+            log_level = logging.INFO
+
+        logging.basicConfig(
+            level=log_level,
+            format="[%(levelname)4s: %(module)s:%(lineno)4s %(asctime)s] %(message)s",
+        )
+
+        # Run
+        results = benchmarks.run_benchmarks(
+            repeats=args.repeats,
+            synthetic_minutes=tuple(args.synthetic_minutes),
+            include_sessions=not args.no_sessions,
+            name_filter=args.name_filter,
+        )
+        for result in results:
+            log.info(
+                f"{result.key}: {result.seconds:.4f}s "
+                f"(peak memory: {result.peak_memory_bytes / 1024**2:.1f} MiB)"
+            )
+
+        # Store
+        history_path = benchmarks.append_history(results, args.history_path)
+        log.info(f"Stored results to: {history_path}")
+        if args.save_baseline:
+            baseline_path = benchmarks.save_baseline(results, args.baseline_path)
+            log.info(f"Stored baseline to: {baseline_path}")
+            return
+
+        # Check
+        if not args.baseline_path.exists():
+            log.warning(
+                f"No baseline found at {args.baseline_path}, "
+                f"run with --save-baseline to create one."
+            )
+            return
+
+        regressions = benchmarks.find_regressions(
+            results,
+            args.baseline_path,
+            time_tolerance=args.time_tolerance,
+            memory_tolerance=args.memory_tolerance,
+        )
+        for regression in regressions:
+            log.error(f"Regression: {regression}")
+        if len(regressions) > 0:
+            sys.exit(1)
+
+        log.info("No regressions found.")
+
+    except Exception as e:
+        log.error("=============================================")
+        log.error("\n\n" + traceback.format_exc())
+        log.error("=============================================")
+        log.error("\n\n" + str(e) + "\n")
+        log.error("=============================================")
+        sys.exit(1)
+
+
+# Allow running this file as a standalone
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import argparse
+import logging
+import sys
+import traceback
+from functools import partial
+from pathlib import Path
+
+###############################################################################
+
+log = logging.getLogger(__name__)
+
+###############################################################################
+
+
+class Args(argparse.Namespace):
+    def __init__(self) -> None:
+        self.__parse()
+
+    def __parse(self) -> None:
+        p = argparse.ArgumentParser(
+            prog="run_cdp_whisper_experiments_generation_queue",
+            description=(
+                "Generate the comparison transcripts with any number of workers "
+                "sharing a queue directory, then merge the results into the "
+                "data archive."
+            ),
+        )
+        p.add_argument(
+            "--debug",
+            action="store_true",
+            help="Run with debug logging",
+        )
+        subparsers = p.add_subparsers(dest="command", required=True)
+
+        # Enqueue
+        enqueue = subparsers.add_parser(
+            "enqueue",
+            help="Pull the ground truth data and add a task for every session.",
+        )
+        enqueue.add_argument(
+            "queue_dir",
+            type=Path,
+            help="The shared directory to store the queue, sessions, and results.",
+        )
+        enqueue.add_argument(
+            "-t",
+            "--test",
+            action="store_true",
+            help="Enqueue only five sessions.",
+        )
+        enqueue.add_argument(
+            "--snapshot-dir",
+            type=Path,
+            default=None,
+            help=(
+                "Local snapshot directory to read sessions and ground truth "
+                "transcripts from."
+            ),
+        )
+
+        # Work
+        work = subparsers.add_parser(
+            "work",
+            help="Claim and transcribe sessions until the queue is finished.",
+        )
+        work.add_argument(
+            "queue_dir",
+            type=Path,
+            help="The shared queue directory.",
+        )
+        work.add_argument(
+            "credentials_path",
+            type=str,
+            help=(
+                "The path to the Google Service Account Credentials JSON for "
+                "the processing account / project."
+            ),
+        )
+        work.add_argument(
+            "--worker-id",
+            type=str,
+            default=None,
+            help="The id to claim tasks with. Default: {host}-{pid}-{random}",
+        )
+        work.add_argument(
+            "--lease-seconds",
+            type=float,
+            default=300.0,
+            help="How long a claim or heartbeat holds a task.",
+        )
+        work.add_argument(
+            "--max-tasks",
+            type=int,
+            default=None,
+            help="Stop after processing this many tasks.",
+        )
+
+        # Merge
+        merge = subparsers.add_parser(
+            "merge",
+            help="Combine the completed results into the data archive.",
+        )
+        merge.add_argument(
+            "queue_dir",
+            type=Path,
+            help="The shared queue directory.",
+        )
+        merge.add_argument(
+            "--archive-name",
+            type=Path,
+            default=None,
+            help=(
+                "The path to store the archive to (without the .zip suffix). "
+                "Default: the packaged archive path"
+            ),
+        )
+        merge.add_argument(
+            "--allow-partial",
+            action="store_true",
+            help="Archive the completed sessions even if some tasks are not done.",
+        )
+        p.parse_args(namespace=self)
+
+
+###############################################################################
+
+
+def _run_generation_queue(args: Args) -> None:
+    # Imported here so that argument parsing (and --help) doesn't pay
+    # for pandas, cdp_data, and the speech recognition model imports
+    from whisper_experiments import generation, work_queue
+
+    if args.command == "enqueue":
+        from whisper_experiments import data
+        from whisper_experiments.snapshot import SessionSnapshot
+
+        snapshot = (
+            SessionSnapshot(args.snapshot_dir)
+            if args.snapshot_dir is not None
+            else None
+        )
+        sessions = data.get_ground_truth_dataset(test=args.test, snapshot=snapshot)
+        n_added = generation.enqueue_generation(sessions, args.queue_dir)
+        log.info(f"Added {n_added} sessions to the queue.")
+
+    elif args.command == "work":
+        completed = work_queue.run_worker(
+            generation.queue_db_path(args.queue_dir),
+            handler=partial(
+                generation.gsr_transcribe_task,
+                queue_dir=args.queue_dir,
+                credentials_file=args.credentials_path,
+            ),
+            worker_id=args.worker_id,
+            lease_seconds=args.lease_seconds,
+            max_tasks=args.max_tasks,
+        )
+        log.info(f"Completed {len(completed)} sessions.")
+
+    else:
+        merge_kwargs = {}
+        if args.archive_name is not None:
+            merge_kwargs["archive_name"] = args.archive_name
+        archive_path = generation.merge_generation(
+            args.queue_dir,
+            allow_partial=args.allow_partial,
+            **merge_kwargs,
+        )
+        log.info(f"Stored archive to: {archive_path}")
+
+
+def main() -> None:
+    try:
+        args = Args()
+
+        # Handle logging
+        if args.debug:
+            log_level = logging.DEBUG
+        else:
+            log_level = logging.INFO
+
+        logging.basicConfig(
+            level=log_level,
+            format="[%(levelname)4s: %(module)s:%(lineno)4s %(asctime)s] %(message)s",
+        )
+
+        # Run
+        _run_generation_queue(args)
+
+    except Exception as e:
+        log.error("=============================================")
+        log.error("\n\n" + traceback.format_exc())
+        log.error("=============================================")
+        log.error("\n\n" + str(e) + "\n")
+        log.error("=============================================")
+        sys.exit(1)
+
+
+# Allow running this file as a standalone
+if __name__ == "__main__":
+    main()
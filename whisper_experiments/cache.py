@@ -0,0 +1,420 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import functools
+import hashlib
+import sqlite3
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, NamedTuple, Optional, Union
+
+###############################################################################
+
+DEFAULT_CACHE_DIR = Path(".whisper-experiments-cache/")
+DEFAULT_MAX_SIZE_BYTES = 2 * 1024**3
+
+# Bump to invalidate every stored entry when the stored format changes
+CACHE_FORMAT_VERSION = 1
+
+# Lookups recorded in memory before their hit / miss counts and access times are
+# written to the database
+DEFAULT_ACCESS_BATCH_SIZE = 256
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access);
+CREATE TABLE IF NOT EXISTS stats (
+    name TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+INSERT OR IGNORE INTO stats (name, value) VALUES
+    ('hits', 0), ('misses', 0), ('evictions', 0), ('size_bytes', 0);
+"""
+
+###############################################################################
+
+
+class CacheStats(NamedTuple):
+    # Number of lookups that found a stored value
+    hits: int
+    # Number of lookups that did not find a stored value
+    misses: int
+    # Number of entries removed to stay under the size cap
+    evictions: int
+    # Number of entries currently stored
+    n_entries: int
+    # Total size of the currently stored values
+    size_bytes: int
+
+    @property
+    def hit_rate(self) -> float:
+        """
+        Returns
+        -------
+        float
+            The fraction of lookups that were hits. 0 if there were no lookups.
+        """
+        n_lookups = self.hits + self.misses
+        if n_lookups == 0:
+            return 0.0
+        return self.hits / n_lookups
+
+
+class DiskCache:
+    """
+    A size-capped on-disk key-value store with least-recently-used eviction.
+
+    Backed by a single SQLite database so that multiple processes (and threads,
+    each with their own DiskCache object) can safely share the same cache directory.
+    Hit and miss counts are stored alongside the data and shared by all users of
+    the directory.
+
+    Notes
+    -----
+    Lookups only read the database, so concurrent readers don't wait on each
+    other or on writers. Their hit and miss counts and access times are kept in
+    memory and written in batches: with the next set, every access_batch_size
+    lookups, when reading stats, and on close. Eviction in other processes can
+    therefore miss a few recent lookups.
+
+    The cached comparisons and decodes are pickled, and unpickling runs
+    arbitrary code. Never share a cache directory with writers you don't trust.
+    """
+
+    def __init__(
+        self,
+        cache_dir: Union[str, Path] = DEFAULT_CACHE_DIR,
+        max_size_bytes: int = DEFAULT_MAX_SIZE_BYTES,
+        timeout: float = 60.0,
+        access_batch_size: int = DEFAULT_ACCESS_BATCH_SIZE,
+    ):
+        """
+        Parameters
+        ----------
+        cache_dir: Union[str, Path]
+            The directory to store the cache database in.
+            Default: .whisper-experiments-cache/
+        max_size_bytes: int
+            The maximum total size of stored values.
+            Least recently used entries are evicted once exceeded.
+            Default: 2 GiB
+        timeout: float
+            Seconds to wait for another process to release the database lock.
+            Default: 60
+        access_batch_size: int
+            The number of lookups to record in memory before writing their
+            statistics and access times.
+            Default: 256
+        """
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.cache_dir / "cache.sqlite"
+        self.max_size_bytes = max_size_bytes
+        self.access_batch_size = access_batch_size
+
+        # Lookups not yet written, the connection is shared between threads
+        self._lock = threading.Lock()
+        self._pending_hits = 0
+        self._pending_misses = 0
+        self._pending_access: Dict[str, float] = {}
+
+        self._conn = sqlite3.connect(
+            self.db_path,
+            timeout=timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        # executescript manages its own transaction
+        self._conn.executescript(f"BEGIN IMMEDIATE;{_SCHEMA}COMMIT;")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Cursor]:
+        # IMMEDIATE takes the write lock up front so concurrent writers queue
+        # on the busy timeout instead of failing on lock upgrade
+        cursor = self._conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            yield cursor
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        finally:
+            cursor.close()
+
+    @staticmethod
+    def _increment(cursor: sqlite3.Cursor, name: str, amount: int) -> None:
+        cursor.execute(
+            "UPDATE stats SET value = value + ? WHERE name = ?", (amount, name)
+        )
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Get a stored value and mark it as recently used.
+
+        Parameters
+        ----------
+        key: str
+            The key to look up.
+
+        Returns
+        -------
+        Optional[bytes]
+            The stored value. None if not stored.
+        """
+        # A plain read, the write lock is only taken to write a full batch
+        row = self._conn.execute(
+            "SELECT value FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        with self._lock:
+            if row is None:
+                self._pending_misses += 1
+            else:
+                self._pending_hits += 1
+                self._pending_access[key] = time.time()
+            n_pending = self._pending_hits + self._pending_misses
+        if n_pending >= self.access_batch_size:
+            self.flush()
+
+        return None if row is None else row[0]
+
+    def _write_pending(self, cursor: sqlite3.Cursor) -> None:
+        with self._lock:
+            hits, misses = self._pending_hits, self._pending_misses
+            access = self._pending_access
+            self._pending_hits = self._pending_misses = 0
+            self._pending_access = {}
+
+        # Entries evicted or cleared since their lookup are simply not updated
+        cursor.executemany(
+            "UPDATE entries SET last_access = MAX(last_access, ?) WHERE key = ?",
+            [(access_time, key) for key, access_time in access.items()],
+        )
+        self._increment(cursor, "hits", hits)
+        self._increment(cursor, "misses", misses)
+
+    def flush(self) -> None:
+        """
+        Write the hit and miss counts and access times of recent lookups.
+        """
+        with self._lock:
+            if self._pending_hits + self._pending_misses == 0:
+                return
+        with self._transaction() as cursor:
+            self._write_pending(cursor)
+
+    def set(self, key: str, value: bytes) -> None:
+        """
+        Store a value, evicting least recently used entries if over the size cap.
+
+        Parameters
+        ----------
+        key: str
+            The key to store the value under.
+        value: bytes
+            The value to store.
+            Values larger than the size cap are not stored.
+        """
+        size = len(value)
+        if size > self.max_size_bytes:
+            return
+
+        with self._transaction() as cursor:
+            # Recent lookups first, so eviction sees their access times
+            self._write_pending(cursor)
+            previous = cursor.execute(
+                "SELECT size FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            previous_size = previous[0] if previous is not None else 0
+            cursor.execute(
+                "INSERT OR REPLACE INTO entries (key, value, size, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, sqlite3.Binary(value), size, time.time()),
+            )
+            self._increment(cursor, "size_bytes", size - previous_size)
+
+            # Evict oldest entries until under the cap
+            (total_size,) = cursor.execute(
+                "SELECT value FROM stats WHERE name = 'size_bytes'"
+            ).fetchone()
+            while total_size > self.max_size_bytes:
+                oldest = cursor.execute(
+                    "SELECT key, size FROM entries "
+                    "WHERE key != ? ORDER BY last_access LIMIT 1",
+                    (key,),
+                ).fetchone()
+                if oldest is None:
+                    # Nothing left to evict, the stored total had drifted from
+                    # the entries, so re-count it
+                    cursor.execute(
+                        "UPDATE stats SET value = "
+                        "(SELECT COALESCE(SUM(size), 0) FROM entries) "
+                        "WHERE name = 'size_bytes'"
+                    )
+                    break
+
+                oldest_key, oldest_size = oldest
+                cursor.execute("DELETE FROM entries WHERE key = ?", (oldest_key,))
+                self._increment(cursor, "size_bytes", -oldest_size)
+                self._increment(cursor, "evictions", 1)
+                total_size -= oldest_size
+
+    def __contains__(self, key: str) -> bool:
+        row = self._conn.execute(
+            "SELECT 1 FROM entries WHERE key = ?", (key,)
+        ).fetchone()
+        return row is not None
+
+    @property
+    def stats(self) -> CacheStats:
+        """
+        Returns
+        -------
+        CacheStats
+            Hit, miss, and size statistics shared by all users of the cache directory.
+        """
+        self.flush()
+        values = dict(self._conn.execute("SELECT name, value FROM stats").fetchall())
+        (n_entries,) = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()
+        return CacheStats(
+            hits=values["hits"],
+            misses=values["misses"],
+            evictions=values["evictions"],
+            n_entries=n_entries,
+            size_bytes=values["size_bytes"],
+        )
+
+    def clear(self) -> None:
+        """
+        Remove every stored entry and reset statistics.
+        """
+        with self._transaction() as cursor:
+            self._write_pending(cursor)
+            cursor.execute("DELETE FROM entries")
+            cursor.execute("UPDATE stats SET value = 0")
+
+    def close(self) -> None:
+        """
+        Write any recorded lookups and close the connection to the cache database.
+        """
+        self.flush()
+        self._conn.close()
+
+
+###############################################################################
+
+
+def callable_identity(func: Any) -> str:
+    """
+    Get a stable string identifying a function for use in cache keys.
+
+    Parameters
+    ----------
+    func: Any
+        The function (or callable object) to identify.
+
+    Returns
+    -------
+    str
+        The fully qualified name of the function plus the version of the package
+        that provides it.
+        Callable objects may override this by providing a `cache_identity` attribute.
+
+    Notes
+    -----
+    Lambdas and locally defined functions share an identity with any other
+    function of the same name in the same scope.
+    """
+    if hasattr(func, "cache_identity"):
+        return str(func.cache_identity)
+    if isinstance(func, functools.partial):
+        return (
+            f"partial({callable_identity(func.func)}, "
+            f"args={func.args!r}, keywords={sorted(func.keywords.items())!r})"
+        )
+
+    qualname = getattr(func, "__qualname__", None)
+    if qualname is None:
+        qualname = type(func).__qualname__
+    module = getattr(func, "__module__", None) or type(func).__module__
+
+    # Builtin methods like str.split report no module
+    if module is None:
+        module = "builtins"
+
+    root_package = sys.modules.get(module.split(".")[0])
+    version = getattr(root_package, "__version__", None)
+    if version is None:
+        version = sys.version.split()[0]
+
+    return f"{module}.{qualname}=={version}"
+
+
+def comparison_key(text_1: str, text_2: str, **components: Any) -> str:
+    """
+    Build a cache key from the contents of two texts and the comparison settings.
+
+    Parameters
+    ----------
+    text_1: str
+        Left text
+    text_2: str
+        Right text
+    components: Any
+        Any other settings that change the comparison result,
+        e.g. engine="line", word_split_func="builtins.str.split==3.10.4".
+
+    Returns
+    -------
+    str
+        The hex digest of the key.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(f"v{CACHE_FORMAT_VERSION}".encode("utf-8"))
+    for text in (text_1, text_2):
+        encoded = text.encode("utf-8")
+        # Length prefixes so ("ab", "c") and ("a", "bc") never collide
+        hasher.update(len(encoded).to_bytes(8, "little"))
+        hasher.update(encoded)
+    for name, value in sorted(components.items()):
+        hasher.update(f"\x00{name}={value}".encode("utf-8"))
+
+    return hasher.hexdigest()
+
+
+def audio_key(audio: bytes, **components: Any) -> str:
+    """
+    Build a cache key from the contents of an audio chunk and the settings of
+    what is computed from it.
+
+    Parameters
+    ----------
+    audio: bytes
+        The raw samples of the chunk, e.g. samples.tobytes().
+    components: Any
+        Any other settings that change the result,
+        e.g. model="whisper.base==20230314", stage="encoder".
+
+    Returns
+    -------
+    str
+        The hex digest of the key.
+    """
+    hasher = hashlib.sha256()
+    hasher.update(f"v{CACHE_FORMAT_VERSION}:audio".encode("utf-8"))
+    hasher.update(len(audio).to_bytes(8, "little"))
+    hasher.update(audio)
+    for name, value in sorted(components.items()):
+        hasher.update(f"\x00{name}={value}".encode("utf-8"))
+
+    return hasher.hexdigest()
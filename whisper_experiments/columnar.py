@@ -0,0 +1,134 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from typing import TYPE_CHECKING, Any, Dict, List, NamedTuple, Optional, Union
+
+import numpy as np
+
+if TYPE_CHECKING:
+    from cdp_backend.pipeline.transcript_model import Transcript
+
+###############################################################################
+
+
+class ColumnarTranscript(NamedTuple):
+    """
+    A transcript stored as flat word and sentence columns.
+
+    Word columns are indexed by the word's position in the whole transcript.
+    The words of sentence i are word_offsets[i]:word_offsets[i + 1].
+    """
+
+    # Per word
+    word_text: List[str]
+    word_start_time: np.ndarray
+    word_end_time: np.ndarray
+    word_sentence_index: np.ndarray
+
+    # Per sentence
+    sentence_start_time: np.ndarray
+    sentence_end_time: np.ndarray
+    sentence_speaker_index: List[Any]
+    # NaN where the transcript has no confidence for the sentence
+    sentence_confidence: np.ndarray
+    # Start of each sentence's words in the word columns, plus the total word count
+    word_offsets: np.ndarray
+
+    @property
+    def n_words(self) -> int:
+        return len(self.word_text)
+
+    @property
+    def n_sentences(self) -> int:
+        return len(self.word_offsets) - 1
+
+    def sentence_words(self, sentence_index: int) -> List[str]:
+        """
+        Parameters
+        ----------
+        sentence_index: int
+            The sentence to get the words of.
+
+        Returns
+        -------
+        List[str]
+            The text of each word in the sentence.
+        """
+        return self.word_text[
+            self.word_offsets[sentence_index] : self.word_offsets[sentence_index + 1]
+        ]
+
+
+def to_columnar(
+    transcript: Union["Transcript", Dict[str, Any], ColumnarTranscript]
+) -> ColumnarTranscript:
+    """
+    Convert a transcript to flat word and sentence columns in a single pass.
+
+    Parameters
+    ----------
+    transcript: Union[Transcript, Dict[str, Any], ColumnarTranscript]
+        The parsed transcript, either the model or the stored dictionary.
+        Columnar transcripts are returned untouched.
+
+    Returns
+    -------
+    ColumnarTranscript
+        The transcript columns.
+    """
+    if isinstance(transcript, ColumnarTranscript):
+        return transcript
+
+    # Dicts and models are read the same way
+    if isinstance(transcript, dict):
+        sentences = transcript["sentences"]
+
+        def _get(obj: Any, field: str) -> Any:
+            return obj[field]
+
+        def _get_optional(obj: Any, field: str) -> Any:
+            return obj.get(field)
+
+    else:
+        sentences = transcript.sentences
+
+        def _get(obj: Any, field: str) -> Any:
+            return getattr(obj, field)
+
+        def _get_optional(obj: Any, field: str) -> Any:
+            return getattr(obj, field, None)
+
+    word_text: List[str] = []
+    word_start_time: List[float] = []
+    word_end_time: List[float] = []
+    word_offsets = [0]
+    sentence_start_time: List[float] = []
+    sentence_end_time: List[float] = []
+    sentence_speaker_index: List[Any] = []
+    sentence_confidence: List[Optional[float]] = []
+    for sentence in sentences:
+        for word in _get(sentence, "words"):
+            word_text.append(_get(word, "text"))
+            word_start_time.append(_get(word, "start_time"))
+            word_end_time.append(_get(word, "end_time"))
+        word_offsets.append(len(word_text))
+        sentence_start_time.append(_get(sentence, "start_time"))
+        sentence_end_time.append(_get(sentence, "end_time"))
+        sentence_speaker_index.append(_get(sentence, "speaker_index"))
+        sentence_confidence.append(_get_optional(sentence, "confidence"))
+
+    offsets = np.asarray(word_offsets, dtype=np.int64)
+    return ColumnarTranscript(
+        word_text=word_text,
+        word_start_time=np.asarray(word_start_time, dtype=np.float64),
+        word_end_time=np.asarray(word_end_time, dtype=np.float64),
+        word_sentence_index=np.repeat(
+            np.arange(len(offsets) - 1, dtype=np.int64), np.diff(offsets)
+        ),
+        sentence_start_time=np.asarray(sentence_start_time, dtype=np.float64),
+        sentence_end_time=np.asarray(sentence_end_time, dtype=np.float64),
+        sentence_speaker_index=sentence_speaker_index,
+        # None becomes NaN
+        sentence_confidence=np.asarray(sentence_confidence, dtype=np.float64),
+        word_offsets=offsets,
+    )
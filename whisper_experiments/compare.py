@@ -0,0 +1,613 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import csv
+import json
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from .align import align_hypotheses
+from .diff import (
+    ALL_DIFF_ENGINES,
+    DiffEngines,
+    DiffKinds,
+    TextComparison,
+    text_differences,
+)
+from .serialization import read_transcript_dict
+from .streaming import bounded_map
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+###############################################################################
+
+log = logging.getLogger(__name__)
+
+###############################################################################
+
+DEFAULT_COMPARISONS_DIR = Path("cdp-whisper-experiments-comparisons/")
+
+# Sessions table columns named "{source}_transcript_path" are compared against
+# the ground truth transcript
+TRANSCRIPT_PATH_SUFFIX = "_transcript_path"
+GROUND_TRUTH_SOURCE = "ground_truth"
+
+_PUNCTUATION = re.compile(r"[^\w\s']")
+_WHITESPACE = re.compile(r"\s+")
+
+###############################################################################
+
+
+class Normalizations:
+    # Compare the text as is
+    none = "none"
+    # Lowercase
+    lower = "lower"
+    # Lowercase, strip punctuation (except apostrophes), collapse whitespace
+    basic = "basic"
+
+
+ALL_NORMALIZATIONS = [
+    getattr(Normalizations, attr) for attr in dir(Normalizations) if "__" not in attr
+]
+
+
+class MetricsFields:
+    id_ = "id"
+    source = "source"
+    engine = "engine"
+    normalization = "normalization"
+    n_reference_words = "n_reference_words"
+    n_hypothesis_words = "n_hypothesis_words"
+    substitutions = "substitutions"
+    deletions = "deletions"
+    insertions = "insertions"
+    word_error_rate = "word_error_rate"
+    similarity = "similarity"
+    n_diff_lines = "n_diff_lines"
+    compare_seconds = "compare_seconds"
+    # Why the comparison failed, None if it succeeded
+    error = "error"
+
+
+# In output order
+ALL_METRICS_FIELDS = [
+    MetricsFields.id_,
+    MetricsFields.source,
+    MetricsFields.engine,
+    MetricsFields.normalization,
+    MetricsFields.n_reference_words,
+    MetricsFields.n_hypothesis_words,
+    MetricsFields.substitutions,
+    MetricsFields.deletions,
+    MetricsFields.insertions,
+    MetricsFields.word_error_rate,
+    MetricsFields.similarity,
+    MetricsFields.n_diff_lines,
+    MetricsFields.compare_seconds,
+    MetricsFields.error,
+]
+
+_INTEGER_METRICS_FIELDS = {
+    MetricsFields.n_reference_words,
+    MetricsFields.n_hypothesis_words,
+    MetricsFields.substitutions,
+    MetricsFields.deletions,
+    MetricsFields.insertions,
+    MetricsFields.n_diff_lines,
+}
+_FLOAT_METRICS_FIELDS = {
+    MetricsFields.word_error_rate,
+    MetricsFields.similarity,
+    MetricsFields.compare_seconds,
+}
+
+
+class CompareTask(NamedTuple):
+    session_id: str
+    # The name of the compared transcript source, e.g. "gsr"
+    source: str
+    # None if the session has no transcript of this source
+    reference_path: Optional[str]
+    hypothesis_path: Optional[str]
+    # One of DiffEngines
+    engine: str
+    # One of Normalizations
+    normalization: str
+    # Whether to keep the per line differences
+    include_diffs: bool
+
+
+class SessionComparison(NamedTuple):
+    # One row of metrics, see MetricsFields
+    metrics: Dict[str, Any]
+    # One record per different line
+    diff_lines: List[Dict[str, Any]]
+
+
+###############################################################################
+
+
+def normalize_text(text: str, normalization: str = Normalizations.none) -> str:
+    """
+    Normalize text line by line before comparing.
+
+    Parameters
+    ----------
+    text: str
+        The text to normalize.
+    normalization: str
+        One of Normalizations.
+        Default: "none"
+
+    Returns
+    -------
+    str
+        The normalized text, with the same number of lines.
+
+    Raises
+    ------
+    ValueError
+        Unknown normalization.
+    """
+    if normalization == Normalizations.none:
+        return text
+    if normalization == Normalizations.lower:
+        return text.lower()
+    if normalization == Normalizations.basic:
+        return "\n".join(
+            _WHITESPACE.sub(" ", _PUNCTUATION.sub(" ", line.lower())).strip()
+            for line in text.splitlines()
+        )
+
+    raise ValueError(
+        f"Unknown normalization: '{normalization}'. Options: {ALL_NORMALIZATIONS}"
+    )
+
+
+def transcript_sources(columns: Iterable[str]) -> Dict[str, str]:
+    """
+    Find the transcript sources to compare against the ground truth.
+
+    Parameters
+    ----------
+    columns: Iterable[str]
+        The columns of the sessions table.
+
+    Returns
+    -------
+    Dict[str, str]
+        Source name to transcript path column,
+        e.g. {"gsr": "gsr_transcript_path"}.
+    """
+    return {
+        column[: -len(TRANSCRIPT_PATH_SUFFIX)]: column
+        for column in columns
+        if column.endswith(TRANSCRIPT_PATH_SUFFIX)
+        and column != f"{GROUND_TRUTH_SOURCE}{TRANSCRIPT_PATH_SUFFIX}"
+    }
+
+
+def _optional_path(path: Any) -> Optional[str]:
+    # Sessions without a transcript hold None, NaN, or an empty string
+    if path is None or path != path or str(path) == "":
+        return None
+    return str(path)
+
+
+def _read_text(path: str) -> str:
+    transcript = read_transcript_dict(path)
+    return "\n".join(sentence["text"] for sentence in transcript["sentences"])
+
+
+def _word_error_counts(comparison: TextComparison) -> Tuple[int, int, int]:
+    # (substitutions, deletions, insertions) of the token engine's single word
+    # alignment, every word error is reported on exactly one line
+    counts = {DiffKinds.modified: 0, DiffKinds.removed: 0, DiffKinds.added: 0}
+    for line in comparison.lines:
+        for word in line.words:
+            counts[word.kind] += 1
+
+    return (
+        counts[DiffKinds.modified],
+        counts[DiffKinds.removed],
+        counts[DiffKinds.added],
+    )
+
+
+def _failed_metrics(task: CompareTask, error: str) -> Dict[str, Any]:
+    metrics: Dict[str, Any] = {field: None for field in ALL_METRICS_FIELDS}
+    metrics.update(
+        {
+            MetricsFields.id_: task.session_id,
+            MetricsFields.source: task.source,
+            MetricsFields.engine: task.engine,
+            MetricsFields.normalization: task.normalization,
+            MetricsFields.error: error,
+        }
+    )
+    return metrics
+
+
+def compare_session(task: CompareTask) -> SessionComparison:
+    """
+    Compare one transcript of a session against the session's ground truth.
+
+    Runs in a worker process, see compare_sessions.
+
+    Parameters
+    ----------
+    task: CompareTask
+        The session, source, and comparison settings.
+
+    Returns
+    -------
+    SessionComparison
+        The session's metrics row and per line differences.
+        If either transcript is missing, or reading or comparing them fails, the
+        metrics row only holds the error, see MetricsFields.error.
+    """
+    if task.reference_path is None:
+        return SessionComparison(
+            _failed_metrics(task, "No ground truth transcript"), []
+        )
+    if task.hypothesis_path is None:
+        return SessionComparison(
+            _failed_metrics(task, f"No {task.source} transcript"), []
+        )
+
+    # Any failure, reading or comparing, only fails this session's row rather
+    # than the whole run
+    try:
+        return _compare_texts(task, task.reference_path, task.hypothesis_path)
+    except Exception as e:
+        return SessionComparison(_failed_metrics(task, repr(e)), [])
+
+
+def _compare_texts(
+    task: CompareTask, reference_path: str, hypothesis_path: str
+) -> SessionComparison:
+    start_time = time.perf_counter()
+    reference = normalize_text(_read_text(reference_path), task.normalization)
+    hypothesis = normalize_text(_read_text(hypothesis_path), task.normalization)
+
+    comparison = text_differences(reference, hypothesis, engine=task.engine)
+    if task.engine == DiffEngines.token:
+        substitutions, deletions, insertions = _word_error_counts(comparison)
+    else:
+        # The line engine only aligns the words of changed lines, which can
+        # overcount errors when lines are split differently, so error counts
+        # need their own alignment of all words
+        stats = align_hypotheses(reference, {task.source: hypothesis}).stats[0]
+        substitutions, deletions, insertions = (
+            stats.substitutions,
+            stats.deletions,
+            stats.insertions,
+        )
+
+    n_reference_words = len(reference.split())
+    n_errors = substitutions + deletions + insertions
+    if n_reference_words > 0:
+        word_error_rate = n_errors / n_reference_words
+    else:
+        word_error_rate = 0.0 if n_errors == 0 else float("inf")
+
+    diff_lines = []
+    if task.include_diffs:
+        for line in comparison.lines:
+            diff_lines.append(
+                {
+                    MetricsFields.id_: task.session_id,
+                    MetricsFields.source: task.source,
+                    "kind": line.line.kind,
+                    "before": line.line.content_before,
+                    "after": line.line.content_after,
+                    "words": [
+                        {
+                            "kind": word.kind,
+                            "before": word.content_before,
+                            "after": word.content_after,
+                        }
+                        for word in line.words
+                    ],
+                }
+            )
+
+    return SessionComparison(
+        metrics={
+            MetricsFields.id_: task.session_id,
+            MetricsFields.source: task.source,
+            MetricsFields.engine: task.engine,
+            MetricsFields.normalization: task.normalization,
+            MetricsFields.n_reference_words: n_reference_words,
+            MetricsFields.n_hypothesis_words: len(hypothesis.split()),
+            MetricsFields.substitutions: substitutions,
+            MetricsFields.deletions: deletions,
+            MetricsFields.insertions: insertions,
+            MetricsFields.word_error_rate: word_error_rate,
+            MetricsFields.similarity: comparison.similarity,
+            MetricsFields.n_diff_lines: len(comparison.lines),
+            MetricsFields.compare_seconds: time.perf_counter() - start_time,
+            MetricsFields.error: None,
+        },
+        diff_lines=diff_lines,
+    )
+
+
+###############################################################################
+
+
+class MetricsWriter:
+    """
+    Write metrics rows to a CSV or Parquet file as they arrive.
+
+    CSV rows are flushed one at a time, so the file can be read while the
+    comparison runs. Parquet rows are written a row group at a time and the file
+    is only readable once closed. Both formats have every column of
+    ALL_METRICS_FIELDS, even when no rows were written.
+    """
+
+    def __init__(self, path: Union[str, Path], row_group_size: int = 64):
+        """
+        Parameters
+        ----------
+        path: Union[str, Path]
+            The file to write, ".csv" for CSV, anything else for Parquet.
+        row_group_size: int
+            The number of rows per Parquet row group.
+            Default: 64
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.row_group_size = row_group_size
+        self.n_rows = 0
+        self._buffer: List[Dict[str, Any]] = []
+        self._parquet_writer: Any = None
+        self._csv_file: Any = None
+        self._csv_writer: Any = None
+        if self.path.suffix == ".csv":
+            self._csv_file = open(self.path, "w", newline="")
+            self._csv_writer = csv.DictWriter(
+                self._csv_file, fieldnames=ALL_METRICS_FIELDS
+            )
+            self._csv_writer.writeheader()
+
+    def write(self, row: Dict[str, Any]) -> None:
+        """
+        Add a metrics row.
+
+        Parameters
+        ----------
+        row: Dict[str, Any]
+            The metrics, see MetricsFields.
+        """
+        self.n_rows += 1
+        if self._csv_writer is not None:
+            self._csv_writer.writerow(row)
+            self._csv_file.flush()
+            return
+
+        self._buffer.append(row)
+        if len(self._buffer) >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write any buffered Parquet rows as a row group.
+        """
+        import pyarrow as pa
+
+        if len(self._buffer) == 0:
+            return
+
+        table = pa.Table.from_pylist(
+            [
+                {field: row[field] for field in ALL_METRICS_FIELDS}
+                for row in self._buffer
+            ],
+            schema=self._open_parquet().schema,
+        )
+        self._open_parquet().write_table(table)
+        self._buffer = []
+
+    def _open_parquet(self) -> Any:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        # Explicit types, failed rows hold nulls that can't be inferred from
+        if self._parquet_writer is None:
+            schema = pa.schema(
+                [
+                    (
+                        field,
+                        pa.int64()
+                        if field in _INTEGER_METRICS_FIELDS
+                        else pa.float64()
+                        if field in _FLOAT_METRICS_FIELDS
+                        else pa.string(),
+                    )
+                    for field in ALL_METRICS_FIELDS
+                ]
+            )
+            self._parquet_writer = pq.ParquetWriter(self.path, schema)
+        return self._parquet_writer
+
+    def close(self) -> None:
+        """
+        Write any buffered rows and close the file.
+        """
+        if self._csv_file is not None:
+            self._csv_file.close()
+            return
+
+        self.flush()
+        # Opened here if no rows were written, for an empty file with the schema
+        self._open_parquet().close()
+
+    def __enter__(self) -> "MetricsWriter":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+def compare_sessions(
+    sessions: "pd.DataFrame",
+    metrics_path: Union[str, Path] = DEFAULT_COMPARISONS_DIR / "metrics.parquet",
+    diffs_path: Optional[Union[str, Path]] = DEFAULT_COMPARISONS_DIR / "diffs.jsonl",
+    engine: str = DiffEngines.token,
+    normalization: str = Normalizations.none,
+    sources: Optional[List[str]] = None,
+    session_ids: Optional[List[str]] = None,
+    max_workers: Optional[int] = None,
+    max_in_flight: Optional[int] = None,
+) -> "pd.DataFrame":
+    """
+    Compare every transcript source of every session against the ground truth
+    in worker processes, streaming results to disk as they finish.
+
+    Parameters
+    ----------
+    sessions: pd.DataFrame
+        The full dataset, see data.load_cdp_whisper_experiment_data.
+        Transcript path columns must point to local files.
+    metrics_path: Union[str, Path]
+        The file to write one metrics row per session and source to,
+        ".csv" for CSV, anything else for Parquet.
+        Default: cdp-whisper-experiments-comparisons/metrics.parquet
+    diffs_path: Optional[Union[str, Path]]
+        The JSON Lines file to write one record per different line to.
+        Default: cdp-whisper-experiments-comparisons/diffs.jsonl
+        (None to skip the per line differences)
+    engine: str
+        One of DiffEngines, see diff.text_differences.
+        Default: "token"
+    normalization: str
+        One of Normalizations, applied to both transcripts.
+        Default: "none"
+    sources: Optional[List[str]]
+        The transcript sources to compare, e.g. ["gsr"].
+        Default: None (every "{source}_transcript_path" column)
+    session_ids: Optional[List[str]]
+        The sessions to compare.
+        Default: None (every session)
+    max_workers: Optional[int]
+        The number of worker processes.
+        Default: None (the number of CPUs)
+    max_in_flight: Optional[int]
+        The maximum number of comparisons submitted but not yet written.
+        Default: None (twice the number of workers)
+
+    Returns
+    -------
+    pd.DataFrame
+        The metrics, in completion order. Sessions missing either transcript,
+        or whose transcripts can't be read, get a row with only
+        MetricsFields.error set instead of stopping the run.
+
+    Raises
+    ------
+    ValueError
+        Unknown engine, normalization, or source.
+    """
+    import pandas as pd
+    from tqdm import tqdm
+
+    from .data import FullDatasetFields
+
+    if engine not in ALL_DIFF_ENGINES:
+        raise ValueError(
+            f"Unknown diff engine: '{engine}'. Options: {ALL_DIFF_ENGINES}"
+        )
+    if normalization not in ALL_NORMALIZATIONS:
+        raise ValueError(
+            f"Unknown normalization: '{normalization}'. Options: {ALL_NORMALIZATIONS}"
+        )
+
+    available_sources = transcript_sources(sessions.columns)
+    if sources is None:
+        sources = list(available_sources)
+    unknown_sources = set(sources) - set(available_sources)
+    if len(unknown_sources) > 0:
+        raise ValueError(
+            f"Unknown transcript sources: {sorted(unknown_sources)}. "
+            f"Options: {sorted(available_sources)}"
+        )
+
+    if session_ids is not None:
+        sessions = sessions[sessions[FullDatasetFields.id_].isin(session_ids)]
+
+    def _iter_tasks() -> Iterator[CompareTask]:
+        for source in sources or []:
+            for session_id, reference_path, hypothesis_path in zip(
+                sessions[FullDatasetFields.id_],
+                sessions[FullDatasetFields.ground_truth_transcript_path],
+                sessions[available_sources[source]],
+            ):
+                yield CompareTask(
+                    session_id=session_id,
+                    source=source,
+                    reference_path=_optional_path(reference_path),
+                    hypothesis_path=_optional_path(hypothesis_path),
+                    engine=engine,
+                    normalization=normalization,
+                    include_diffs=diffs_path is not None,
+                )
+
+    n_tasks = len(sessions) * len(sources)
+    max_workers = max_workers or os.cpu_count() or 1
+    log.info(
+        f"Comparing {len(sessions)} sessions x {len(sources)} sources "
+        f"with {max_workers} workers"
+    )
+
+    rows = []
+    diffs_file = None
+    if diffs_path is not None:
+        Path(diffs_path).parent.mkdir(parents=True, exist_ok=True)
+        diffs_file = open(diffs_path, "w")
+    try:
+        with MetricsWriter(metrics_path) as metrics_writer, ProcessPoolExecutor(
+            max_workers=max_workers
+        ) as executor:
+            for _, result in tqdm(
+                bounded_map(
+                    compare_session,
+                    _iter_tasks(),
+                    max_in_flight=max_in_flight or max_workers * 2,
+                    executor=executor,
+                ),
+                total=n_tasks,
+            ):
+                metrics_writer.write(result.metrics)
+                rows.append(result.metrics)
+                if diffs_file is not None:
+                    for diff_line in result.diff_lines:
+                        diffs_file.write(json.dumps(diff_line) + "\n")
+                    diffs_file.flush()
+    finally:
+        if diffs_file is not None:
+            diffs_file.close()
+
+    n_failed = sum(row[MetricsFields.error] is not None for row in rows)
+    if n_failed > 0:
+        log.warning(f"{n_failed} of {len(rows)} comparisons failed, see error column")
+
+    return pd.DataFrame(rows, columns=ALL_METRICS_FIELDS)
@@ -1,15 +1,25 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import io
 import shutil
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import TYPE_CHECKING, Iterator, List, Optional, Tuple, Union
 
 import pandas as pd
-from cdp_data import CDPInstances, datasets
+
+from .archive import write_zip_archive
+from .serialization import transcript_suffix
+
+if TYPE_CHECKING:
+    from .snapshot import InstanceRange, SessionSnapshot
 
 ###############################################################################
 
-INFRASTRUCTURE_SLUG = CDPInstances.Seattle
+# cdp_data.CDPInstances.Seattle, kept as a literal so importing this module
+# doesn't import cdp_data (and the Google Cloud libraries it pulls in)
+INFRASTRUCTURE_SLUG = "cdp-seattle-21723dcf"
 AUDIO_URI_TEMPLATE = "gs://{instance}.appspot.com/{session_content_hash}-audio.wav"
 ARCHIVED_DATA_PATH = (
     Path(__file__).parent / "assets" / "cdp-whisper-experiments-data.zip"
@@ -22,6 +32,7 @@ UNPACKED_ARCHIVE_DATA_DIR = Path("cdp-whisper-experiments-data/")
 class GroundTruthDatasetFields:
     id_ = "id"
     key = "key"
+    infrastructure_slug = "infrastructure_slug"
     session_datetime = "session_datetime"
     session_index_in_event = "session_index_in_event"
     session_content_hash = "session_content_hash"
@@ -39,6 +50,7 @@ ALL_GROUND_TRUTH_DATASET_FIELDS = [
 class FullDatasetFields:
     id_ = "id"
     key = "key"
+    infrastructure_slug = "infrastructure_slug"
     session_datetime = "session_datetime"
     session_index_in_event = "session_index_in_event"
     session_content_hash = "session_content_hash"
@@ -57,7 +69,27 @@ ALL_FULL_DATASET_FIELDS = [
 ###############################################################################
 
 
-def get_ground_truth_dataset(test: bool = False) -> pd.DataFrame:
+def _get_instance_session_dataset(instance_range: "InstanceRange") -> pd.DataFrame:
+    from cdp_data import datasets
+
+    sessions = datasets.get_session_dataset(
+        infrastructure_slug=instance_range.infrastructure_slug,
+        start_datetime=instance_range.start_datetime,
+        end_datetime=instance_range.end_datetime,
+        store_transcript=True,
+    )
+    sessions[
+        GroundTruthDatasetFields.infrastructure_slug
+    ] = instance_range.infrastructure_slug
+    return sessions
+
+
+def get_ground_truth_dataset(
+    test: bool = False,
+    snapshot: Optional["SessionSnapshot"] = None,
+    instance_ranges: Optional[List["InstanceRange"]] = None,
+    max_workers: Optional[int] = None,
+) -> pd.DataFrame:
     """
     Get the dataset we are using for testing Google Speech-to-Text and Whisper.
 
@@ -65,43 +97,81 @@ def get_ground_truth_dataset(test: bool = False) -> pd.DataFrame:
     ----------
     test: bool
         If true, get a smaller, 5 file, test set.
+        Ignored if instance_ranges are provided.
         Default: False (use the full ~50 file dataset)
+    snapshot: Optional[SessionSnapshot]
+        A local snapshot to read sessions and transcripts from. Only sessions
+        not already in the snapshot are pulled from the CDP instance.
+        Default: None (pull every session and transcript with cdp_data)
+    instance_ranges: Optional[List[InstanceRange]]
+        The CDP instances and datetime ranges to pull sessions from.
+        Default: None (the Seattle sessions from August to November 2020)
+    max_workers: Optional[int]
+        The maximum number of instances to pull at the same time.
+        Default: None (one thread per instance, up to the executor default)
 
     Returns
     -------
     pd.DataFrame
-        DataFrame returned from cdp_data.datasets.get_session_dataset.
-        Additional "audio_uri" column is added.
+        DataFrame returned from cdp_data.datasets.get_session_dataset for each
+        instance range, concatenated.
+        Additional "infrastructure_slug" and "audio_uri" columns are added.
 
     See Also
     --------
     cdp_data.dataset.get_session_dataset
         The primary function this function wraps.
+    whisper_experiments.snapshot.SessionSnapshot
+        The local snapshot store.
     """
     # Handle small test dataset or full
-    start_dt = "2020-08-01"
-    if test:
-        end_dt = "2020-08-15"
-    else:
-        end_dt = "2020-11-01"
+    if instance_ranges is None:
+        from .snapshot import InstanceRange
+
+        start_dt = "2020-08-01"
+        if test:
+            end_dt = "2020-08-15"
+        else:
+            end_dt = "2020-11-01"
+
+        instance_ranges = [InstanceRange(INFRASTRUCTURE_SLUG, start_dt, end_dt)]
 
     # Pull data
-    sessions = datasets.get_session_dataset(
-        infrastructure_slug=INFRASTRUCTURE_SLUG,
-        start_datetime=start_dt,
-        end_datetime=end_dt,
-        store_transcript=True,
+    if snapshot is not None:
+        snapshot.sync_many(instance_ranges, max_workers=max_workers)
+        # Query each range separately so only its partitions are read
+        instance_sessions = [
+            snapshot.query(
+                start_datetime=instance_range.start_datetime,
+                end_datetime=instance_range.end_datetime,
+                infrastructure_slug=instance_range.infrastructure_slug,
+            )
+            for instance_range in instance_ranges
+        ]
+    else:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            instance_sessions = list(
+                executor.map(_get_instance_session_dataset, instance_ranges)
+            )
+
+    # Overlapping ranges of the same instance return the same sessions
+    sessions = (
+        pd.concat(instance_sessions, ignore_index=True)
+        .drop_duplicates(subset=GroundTruthDatasetFields.id_)
+        .reset_index(drop=True)
     )
 
     # For each session, generate the audio URI
-    sessions[GroundTruthDatasetFields.audio_uri] = sessions[
-        GroundTruthDatasetFields.session_content_hash
-    ].apply(
-        lambda session_content_hash: AUDIO_URI_TEMPLATE.format(
-            instance=INFRASTRUCTURE_SLUG,
+    sessions[GroundTruthDatasetFields.audio_uri] = [
+        AUDIO_URI_TEMPLATE.format(
+            instance=infrastructure_slug,
             session_content_hash=session_content_hash,
         )
-    )
+        for infrastructure_slug, session_content_hash in zip(
+            sessions[GroundTruthDatasetFields.infrastructure_slug],
+            sessions[GroundTruthDatasetFields.session_content_hash],
+        )
+    ]
 
     # Rename columns
     sessions = sessions.rename(
@@ -118,56 +188,59 @@ def get_ground_truth_dataset(test: bool = False) -> pd.DataFrame:
 def _archive_dataset(
     sessions: pd.DataFrame,
     archive_name: Path = ARCHIVED_DATA_PATH.with_suffix(""),
-    temp_work_dir: Path = Path(".tmp-archive-work-dir/"),
 ) -> Path:
     """
     Prepare the stored archive of the data used in this lil' experiment.
+
+    Transcripts are streamed straight from their current location into the
+    archive rather than copied to a working directory.
     """
-    try:
-        # Empty working directory
-        if temp_work_dir.exists():
-            shutil.rmtree(temp_work_dir)
-
-        # Create working directory
-        temp_work_dir.mkdir(parents=True)
-
-        # Helper to copy to new location and return relative path from working dir
-        def _copy_return_relative_path(
-            current_path: str,
-            new_filepath: Path,
-            working_dir: Path,
-        ) -> str:
-            shutil.copy(current_path, new_filepath)
-            relative_path = new_filepath.relative_to(working_dir)
-            return str(relative_path)
-
-        # Move each file into dir and update paths
-        for i, row in sessions.iterrows():
-            # Make the session sub-dir
-            session_dir = temp_work_dir / row[FullDatasetFields.id_]
-            session_dir.mkdir()
-
-            # Copy and update the transcript paths
-            for path_col, fname in (
-                (FullDatasetFields.ground_truth_transcript_path, "ground-truth.json"),
-                (FullDatasetFields.gsr_transcript_path, "gsr.json"),
-            ):
-                sessions.at[i, path_col] = _copy_return_relative_path(
-                    row[path_col],
-                    session_dir / fname,
-                    temp_work_dir,
-                )
-
-        # Store updated sessions df to archive
-        sessions.to_parquet(temp_work_dir / "data.parquet")
-
-        # Create archive
-        shutil.make_archive(str(archive_name), "zip", temp_work_dir)
-        return archive_name.with_suffix(".zip")
-
-    # Always cleanup work dir
-    finally:
-        shutil.rmtree(temp_work_dir)
+    sessions = sessions.copy()
+    source_paths = {}
+
+    # Rewrite the paths to their location in the archive, keeping the suffix
+    # of the stored transcript format
+    for path_col, fname in (
+        (FullDatasetFields.ground_truth_transcript_path, "ground-truth"),
+        (FullDatasetFields.gsr_transcript_path, "gsr"),
+    ):
+        source_paths[path_col] = sessions[path_col].astype(str)
+        sessions[path_col] = (
+            sessions[FullDatasetFields.id_]
+            + f"/{fname}"
+            + source_paths[path_col].map(transcript_suffix)
+        )
+
+    # Store updated sessions df to archive
+    buffer = io.BytesIO()
+    sessions.to_parquet(buffer)
+
+    def _iter_members() -> Iterator[Tuple[str, Union[str, bytes]]]:
+        # Keep each session's transcripts next to each other
+        columns = [
+            column
+            for path_col, source_col in source_paths.items()
+            for column in (sessions[path_col], source_col)
+        ]
+        for values in zip(*columns):
+            yield from zip(values[::2], values[1::2])
+        yield "data.parquet", buffer.getvalue()
+
+    # Create archive
+    return write_zip_archive(_iter_members(), archive_name.with_suffix(".zip"))
+
+
+def _resolve_transcript_paths(sessions: pd.DataFrame, root: Path) -> pd.DataFrame:
+    # Resolve the root once and join each relative path onto it,
+    # rather than resolving every path (a syscall per path component)
+    resolved_root = root.resolve()
+    for path_col in (
+        FullDatasetFields.ground_truth_transcript_path,
+        FullDatasetFields.gsr_transcript_path,
+    ):
+        sessions[path_col] = [resolved_root / path for path in sessions[path_col]]
+
+    return sessions
 
 
 def load_cdp_whisper_experiment_data(
@@ -189,14 +262,29 @@ def load_cdp_whisper_experiment_data(
     # Unpack archive
     shutil.unpack_archive(ARCHIVED_DATA_PATH, storage_dir)
 
-    # Load data and fix paths
-    sessions = pd.read_parquet(storage_dir / "data.parquet")
-    for i, row in sessions.iterrows():
-        # Copy and update the transcript paths
-        for path_col in (
-            FullDatasetFields.ground_truth_transcript_path,
-            FullDatasetFields.gsr_transcript_path,
-        ):
-            sessions.at[i, path_col] = (storage_dir / row[path_col]).resolve()
+    return load_unpacked_data(storage_dir)
 
-    return sessions
+
+def load_unpacked_data(data_dir: Path) -> pd.DataFrame:
+    """
+    Load the sessions of an unpacked (or generated) data directory, i.e. a
+    "data.parquet" file with transcript paths relative to the directory.
+
+    Parameters
+    ----------
+    data_dir: Path
+        The directory holding "data.parquet" and the transcripts.
+
+    Returns
+    -------
+    pd.DataFrame
+        The sessions with transcript paths fully resolved.
+    """
+    data_dir = Path(data_dir)
+    sessions = pd.read_parquet(data_dir / "data.parquet")
+
+    # Archives from before multi-instance support are all Seattle sessions
+    if FullDatasetFields.infrastructure_slug not in sessions.columns:
+        sessions[FullDatasetFields.infrastructure_slug] = INFRASTRUCTURE_SLUG
+
+    return _resolve_transcript_paths(sessions, data_dir)
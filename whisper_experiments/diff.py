@@ -1,9 +1,14 @@
 #!/usr/bin/env python
 # -*- coding: utf-8 -*-
 
+import pickle
+from collections import defaultdict
 from itertools import filterfalse
 from typing import (
+    TYPE_CHECKING,
+    Any,
     Callable,
+    Dict,
     Iterable,
     Iterator,
     List,
@@ -15,7 +20,15 @@ from typing import (
 
 import rapidfuzz
 import text_diff
+from rapidfuzz.distance import Levenshtein
 from text_diff import AddedLine, ModifiedLine, RemovedLine, UnchangedLine
+from text_diff.extract_diff import EditOperation, Mask
+
+from .cache import DiskCache, callable_identity, comparison_key
+from .columnar import ColumnarTranscript, to_columnar
+
+if TYPE_CHECKING:
+    from cdp_backend.pipeline.transcript_model import Transcript
 
 ###############################################################################
 
@@ -30,6 +43,20 @@ TextType = Union[Word, Line]
 ###############################################################################
 
 
+class DiffEngines:
+    # Diff lines, then diff the words of each changed line
+    line = "line"
+    # Diff the whole word stream once, then project it back onto lines
+    token = "token"
+
+
+ALL_DIFF_ENGINES = [
+    getattr(DiffEngines, attr) for attr in dir(DiffEngines) if "__" not in attr
+]
+
+###############################################################################
+
+
 class TextDiff:
     """
     Wrapper for text_diff objects e.g. ModifiedLine.
@@ -99,6 +126,20 @@ class TextDiff:
         """
         return isinstance(self.text_diff, ModifiedLine)
 
+    @property
+    def kind(self) -> str:
+        """
+        Returns
+        -------
+        str
+            One of DiffKinds
+        """
+        if self.is_modified:
+            return DiffKinds.modified
+        if self.is_removed:
+            return DiffKinds.removed
+        return DiffKinds.added
+
     @property
     def content(self) -> Optional[str]:
         """
@@ -300,11 +341,192 @@ def line_differences(
             )
 
 
+def _masked_modification(content_before: str, content_after: str) -> ModifiedLine:
+    # Character level masks in the same notation text_diff produces
+    mask_before = [EditOperation.UNCHANGED] * len(content_before)
+    mask_after = [EditOperation.UNCHANGED] * len(content_after)
+    for opcode in Levenshtein.opcodes(content_before, content_after):
+        if opcode.tag == "replace":
+            for i in range(opcode.src_start, opcode.src_end):
+                mask_before[i] = EditOperation.MUTATION
+            for i in range(opcode.dest_start, opcode.dest_end):
+                mask_after[i] = EditOperation.MUTATION
+        elif opcode.tag == "delete":
+            for i in range(opcode.src_start, opcode.src_end):
+                mask_before[i] = EditOperation.DELETION
+        elif opcode.tag == "insert":
+            for i in range(opcode.dest_start, opcode.dest_end):
+                mask_after[i] = EditOperation.ADDITION
+
+    return ModifiedLine(
+        content_before=content_before,
+        mask_before=Mask(mask_before),
+        content_after=content_after,
+        mask_after=Mask(mask_after),
+    )
+
+
+def _split_lines(
+    lines: Iterable[str],
+    word_split_func: Callable[[str], Iterable[str]],
+) -> Tuple[List[str], List[str], List[int], List[int]]:
+    # Flatten lines to a single token stream, remembering each token's line
+    # and the index of each line's first token
+    lines = list(lines)
+    tokens: List[str] = []
+    token_lines: List[int] = []
+    line_starts: List[int] = []
+    for line_index, line in enumerate(lines):
+        line_starts.append(len(tokens))
+        line_tokens = list(word_split_func(line))
+        tokens.extend(line_tokens)
+        token_lines.extend([line_index] * len(line_tokens))
+
+    return lines, tokens, token_lines, line_starts
+
+
+def token_line_differences(
+    lines_1: Iterable[str],
+    lines_2: Iterable[str],
+    word_split_func: Callable[[str], Iterable[str]] = str.split,
+) -> Iterator[LineComparison]:
+    """
+    Return list of removed/added/modified lines, found by diffing the words of
+    all lines at once and projecting the word differences back onto lines.
+
+    Unlike line_differences, lines that hold the same words split at different
+    places are not reported, so re-segmented texts don't turn into one modified
+    line per line.
+
+    Parameters
+    ----------
+    lines_1: Iterable[str]
+        Left list of lines
+    lines_2: Iterable[str]
+        Right list of lines
+    word_split_func: Callable[[str], Iterable[str]]
+        Function used to split a line into words.
+        Default is str.split()
+
+    Yields
+    ------
+    LineComparison
+        Union[RemovedLine, AddedLine, ModifiedLine] wrapped as TextDiff
+        List of different words in the line
+
+    See Also
+    --------
+    line_differences
+        Diff lines first, then the words of each changed line.
+
+    Notes
+    -----
+    Lines are reported on the left line boundaries: a modified line's
+    content_after is the right words aligned to the left line, joined by spaces.
+    Right lines with no word aligned to any left word are reported as added.
+    Lines without words and whitespace only changes are excluded.
+    """
+    lines_1, tokens_1, token_lines_1, line_starts_1 = _split_lines(
+        lines_1, word_split_func
+    )
+    lines_2, tokens_2, token_lines_2, _ = _split_lines(lines_2, word_split_func)
+
+    # Word differences, keyed by (left, right) position for ordering,
+    # and aligned right token span of each left line
+    line_words: Dict[int, List[Tuple[int, int, TextDiff]]] = defaultdict(list)
+    line_spans: Dict[int, List[int]] = {}
+    # Right lines with at least one word aligned to a left word
+    anchored_lines_2 = set()
+    # (left insertion position, right token) of every added word
+    inserted: List[Tuple[int, int]] = []
+
+    def _extend_span(line_index_1: int, token_index_2: int) -> None:
+        span = line_spans.get(line_index_1)
+        if span is None:
+            line_spans[line_index_1] = [token_index_2, token_index_2 + 1]
+        else:
+            span[0] = min(span[0], token_index_2)
+            span[1] = max(span[1], token_index_2 + 1)
+
+    for opcode in Levenshtein.opcodes(tokens_1, tokens_2):
+        if opcode.tag in ("equal", "replace"):
+            # Levenshtein equal and replace blocks are the same length on both sides
+            for offset in range(opcode.src_end - opcode.src_start):
+                i, j = opcode.src_start + offset, opcode.dest_start + offset
+                _extend_span(token_lines_1[i], j)
+                anchored_lines_2.add(token_lines_2[j])
+                if opcode.tag == "replace":
+                    line_words[token_lines_1[i]].append(
+                        (i, j, TextDiff(_masked_modification(tokens_1[i], tokens_2[j])))
+                    )
+        elif opcode.tag == "delete":
+            for i in range(opcode.src_start, opcode.src_end):
+                line_words[token_lines_1[i]].append(
+                    (i, opcode.dest_start, TextDiff(RemovedWord(tokens_1[i])))
+                )
+        else:
+            for j in range(opcode.dest_start, opcode.dest_end):
+                inserted.append((opcode.src_start, j))
+
+    # Added words go to a wholly added right line, or to the left line they
+    # were inserted into, preferring the preceding left line if the previous
+    # right word is on the same right line
+    added_lines: Dict[int, List[TextDiff]] = defaultdict(list)
+    added_line_positions: Dict[int, int] = {}
+    for i, j in inserted:
+        line_index_2 = token_lines_2[j]
+        word = TextDiff(AddedWord(tokens_2[j]))
+        if line_index_2 not in anchored_lines_2:
+            added_lines[line_index_2].append(word)
+            added_line_positions.setdefault(line_index_2, i)
+            continue
+
+        use_previous = i > 0 and (
+            i == len(tokens_1)
+            or token_lines_1[i - 1] == token_lines_1[i]
+            or (j > 0 and token_lines_2[j - 1] == line_index_2)
+        )
+        line_index_1 = token_lines_1[i - 1] if use_previous else token_lines_1[i]
+        line_words[line_index_1].append((i, j, word))
+        _extend_span(line_index_1, j)
+
+    # Order by position in the left token stream, added lines first
+    ordered: List[Tuple[int, int, LineComparison]] = []
+    for line_index_1, keyed_words in line_words.items():
+        # Added words were attributed last, put them back in place
+        keyed_words.sort(key=lambda item: (item[0], item[1]))
+        words = [word for _, _, word in keyed_words]
+        span = line_spans.get(line_index_1)
+        if span is None:
+            line: Line = RemovedLine(lines_1[line_index_1])
+        else:
+            line = _masked_modification(
+                lines_1[line_index_1], " ".join(tokens_2[span[0] : span[1]])
+            )
+        ordered.append(
+            (line_starts_1[line_index_1], 1, LineComparison(TextDiff(line), words))
+        )
+    for line_index_2, words in added_lines.items():
+        ordered.append(
+            (
+                added_line_positions[line_index_2],
+                0,
+                LineComparison(TextDiff(AddedLine(lines_2[line_index_2])), words),
+            )
+        )
+
+    ordered.sort(key=lambda item: (item[0], item[1]))
+    for _, _, comparison in ordered:
+        yield comparison
+
+
 def text_differences(
     text_1: str,
     text_2: str,
     similarity_calc: Callable[[str, str], float] = rapidfuzz.fuzz.QRatio,
     word_split_func: Callable[[str], Iterable[str]] = str.split,
+    cache: Optional[DiskCache] = None,
+    engine: str = DiffEngines.line,
 ) -> TextComparison:
     """
     Compare left and right text blobs.
@@ -322,6 +544,16 @@ def text_differences(
     word_split_func: Callable[[str], Iterable[str]]
         Function used to split a line into words.
         Default is str.split()
+    cache: Optional[DiskCache]
+        Cache to reuse stored results from, keyed by the content of both texts
+        and the identity of the provided functions.
+        Default: None (always compute)
+    engine: str
+        One of DiffEngines.
+        "line" compares lines, then the words of each changed line.
+        "token" compares all words at once and projects the differences back
+        onto lines, which is much faster when the texts split lines differently.
+        Default: "line"
 
     Returns
     -------
@@ -333,14 +565,420 @@ def text_differences(
     --------
     line_differences
         Calculate just line differences.
+    token_line_differences
+        Calculate just line differences with the token engine.
 
     Notes
     -----
     Unchanged lines are excluded.
     """
-    return TextComparison(
+    if engine not in ALL_DIFF_ENGINES:
+        raise ValueError(
+            f"Unknown diff engine: '{engine}'. Options: {ALL_DIFF_ENGINES}"
+        )
+
+    if cache is not None:
+        key = comparison_key(
+            text_1,
+            text_2,
+            engine=engine,
+            similarity_calc=callable_identity(similarity_calc),
+            word_split_func=callable_identity(word_split_func),
+        )
+        stored = cache.get(key)
+        if stored is not None:
+            return pickle.loads(stored)
+
+    compare_lines = (
+        token_line_differences if engine == DiffEngines.token else line_differences
+    )
+    comparison = TextComparison(
         similarity_calc(text_1, text_2),
-        list(
-            line_differences(text_1.splitlines(), text_2.splitlines(), word_split_func)
-        ),
+        list(compare_lines(text_1.splitlines(), text_2.splitlines(), word_split_func)),
     )
+
+    if cache is not None:
+        cache.set(key, pickle.dumps(comparison, protocol=pickle.HIGHEST_PROTOCOL))
+
+    return comparison
+
+
+###############################################################################
+
+
+class DiffKinds:
+    modified = "modified"
+    removed = "removed"
+    added = "added"
+
+
+class WordDifference(NamedTuple):
+    # One of DiffKinds
+    kind: str
+    # Position of the word in the whole left / right transcript
+    # None if the word was added / removed
+    word_index_1: Optional[int]
+    word_index_2: Optional[int]
+    # Index of the sentence the word is in
+    sentence_index_1: Optional[int]
+    sentence_index_2: Optional[int]
+    text_1: Optional[str]
+    text_2: Optional[str]
+    start_time_1: Optional[float]
+    end_time_1: Optional[float]
+    start_time_2: Optional[float]
+    end_time_2: Optional[float]
+
+    def __str__(self) -> str:
+        if self.kind == DiffKinds.modified:
+            return f"Modified: {self.text_1} -> {self.text_2}"
+        if self.kind == DiffKinds.removed:
+            return f"Removed: {self.text_1}"
+        return f"Added: {self.text_2}"
+
+
+class SentenceComparison(NamedTuple):
+    # Half open range of the left / right sentences in this changed block
+    # Most blocks are a single sentence on each side, resegmented sentences
+    # (one sentence split into two, or two merged into one) form larger blocks
+    sentence_start_1: int
+    sentence_end_1: int
+    sentence_start_2: int
+    sentence_end_2: int
+    # Time span of the block's sentences, None if there are none on that side
+    start_time_1: Optional[float]
+    end_time_1: Optional[float]
+    start_time_2: Optional[float]
+    end_time_2: Optional[float]
+    # The different words in this block
+    words: List[WordDifference]
+
+    @property
+    def kind(self) -> str:
+        """
+        Returns
+        -------
+        str
+            DiffKinds.removed if the block has no right sentences,
+            DiffKinds.added if the block has no left sentences,
+            DiffKinds.modified otherwise.
+        """
+        if self.sentence_start_2 == self.sentence_end_2:
+            return DiffKinds.removed
+        if self.sentence_start_1 == self.sentence_end_1:
+            return DiffKinds.added
+        return DiffKinds.modified
+
+    def __str__(self) -> str:
+        words_str = ", ".join(map(str, self.words))
+        return (
+            f"    sentences: {self.kind} "
+            f"[{self.sentence_start_1}:{self.sentence_end_1}] -> "
+            f"[{self.sentence_start_2}:{self.sentence_end_2}]\n"
+            f"    words: [{words_str}]\n"
+        )
+
+
+class TranscriptComparison(NamedTuple):
+    # Word level similarity between the left and right transcripts (0-100)
+    similarity: float
+    # List of changed sentence blocks
+    sentences: List[SentenceComparison]
+    # Total number of words in the left / right transcripts
+    n_words_1: int
+    n_words_2: int
+
+    def _count(self, kind: str) -> int:
+        return sum(
+            word.kind == kind for sentence in self.sentences for word in sentence.words
+        )
+
+    @property
+    def substitutions(self) -> int:
+        return self._count(DiffKinds.modified)
+
+    @property
+    def deletions(self) -> int:
+        return self._count(DiffKinds.removed)
+
+    @property
+    def insertions(self) -> int:
+        return self._count(DiffKinds.added)
+
+    @property
+    def word_error_rate(self) -> float:
+        """
+        Returns
+        -------
+        float
+            (substitutions + deletions + insertions) / number of left words,
+            treating the left transcript as the reference.
+        """
+        if self.n_words_1 == 0:
+            return 0.0 if self.n_words_2 == 0 else float("inf")
+        n_errors = self.substitutions + self.deletions + self.insertions
+        return n_errors / self.n_words_1
+
+    def __str__(self) -> str:
+        sentences_str = "\n".join(map(str, self.sentences))
+        return f"similarity: {self.similarity}\n" f"sentences: [\n{sentences_str}\n]"
+
+
+def _changed_blocks(
+    keys_1: List[Any], keys_2: List[Any]
+) -> Iterator[Tuple[int, int, int, int]]:
+    # Merge runs of adjacent non-equal opcodes, a sentence split into two
+    # becomes a single "replace + insert" block rather than two unrelated ones
+    block: Optional[List[int]] = None
+    for opcode in Levenshtein.opcodes(keys_1, keys_2):
+        if opcode.tag == "equal":
+            if block is not None:
+                yield block[0], block[1], block[2], block[3]
+                block = None
+            continue
+
+        if block is None:
+            block = [
+                opcode.src_start,
+                opcode.src_end,
+                opcode.dest_start,
+                opcode.dest_end,
+            ]
+        else:
+            block[1] = opcode.src_end
+            block[3] = opcode.dest_end
+
+    if block is not None:
+        yield block[0], block[1], block[2], block[3]
+
+
+def _word_difference(
+    kind: str,
+    columns_1: ColumnarTranscript,
+    columns_2: ColumnarTranscript,
+    word_index_1: Optional[int],
+    word_index_2: Optional[int],
+) -> WordDifference:
+    fields: Dict[str, Any] = {}
+    for side, columns, word_index in (
+        (1, columns_1, word_index_1),
+        (2, columns_2, word_index_2),
+    ):
+        values: Tuple[Any, ...]
+        if word_index is None:
+            values = (None, None, None, None)
+        else:
+            values = (
+                int(columns.word_sentence_index[word_index]),
+                columns.word_text[word_index],
+                float(columns.word_start_time[word_index]),
+                float(columns.word_end_time[word_index]),
+            )
+        fields[f"sentence_index_{side}"] = values[0]
+        fields[f"text_{side}"] = values[1]
+        fields[f"start_time_{side}"] = values[2]
+        fields[f"end_time_{side}"] = values[3]
+
+    return WordDifference(
+        kind=kind,
+        word_index_1=word_index_1,
+        word_index_2=word_index_2,
+        **fields,
+    )
+
+
+def _block_time_span(
+    columns: ColumnarTranscript, start: int, end: int
+) -> Tuple[Optional[float], Optional[float]]:
+    if start == end:
+        return None, None
+    return (
+        float(columns.sentence_start_time[start]),
+        float(columns.sentence_end_time[end - 1]),
+    )
+
+
+def iter_transcript_differences(
+    transcript_1: Union["Transcript", Dict[str, Any], ColumnarTranscript],
+    transcript_2: Union["Transcript", Dict[str, Any], ColumnarTranscript],
+    normalize: Optional[Callable[[str], str]] = None,
+) -> Iterator[SentenceComparison]:
+    """
+    Yield the changed sentence blocks of transcript_differences one at a time,
+    so consumers that write them out never hold every difference at once.
+
+    Parameters
+    ----------
+    transcript_1: Union[Transcript, Dict[str, Any], ColumnarTranscript]
+        Left transcript
+    transcript_2: Union[Transcript, Dict[str, Any], ColumnarTranscript]
+        Right transcript
+    normalize: Optional[Callable[[str], str]]
+        Function applied to each word before comparing, e.g. str.lower.
+        Default: None (compare words as is)
+
+    Yields
+    ------
+    SentenceComparison
+        Each changed sentence block, in transcript order.
+
+    See Also
+    --------
+    transcript_differences
+        All changed blocks plus similarity and error counts.
+    """
+    columns_1 = to_columnar(transcript_1)
+    columns_2 = to_columnar(transcript_2)
+
+    tokens_1 = columns_1.word_text
+    tokens_2 = columns_2.word_text
+    if normalize is not None:
+        tokens_1 = [normalize(token) for token in tokens_1]
+        tokens_2 = [normalize(token) for token in tokens_2]
+
+    offsets_1 = columns_1.word_offsets.tolist()
+    offsets_2 = columns_2.word_offsets.tolist()
+    sentence_keys_1 = [
+        tuple(tokens_1[start:end]) for start, end in zip(offsets_1, offsets_1[1:])
+    ]
+    sentence_keys_2 = [
+        tuple(tokens_2[start:end]) for start, end in zip(offsets_2, offsets_2[1:])
+    ]
+
+    for (
+        sentence_start_1,
+        sentence_end_1,
+        sentence_start_2,
+        sentence_end_2,
+    ) in _changed_blocks(sentence_keys_1, sentence_keys_2):
+        word_start_1, word_end_1 = (
+            offsets_1[sentence_start_1],
+            offsets_1[sentence_end_1],
+        )
+        word_start_2, word_end_2 = (
+            offsets_2[sentence_start_2],
+            offsets_2[sentence_end_2],
+        )
+
+        words = []
+        for opcode in Levenshtein.opcodes(
+            tokens_1[word_start_1:word_end_1],
+            tokens_2[word_start_2:word_end_2],
+        ):
+            src_start = word_start_1 + opcode.src_start
+            dest_start = word_start_2 + opcode.dest_start
+            n_src = opcode.src_end - opcode.src_start
+            n_dest = opcode.dest_end - opcode.dest_start
+            if opcode.tag == "equal":
+                continue
+
+            # Levenshtein replace blocks are always the same length on both sides
+            for offset in range(min(n_src, n_dest)):
+                words.append(
+                    _word_difference(
+                        DiffKinds.modified,
+                        columns_1,
+                        columns_2,
+                        src_start + offset,
+                        dest_start + offset,
+                    )
+                )
+            for offset in range(min(n_src, n_dest), n_src):
+                words.append(
+                    _word_difference(
+                        DiffKinds.removed,
+                        columns_1,
+                        columns_2,
+                        src_start + offset,
+                        None,
+                    )
+                )
+            for offset in range(min(n_src, n_dest), n_dest):
+                words.append(
+                    _word_difference(
+                        DiffKinds.added, columns_1, columns_2, None, dest_start + offset
+                    )
+                )
+
+        # Sentences that only differ in sentence text or segmentation
+        if len(words) == 0:
+            continue
+
+        start_time_1, end_time_1 = _block_time_span(
+            columns_1, sentence_start_1, sentence_end_1
+        )
+        start_time_2, end_time_2 = _block_time_span(
+            columns_2, sentence_start_2, sentence_end_2
+        )
+        yield SentenceComparison(
+            sentence_start_1=sentence_start_1,
+            sentence_end_1=sentence_end_1,
+            sentence_start_2=sentence_start_2,
+            sentence_end_2=sentence_end_2,
+            start_time_1=start_time_1,
+            end_time_1=end_time_1,
+            start_time_2=start_time_2,
+            end_time_2=end_time_2,
+            words=words,
+        )
+
+
+def transcript_differences(
+    transcript_1: Union["Transcript", Dict[str, Any], ColumnarTranscript],
+    transcript_2: Union["Transcript", Dict[str, Any], ColumnarTranscript],
+    normalize: Optional[Callable[[str], str]] = None,
+) -> TranscriptComparison:
+    """
+    Compare left and right transcripts sentence by sentence, then word by word
+    within the changed sentences, directly on the transcript structure.
+
+    Parameters
+    ----------
+    transcript_1: Union[Transcript, Dict[str, Any], ColumnarTranscript]
+        Left transcript (treated as the reference for error counts)
+    transcript_2: Union[Transcript, Dict[str, Any], ColumnarTranscript]
+        Right transcript
+    normalize: Optional[Callable[[str], str]]
+        Function applied to each word before comparing, e.g. str.lower.
+        Reported word text is always the original.
+        Default: None (compare words as is)
+
+    Returns
+    -------
+    TranscriptComparison
+        Word level similarity score
+        List of changed sentence blocks, with sentence and word indices and
+        timestamps for both sides
+
+    See Also
+    --------
+    text_differences
+        Compare plain text blobs line by line.
+    iter_transcript_differences
+        Yield the changed sentence blocks one at a time.
+    whisper_experiments.columnar.to_columnar
+        Convert a transcript to columns ahead of time to reuse across comparisons.
+
+    Notes
+    -----
+    Unchanged sentences and words are excluded.
+    Sentences are first aligned on their (normalized) words, so sentences
+    that only differ in punctuation or casing of the sentence text are equal.
+    Similarity is 2 * matching words / total words * 100.
+    """
+    columns_1 = to_columnar(transcript_1)
+    columns_2 = to_columnar(transcript_2)
+    sentences = list(iter_transcript_differences(columns_1, columns_2, normalize))
+    comparison = TranscriptComparison(
+        similarity=100.0,
+        sentences=sentences,
+        n_words_1=columns_1.n_words,
+        n_words_2=columns_2.n_words,
+    )
+
+    # Every left word is matched, substituted, or removed
+    n_total = columns_1.n_words + columns_2.n_words
+    n_matches = columns_1.n_words - comparison.substitutions - comparison.deletions
+    if n_total == 0:
+        return comparison
+    return comparison._replace(similarity=200.0 * n_matches / n_total)
@@ -0,0 +1,485 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    Iterable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+)
+
+import numpy as np
+from rapidfuzz import fuzz, process
+
+from .diff import DiffKinds, LineComparison, _changed_blocks
+
+###############################################################################
+
+# fuzz.ratio score (0-100) at or above which a substitution is a near miss,
+# the same cutoff difflib uses to pair similar lines
+DEFAULT_NEAR_MISS_THRESHOLD = 75.0
+DEFAULT_CACHE_SIZE = 2**16
+
+# Regions with at most this many unique word pairs are scored through the cache,
+# larger regions are scored in bulk without filling it
+_CACHED_REGION_SIZE = 256
+
+# Penalty per unit of distance from a region's diagonal, only breaks score ties
+_DIAGONAL_PENALTY = 1e-3
+
+###############################################################################
+
+
+class SubstitutionKinds:
+    # A misspelling or small variation of the same word, e.g. "you" -> "yoou"
+    near_miss = "near-miss"
+    # A different word
+    real = "real"
+
+
+ALL_SUBSTITUTION_KINDS = [
+    getattr(SubstitutionKinds, attr)
+    for attr in dir(SubstitutionKinds)
+    if "__" not in attr
+]
+
+
+class WordPair(NamedTuple):
+    # One of DiffKinds
+    kind: str
+    # One of SubstitutionKinds for modified words, None otherwise
+    substitution_kind: Optional[str]
+    # Position of the word in the left / right words
+    # None if the word was added / removed
+    word_index_1: Optional[int]
+    word_index_2: Optional[int]
+    text_1: Optional[str]
+    text_2: Optional[str]
+    # Similarity of the two words (0-100), None if the word was added / removed
+    score: Optional[float]
+
+    def __str__(self) -> str:
+        if self.kind == DiffKinds.modified:
+            return (
+                f"Modified ({self.substitution_kind}): "
+                f"{self.text_1} -> {self.text_2}"
+            )
+        if self.kind == DiffKinds.removed:
+            return f"Removed: {self.text_1}"
+        return f"Added: {self.text_2}"
+
+
+class FuzzyWordComparison(NamedTuple):
+    # The different words, in order
+    pairs: List[WordPair]
+    # Total number of left / right words
+    n_words_1: int
+    n_words_2: int
+
+    def _count(self, kind: str, substitution_kind: Optional[str] = None) -> int:
+        return sum(
+            pair.kind == kind
+            and (
+                substitution_kind is None or pair.substitution_kind == substitution_kind
+            )
+            for pair in self.pairs
+        )
+
+    @property
+    def near_misses(self) -> int:
+        return self._count(DiffKinds.modified, SubstitutionKinds.near_miss)
+
+    @property
+    def real_substitutions(self) -> int:
+        return self._count(DiffKinds.modified, SubstitutionKinds.real)
+
+    @property
+    def substitutions(self) -> int:
+        return self._count(DiffKinds.modified)
+
+    @property
+    def deletions(self) -> int:
+        return self._count(DiffKinds.removed)
+
+    @property
+    def insertions(self) -> int:
+        return self._count(DiffKinds.added)
+
+    @property
+    def word_error_rate(self) -> float:
+        """
+        Returns
+        -------
+        float
+            (substitutions + deletions + insertions) / number of left words
+        """
+        if self.n_words_1 == 0:
+            return 0.0 if self.n_words_2 == 0 else float("inf")
+        n_errors = self.substitutions + self.deletions + self.insertions
+        return n_errors / self.n_words_1
+
+    @property
+    def real_word_error_rate(self) -> float:
+        """
+        Returns
+        -------
+        float
+            The word error rate not counting near misses.
+        """
+        if self.n_words_1 == 0:
+            return 0.0 if self.n_words_2 == 0 else float("inf")
+        n_errors = self.real_substitutions + self.deletions + self.insertions
+        return n_errors / self.n_words_1
+
+
+###############################################################################
+
+
+class PairScoreCache:
+    """
+    In memory least recently used cache of word pair scores.
+
+    Share one cache across comparisons (of the same scorer) so that pairs that
+    keep reappearing, e.g. "the" -> "a", are only scored once.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_CACHE_SIZE):
+        """
+        Parameters
+        ----------
+        max_size: int
+            The maximum number of pairs kept.
+            Default: 65536
+        """
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._scores: "OrderedDict[Tuple[Hashable, str, str], float]" = OrderedDict()
+
+    def get(self, key: Tuple[Hashable, str, str]) -> Optional[float]:
+        score = self._scores.get(key)
+        if score is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._scores.move_to_end(key)
+        return score
+
+    def set(self, key: Tuple[Hashable, str, str], score: float) -> None:
+        self._scores[key] = score
+        self._scores.move_to_end(key)
+        if len(self._scores) > self.max_size:
+            self._scores.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._scores)
+
+
+def _unique(words: List[str]) -> Tuple[List[str], np.ndarray]:
+    # Unique words in order of appearance and the index of each word in them
+    index: Dict[str, int] = {}
+    inverse = [index.setdefault(word, len(index)) for word in words]
+    return list(index), np.asarray(inverse, dtype=np.intp)
+
+
+def _pair_score(
+    word_1: str,
+    word_2: str,
+    scorer: Callable[..., float],
+    cache: Optional[PairScoreCache],
+) -> float:
+    if cache is None:
+        return scorer(word_1, word_2)
+    key = (scorer, word_1, word_2)
+    score = cache.get(key)
+    if score is None:
+        score = scorer(word_1, word_2)
+        cache.set(key, score)
+    return score
+
+
+def _substitution(
+    word_index_1: int,
+    word_index_2: int,
+    text_1: str,
+    text_2: str,
+    score: float,
+    near_miss_threshold: float,
+) -> WordPair:
+    return WordPair(
+        kind=DiffKinds.modified,
+        substitution_kind=(
+            SubstitutionKinds.near_miss
+            if score >= near_miss_threshold
+            else SubstitutionKinds.real
+        ),
+        word_index_1=word_index_1,
+        word_index_2=word_index_2,
+        text_1=text_1,
+        text_2=text_2,
+        score=score,
+    )
+
+
+def _score_matrix(
+    unique_1: List[str],
+    unique_2: List[str],
+    scorer: Callable[..., float],
+    cache: Optional[PairScoreCache],
+    workers: int,
+) -> np.ndarray:
+    if cache is not None and len(unique_1) * len(unique_2) <= _CACHED_REGION_SIZE:
+        cached = [
+            [cache.get((scorer, word_1, word_2)) for word_2 in unique_2]
+            for word_1 in unique_1
+        ]
+        if all(score is not None for row in cached for score in row):
+            return np.asarray(cached, dtype=np.float32)
+
+        scores = process.cdist(unique_1, unique_2, scorer=scorer, workers=workers)
+        for word_1, row in zip(unique_1, scores.tolist()):
+            for word_2, score in zip(unique_2, row):
+                cache.set((scorer, word_1, word_2), score)
+        return scores
+
+    return process.cdist(unique_1, unique_2, scorer=scorer, workers=workers)
+
+
+def _segment_cost(start_1: int, end_1: int, start_2: int, end_2: int) -> int:
+    # Words between two pairs are paired in order, the rest removed / added
+    return max(end_1 - start_1, end_2 - start_2)
+
+
+def _pair_region(
+    words_1: List[str],
+    words_2: List[str],
+    start_1: int,
+    end_1: int,
+    start_2: int,
+    end_2: int,
+    scorer: Callable[..., float],
+    near_miss_threshold: float,
+    cache: Optional[PairScoreCache],
+    workers: int,
+) -> Iterator[WordPair]:
+    region_1 = words_1[start_1:end_1]
+    region_2 = words_2[start_2:end_2]
+    n_1 = len(region_1)
+    n_2 = len(region_2)
+
+    # Most regions are a single substituted word, score it without numpy
+    if n_1 == 1 and n_2 == 1:
+        score = _pair_score(region_1[0], region_2[0], scorer, cache)
+        yield _substitution(
+            start_1, start_2, region_1[0], region_2[0], score, near_miss_threshold
+        )
+        return
+
+    anchors_1: List[int] = []
+    anchors_2: List[int] = []
+    if n_1 > 0 and n_2 > 0:
+        unique_1, inverse_1 = _unique(region_1)
+        unique_2, inverse_2 = _unique(region_2)
+        scores = _score_matrix(unique_1, unique_2, scorer, cache, workers)[
+            np.ix_(inverse_1, inverse_2)
+        ]
+
+        # Candidate pairs are mutual best matches above the threshold, with
+        # ties (repeated words) going to the pair closest to the diagonal
+        diagonal = np.abs(np.arange(n_1)[:, None] / n_1 - np.arange(n_2)[None, :] / n_2)
+        ranked = scores - _DIAGONAL_PENALTY * diagonal
+        best_2 = ranked.argmax(axis=1)
+        best_1 = ranked.argmax(axis=0)
+        rows = np.arange(n_1)
+        candidates = rows[
+            (best_1[best_2] == rows) & (scores[rows, best_2] >= near_miss_threshold)
+        ]
+        order = np.argsort(-ranked[candidates, best_2[candidates]], kind="stable")
+
+        # Keep the best candidates that stay in order and don't add errors
+        # compared with pairing the words between their neighbours in order
+        for i in candidates[order].tolist():
+            j = int(best_2[i])
+            k = bisect_left(anchors_1, i)
+            low_1 = anchors_1[k - 1] + 1 if k > 0 else 0
+            low_2 = anchors_2[k - 1] + 1 if k > 0 else 0
+            high_1 = anchors_1[k] if k < len(anchors_1) else n_1
+            high_2 = anchors_2[k] if k < len(anchors_2) else n_2
+            if not low_2 <= j < high_2:
+                continue
+            cost = 1 + _segment_cost(low_1, i, low_2, j)
+            cost += _segment_cost(i + 1, high_1, j + 1, high_2)
+            if cost <= _segment_cost(low_1, high_1, low_2, high_2):
+                anchors_1.insert(k, i)
+                anchors_2.insert(k, j)
+
+    # Walk the segments between the kept pairs
+    i = j = 0
+    for anchor_1, anchor_2 in zip(anchors_1 + [n_1], anchors_2 + [n_2]):
+        while i < anchor_1 or j < anchor_2:
+            if i < anchor_1 and j < anchor_2:
+                yield _substitution(
+                    start_1 + i,
+                    start_2 + j,
+                    region_1[i],
+                    region_2[j],
+                    float(scores[i, j]),
+                    near_miss_threshold,
+                )
+                i += 1
+                j += 1
+            elif i < anchor_1:
+                yield WordPair(
+                    DiffKinds.removed, None, start_1 + i, None, region_1[i], None, None
+                )
+                i += 1
+            else:
+                yield WordPair(
+                    DiffKinds.added, None, None, start_2 + j, None, region_2[j], None
+                )
+                j += 1
+
+        if anchor_1 < n_1:
+            yield _substitution(
+                start_1 + anchor_1,
+                start_2 + anchor_2,
+                region_1[anchor_1],
+                region_2[anchor_2],
+                float(scores[anchor_1, anchor_2]),
+                near_miss_threshold,
+            )
+            i = anchor_1 + 1
+            j = anchor_2 + 1
+
+
+def fuzzy_word_differences(
+    words_1: Iterable[str],
+    words_2: Iterable[str],
+    scorer: Callable[..., float] = fuzz.ratio,
+    near_miss_threshold: float = DEFAULT_NEAR_MISS_THRESHOLD,
+    cache: Optional[PairScoreCache] = None,
+    workers: int = 1,
+) -> FuzzyWordComparison:
+    """
+    Compare two lists of words, pairing changed words by similarity and
+    classifying each substitution as a near miss or a real substitution.
+
+    Words are first aligned exactly. Within each changed region, every removed
+    word is scored against every added word in one bulk call, and the most
+    similar words are paired even if they are not in the same position.
+
+    Parameters
+    ----------
+    words_1: Iterable[str]
+        Left list of words (treated as the reference for error counts)
+    words_2: Iterable[str]
+        Right list of words
+    scorer: Callable[..., float]
+        A rapidfuzz scorer returning a similarity between 0 and 100.
+        Default: rapidfuzz.fuzz.ratio
+    near_miss_threshold: float
+        The score at or above which a substitution is a near miss.
+        Default: 75.0
+    cache: Optional[PairScoreCache]
+        A cache for the scores of word pairs, shared across calls.
+        Default: None (no caching)
+    workers: int
+        The number of threads used to score large regions, -1 for all CPUs.
+        Default: 1
+
+    Returns
+    -------
+    FuzzyWordComparison
+        The removed, added, and modified words with substitution kinds and scores.
+
+    See Also
+    --------
+    whisper_experiments.diff.word_differences
+        Word differences without scores or substitution kinds.
+
+    Notes
+    -----
+    Similar words are only paired out of position when that doesn't add errors,
+    so substitutions + deletions + insertions is always the word level edit
+    distance of the two lists.
+    """
+    words_1 = list(words_1)
+    words_2 = list(words_2)
+    pairs: List[WordPair] = []
+    for start_1, end_1, start_2, end_2 in _changed_blocks(words_1, words_2):
+        pairs.extend(
+            _pair_region(
+                words_1,
+                words_2,
+                start_1,
+                end_1,
+                start_2,
+                end_2,
+                scorer=scorer,
+                near_miss_threshold=near_miss_threshold,
+                cache=cache,
+                workers=workers,
+            )
+        )
+
+    return FuzzyWordComparison(pairs, len(words_1), len(words_2))
+
+
+def fuzzy_line_differences(
+    lines: Iterable[LineComparison],
+    word_split_func: Callable[[str], Iterable[str]] = str.split,
+    scorer: Callable[..., float] = fuzz.ratio,
+    near_miss_threshold: float = DEFAULT_NEAR_MISS_THRESHOLD,
+    cache: Optional[PairScoreCache] = None,
+    workers: int = 1,
+) -> Iterator[FuzzyWordComparison]:
+    """
+    Pair and classify the words inside each changed line of a comparison.
+
+    Parameters
+    ----------
+    lines: Iterable[LineComparison]
+        The line differences, e.g. TextComparison.lines.
+    word_split_func: Callable[[str], Iterable[str]]
+        Function used to split a line into words.
+        Default is str.split()
+    scorer: Callable[..., float]
+        A rapidfuzz scorer returning a similarity between 0 and 100.
+        Default: rapidfuzz.fuzz.ratio
+    near_miss_threshold: float
+        The score at or above which a substitution is a near miss.
+        Default: 75.0
+    cache: Optional[PairScoreCache]
+        A cache for the scores of word pairs.
+        Default: None (a new cache shared by the lines of this call)
+    workers: int
+        The number of threads used to score large regions, -1 for all CPUs.
+        Default: 1
+
+    Yields
+    ------
+    FuzzyWordComparison
+        The word pairs of each line, in the order of the lines. Word indices are
+        positions within the line.
+    """
+    if cache is None:
+        cache = PairScoreCache()
+
+    for line in lines:
+        content_before = line.line.content_before
+        content_after = line.line.content_after
+        yield fuzzy_word_differences(
+            [] if content_before is None else word_split_func(content_before),
+            [] if content_after is None else word_split_func(content_after),
+            scorer=scorer,
+            near_miss_threshold=near_miss_threshold,
+            cache=cache,
+            workers=workers,
+        )
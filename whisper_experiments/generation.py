@@ -0,0 +1,230 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import logging
+import shutil
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict
+
+from .data import ARCHIVED_DATA_PATH, FullDatasetFields
+from .serialization import transcript_suffix
+from .work_queue import WorkQueue
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+###############################################################################
+
+log = logging.getLogger(__name__)
+
+###############################################################################
+
+QUEUE_DB_NAME = "queue.sqlite"
+SESSIONS_NAME = "sessions.parquet"
+GROUND_TRUTH_DIR_NAME = "ground-truth"
+GSR_DIR_NAME = "gsr-transcripts"
+
+###############################################################################
+
+
+def queue_db_path(queue_dir: Path) -> Path:
+    """
+    Returns
+    -------
+    Path
+        The path to the work queue database of a generation queue directory.
+    """
+    return Path(queue_dir) / QUEUE_DB_NAME
+
+
+def enqueue_generation(sessions: "pd.DataFrame", queue_dir: Path) -> int:
+    """
+    Store the ground truth dataset in a shared generation queue directory and
+    add a transcription task for every session.
+
+    Parameters
+    ----------
+    sessions: pd.DataFrame
+        The ground truth dataset, see data.get_ground_truth_dataset.
+    queue_dir: Path
+        The shared directory workers read tasks from and write results to.
+        Sessions already enqueued are left untouched.
+
+    Returns
+    -------
+    int
+        The number of newly added tasks.
+
+    Notes
+    -----
+    Layout::
+
+        {queue_dir}/
+        ├── queue.sqlite
+        ├── sessions.parquet
+        ├── ground-truth/
+        │   └── {session-id}.json
+        └── gsr-transcripts/
+            └── {session-id}.json.gz
+    """
+    import pandas as pd
+
+    queue_dir = Path(queue_dir)
+    ground_truth_dir = queue_dir / GROUND_TRUTH_DIR_NAME
+    ground_truth_dir.mkdir(parents=True, exist_ok=True)
+    (queue_dir / GSR_DIR_NAME).mkdir(exist_ok=True)
+
+    # Copy ground truths into the shared store so any machine can merge
+    sessions = sessions.copy()
+    relative_paths = []
+    for session_id, transcript_path in zip(
+        sessions[FullDatasetFields.id_],
+        sessions[FullDatasetFields.ground_truth_transcript_path],
+    ):
+        relative_path = Path(GROUND_TRUTH_DIR_NAME) / (
+            f"{session_id}{transcript_suffix(transcript_path)}"
+        )
+        shutil.copyfile(transcript_path, queue_dir / relative_path)
+        relative_paths.append(relative_path.as_posix())
+    sessions[FullDatasetFields.ground_truth_transcript_path] = relative_paths
+
+    # Keep previously enqueued sessions
+    sessions_path = queue_dir / SESSIONS_NAME
+    if sessions_path.exists():
+        sessions = pd.concat(
+            [pd.read_parquet(sessions_path), sessions], ignore_index=True
+        ).drop_duplicates(subset=FullDatasetFields.id_)
+    sessions.to_parquet(sessions_path)
+
+    queue = WorkQueue(queue_db_path(queue_dir))
+    try:
+        return queue.enqueue(
+            {
+                session_id: {FullDatasetFields.audio_uri: audio_uri}
+                for session_id, audio_uri in zip(
+                    sessions[FullDatasetFields.id_],
+                    sessions[FullDatasetFields.audio_uri],
+                )
+            }
+        )
+    finally:
+        queue.close()
+
+
+def gsr_transcribe_task(
+    session_id: str,
+    payload: Dict[str, Any],
+    queue_dir: Path,
+    credentials_file: str,
+) -> Dict[str, Any]:
+    """
+    Transcribe a single enqueued session with Google Speech-to-Text.
+
+    Meant to be bound with functools.partial and passed to work_queue.run_worker.
+
+    Parameters
+    ----------
+    session_id: str
+        The id of the session to transcribe.
+    payload: Dict[str, Any]
+        The task payload, containing the session audio URI.
+    queue_dir: Path
+        The shared generation queue directory.
+    credentials_file: str
+        The path to the Google Service Account Credentials JSON for the
+        processing account / project.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The transcript path (relative to the queue directory) and the
+        transcription time to store as the task result.
+    """
+    from .model import GSRTranscribeParams, _wrapped_gsr_transcribe
+
+    result = _wrapped_gsr_transcribe(
+        GSRTranscribeParams(
+            row_index=0,
+            session_id=session_id,
+            audio_uri=payload[FullDatasetFields.audio_uri],
+            credentials_file=credentials_file,
+            storage_dir=Path(queue_dir) / GSR_DIR_NAME,
+        )
+    )
+    return {
+        FullDatasetFields.gsr_transcript_path: (
+            Path(GSR_DIR_NAME) / Path(result.gsr_transcript_path).name
+        ).as_posix(),
+        FullDatasetFields.gsr_transcription_time: result.gsr_transcription_time,
+    }
+
+
+def merge_generation(
+    queue_dir: Path,
+    archive_name: Path = ARCHIVED_DATA_PATH.with_suffix(""),
+    allow_partial: bool = False,
+) -> Path:
+    """
+    Combine the sessions and worker results of a generation queue into the
+    data archive.
+
+    Parameters
+    ----------
+    queue_dir: Path
+        The shared generation queue directory.
+    archive_name: Path
+        The path to store the archive to (without the ".zip" suffix).
+        Default: the packaged archive path
+    allow_partial: bool
+        Archive only the completed sessions even if tasks are still pending,
+        leased, or have failed.
+        Default: False (raise if any task is not done)
+
+    Returns
+    -------
+    Path
+        The path to the created archive.
+
+    Raises
+    ------
+    ValueError
+        If any task is not done and allow_partial is False.
+    """
+    import pandas as pd
+
+    from .data import _archive_dataset
+
+    queue_dir = Path(queue_dir)
+    queue = WorkQueue(queue_db_path(queue_dir))
+    try:
+        counts = queue.counts
+        if not allow_partial and counts.done != counts.total:
+            raise ValueError(
+                f"Generation queue is not complete ({counts}), "
+                f"failed tasks: {queue.errors()}"
+            )
+        results = queue.results()
+    finally:
+        queue.close()
+
+    sessions = pd.read_parquet(queue_dir / SESSIONS_NAME)
+    sessions = sessions[sessions[FullDatasetFields.id_].isin(results.keys())]
+    sessions = sessions.reset_index(drop=True)
+    log.info(f"Merging {len(sessions)} completed sessions")
+
+    # Attach results and resolve every path against the shared directory
+    for column in (
+        FullDatasetFields.gsr_transcript_path,
+        FullDatasetFields.gsr_transcription_time,
+    ):
+        sessions[column] = [
+            results[session_id][column]
+            for session_id in sessions[FullDatasetFields.id_]
+        ]
+    for column in (
+        FullDatasetFields.ground_truth_transcript_path,
+        FullDatasetFields.gsr_transcript_path,
+    ):
+        sessions[column] = [str(queue_dir / path) for path in sessions[column]]
+
+    return _archive_dataset(sessions, archive_name=archive_name)
@@ -0,0 +1,510 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from bisect import bisect_left, bisect_right
+from itertools import accumulate
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Tuple
+
+from rapidfuzz.distance import Levenshtein
+
+from .diff import AddedWord, RemovedWord, TextDiff, _masked_modification
+
+###############################################################################
+
+# Matching words on each side of an edit that are kept fixed when re-aligning
+DEFAULT_ANCHOR_LENGTH = 16
+
+_EQUAL = "equal"
+_REPLACE = "replace"
+_DELETE = "delete"
+_INSERT = "insert"
+
+###############################################################################
+
+
+class WordOpcode(NamedTuple):
+    # One of "equal", "replace", "delete", "insert"
+    tag: str
+    # Half open word range of the left / right side
+    src_start: int
+    src_end: int
+    dest_start: int
+    dest_end: int
+
+
+# (tag, number of left words, number of right words)
+_Block = Tuple[str, int, int]
+
+
+def _align(words_1: List[str], words_2: List[str]) -> List[_Block]:
+    return [
+        (
+            opcode.tag,
+            opcode.src_end - opcode.src_start,
+            opcode.dest_end - opcode.dest_start,
+        )
+        for opcode in Levenshtein.opcodes(words_1, words_2)
+    ]
+
+
+def _block_errors(block: _Block) -> Tuple[int, int, int]:
+    # (substitutions, deletions, insertions)
+    tag, n_1, n_2 = block
+    if tag == _REPLACE:
+        return n_1, 0, 0
+    if tag == _DELETE:
+        return 0, n_1, 0
+    if tag == _INSERT:
+        return 0, 0, n_2
+    return 0, 0, 0
+
+
+def _blocks_distance(blocks: List[_Block]) -> int:
+    return sum(sum(_block_errors(block)) for block in blocks)
+
+
+def _block_start(ends: List[int], k: int) -> int:
+    # The start of the kth block on one side, given the block ends on that side
+    return ends[k - 1] if k > 0 else 0
+
+
+class _Window(NamedTuple):
+    # The old blocks replaced by the re-aligned window
+    first_replaced: int
+    last_replaced: int
+    # Word ranges of the window on the edited and the other side, before the
+    # edit is applied
+    start: int
+    end: int
+    other_start: int
+    other_end: int
+    # Words of the anchor runs kept before and after the window, 0 when the
+    # window reaches the start or end of the texts
+    n_prefix_anchor: int
+    n_suffix_anchor: int
+
+
+class IncrementalComparison:
+    """
+    A word level comparison of two texts that is updated in place when a range
+    of lines or words on either side is replaced.
+
+    Only the region between the nearest runs of anchor_length matching words
+    around an edit is re-aligned, so the cost of an update depends on the size
+    of the edit and the differences around it, not on the length of the texts.
+
+    Notes
+    -----
+    The anchor runs need not lie on an optimal alignment of the full texts,
+    e.g. in very repetitive text. After re-aligning the window it is widened
+    past further anchors on both sides for as long as that lowers the distance,
+    which keeps the cost local. This finds the optimal alignment in practice but
+    not provably: a cheaper alignment that only appears across a much wider
+    region can be missed. Set exact to check every update against the full
+    texts, or call verify() periodically.
+    """
+
+    def __init__(
+        self,
+        text_1: str,
+        text_2: str,
+        word_split_func: Callable[[str], Iterable[str]] = str.split,
+        anchor_length: int = DEFAULT_ANCHOR_LENGTH,
+        exact: bool = False,
+    ):
+        """
+        Parameters
+        ----------
+        text_1: str
+            Left text (treated as the reference for error counts)
+        text_2: str
+            Right text
+        word_split_func: Callable[[str], Iterable[str]]
+            Function used to split a line into words.
+            Default is str.split()
+        anchor_length: int
+            The number of consecutive matching words that bound a re-aligned
+            region. Larger is safer, smaller is faster.
+            Default: 16
+        exact: bool
+            Whether to verify every update against the edit distance of the full
+            texts, see verify(). Costs time proportional to the texts' length
+            per update.
+            Default: False (only the region around each edit is re-aligned)
+        """
+        if anchor_length < 1:
+            raise ValueError(f"anchor_length must be at least 1, got {anchor_length}")
+
+        self.word_split_func = word_split_func
+        self.anchor_length = anchor_length
+        self.exact = exact
+        self._words: Tuple[List[str], List[str]] = ([], [])
+        self._line_lengths: Tuple[List[int], List[int]] = ([], [])
+        for side, text in enumerate((text_1, text_2)):
+            for line in text.splitlines():
+                line_words = list(word_split_func(line))
+                self._words[side].extend(line_words)
+                self._line_lengths[side].append(len(line_words))
+
+        self.recompute()
+
+    ###########################################################################
+    # Results
+
+    @property
+    def words_1(self) -> List[str]:
+        return list(self._words[0])
+
+    @property
+    def words_2(self) -> List[str]:
+        return list(self._words[1])
+
+    @property
+    def n_lines_1(self) -> int:
+        return len(self._line_lengths[0])
+
+    @property
+    def n_lines_2(self) -> int:
+        return len(self._line_lengths[1])
+
+    @property
+    def distance(self) -> int:
+        """
+        Returns
+        -------
+        int
+            The word level edit distance between the texts.
+        """
+        return self.substitutions + self.deletions + self.insertions
+
+    @property
+    def similarity(self) -> float:
+        """
+        Returns
+        -------
+        float
+            Word level normalized Levenshtein similarity (0-100), i.e.
+            Levenshtein.normalized_similarity(words_1, words_2) * 100.
+        """
+        n_words = max(len(self._words[0]), len(self._words[1]))
+        if n_words == 0:
+            return 100.0
+        return (1 - self.distance / n_words) * 100
+
+    @property
+    def word_error_rate(self) -> float:
+        """
+        Returns
+        -------
+        float
+            Edit distance / number of left words.
+        """
+        if len(self._words[0]) == 0:
+            return 0.0 if len(self._words[1]) == 0 else float("inf")
+        return self.distance / len(self._words[0])
+
+    def opcodes(self) -> List[WordOpcode]:
+        """
+        Returns
+        -------
+        List[WordOpcode]
+            The current alignment as opcodes over the left and right words.
+        """
+        opcodes = []
+        start_1 = start_2 = 0
+        for tag, n_1, n_2 in self._blocks:
+            opcodes.append(
+                WordOpcode(tag, start_1, start_1 + n_1, start_2, start_2 + n_2)
+            )
+            start_1 += n_1
+            start_2 += n_2
+
+        return opcodes
+
+    def word_differences(self) -> Iterator[TextDiff]:
+        """
+        Yields
+        ------
+        TextDiff
+            Union[RemovedWord, AddedWord, ModifiedWord] wrapped as TextDiff,
+            in the order of the current alignment.
+        """
+        words_1, words_2 = self._words
+        for opcode in self.opcodes():
+            if opcode.tag == _REPLACE:
+                for i, j in zip(
+                    range(opcode.src_start, opcode.src_end),
+                    range(opcode.dest_start, opcode.dest_end),
+                ):
+                    yield TextDiff(_masked_modification(words_1[i], words_2[j]))
+            elif opcode.tag == _DELETE:
+                for i in range(opcode.src_start, opcode.src_end):
+                    yield TextDiff(RemovedWord(words_1[i]))
+            elif opcode.tag == _INSERT:
+                for j in range(opcode.dest_start, opcode.dest_end):
+                    yield TextDiff(AddedWord(words_2[j]))
+
+    ###########################################################################
+    # Updates
+
+    def recompute(self) -> None:
+        """
+        Re-align the full texts.
+        """
+        self._blocks = _align(*self._words)
+        self.substitutions = self.deletions = self.insertions = 0
+        self._add_errors(self._blocks, 1)
+
+    def verify(self) -> bool:
+        """
+        Check the current alignment against the edit distance of the full texts
+        and re-align everything if a cheaper alignment exists.
+
+        The check is banded by the current distance, so it is cheap when the texts
+        are similar, but it always reads both full texts.
+
+        Returns
+        -------
+        bool
+            Whether the current alignment was already optimal.
+        """
+        if self.distance > 0 and (
+            Levenshtein.distance(
+                self._words[0], self._words[1], score_cutoff=self.distance - 1
+            )
+            < self.distance
+        ):
+            self.recompute()
+            return False
+        return True
+
+    def _add_errors(self, blocks: List[_Block], sign: int) -> None:
+        for block in blocks:
+            substitutions, deletions, insertions = _block_errors(block)
+            self.substitutions += sign * substitutions
+            self.deletions += sign * deletions
+            self.insertions += sign * insertions
+
+    def replace_words(
+        self, side: int, start: int, end: int, words: Iterable[str]
+    ) -> None:
+        """
+        Replace a range of words on one side and update the comparison.
+
+        Parameters
+        ----------
+        side: int
+            1 for the left text, 2 for the right text.
+        start: int
+            Start of the replaced word range.
+        end: int
+            End of the replaced word range (exclusive). Equal to start to insert.
+        words: Iterable[str]
+            The new words. Empty to delete.
+
+        Notes
+        -----
+        The new words are added to the line the range starts in.
+        """
+        index = self._side_index(side)
+        words = list(words)
+        n_words = len(self._words[index])
+        if not 0 <= start <= end <= n_words:
+            raise IndexError(
+                f"Word range [{start}, {end}) out of bounds for {n_words} words"
+            )
+
+        # Remove the replaced words from their lines, add the new ones to the
+        # line the range starts in
+        line_lengths = self._line_lengths[index]
+        if len(line_lengths) == 0:
+            line_lengths.append(0)
+        line_ends = list(accumulate(line_lengths))
+        first_line = min(bisect_right(line_ends, start), len(line_lengths) - 1)
+        line_start = line_ends[first_line] - line_lengths[first_line]
+        for line_index in range(first_line, len(line_lengths)):
+            if line_start >= end:
+                break
+            line_end = line_start + line_lengths[line_index]
+            line_lengths[line_index] -= max(
+                0, min(end, line_end) - max(start, line_start)
+            )
+            line_start = line_end
+        line_lengths[first_line] += len(words)
+
+        self._replace(index, start, end, words)
+
+    def replace_lines(
+        self, side: int, start: int, end: int, lines: Iterable[str]
+    ) -> None:
+        """
+        Replace a range of lines on one side and update the comparison.
+
+        Parameters
+        ----------
+        side: int
+            1 for the left text, 2 for the right text.
+        start: int
+            Start of the replaced line range.
+        end: int
+            End of the replaced line range (exclusive). Equal to start to insert.
+        lines: Iterable[str]
+            The new lines. Empty to delete.
+        """
+        index = self._side_index(side)
+        line_lengths = self._line_lengths[index]
+        if not 0 <= start <= end <= len(line_lengths):
+            raise IndexError(
+                f"Line range [{start}, {end}) out of bounds "
+                f"for {len(line_lengths)} lines"
+            )
+
+        new_words: List[str] = []
+        new_line_lengths = []
+        for line in lines:
+            line_words = list(self.word_split_func(line))
+            new_words.extend(line_words)
+            new_line_lengths.append(len(line_words))
+
+        word_start = sum(line_lengths[:start])
+        word_end = word_start + sum(line_lengths[start:end])
+        line_lengths[start:end] = new_line_lengths
+        self._replace(index, word_start, word_end, new_words)
+
+    @staticmethod
+    def _side_index(side: int) -> int:
+        if side not in (1, 2):
+            raise ValueError(f"side must be 1 or 2, got {side}")
+        return side - 1
+
+    def _window(
+        self,
+        index: int,
+        start: int,
+        end: int,
+        n_skip: int,
+        block_ends: Tuple[List[int], List[int]],
+    ) -> _Window:
+        # The window around an edit of [start, end) on the index side, bounded
+        # by the (n_skip + 1)th equal run of anchor_length words on each side
+        blocks = self._blocks
+        other = 1 - index
+        ends, other_ends = block_ends[index], block_ends[other]
+
+        # Walk back from the edit, the window starts right after the anchor
+        window_start = other_window_start = 0
+        first_replaced = n_prefix_anchor = 0
+        n_found = 0
+        for k in range(min(bisect_left(ends, start), len(blocks) - 1), -1, -1):
+            block_start = _block_start(ends, k)
+            anchor_end = min(ends[k], start)
+            n_anchor = anchor_end - block_start
+            if blocks[k][0] != _EQUAL or n_anchor < self.anchor_length:
+                continue
+            n_found += 1
+            if n_found > n_skip:
+                window_start = anchor_end
+                other_window_start = _block_start(other_ends, k) + n_anchor
+                first_replaced, n_prefix_anchor = k, n_anchor
+                break
+
+        # Walk forward from the edit, the window ends right before the anchor
+        # or at the end of the texts as they were before the edit
+        window_end = ends[-1] if len(blocks) > 0 else 0
+        other_window_end = other_ends[-1] if len(blocks) > 0 else 0
+        last_replaced = len(blocks) - 1
+        n_suffix_anchor = 0
+        n_found = 0
+        for k in range(bisect_right(ends, end), len(blocks)):
+            anchor_start = max(_block_start(ends, k), end)
+            n_anchor = ends[k] - anchor_start
+            if blocks[k][0] != _EQUAL or n_anchor < self.anchor_length:
+                continue
+            n_found += 1
+            if n_found > n_skip:
+                window_end = anchor_start
+                other_window_end = other_ends[k] - n_anchor
+                last_replaced, n_suffix_anchor = k, n_anchor
+                break
+
+        return _Window(
+            first_replaced=first_replaced,
+            last_replaced=last_replaced,
+            start=window_start,
+            end=window_end,
+            other_start=other_window_start,
+            other_end=other_window_end,
+            n_prefix_anchor=n_prefix_anchor,
+            n_suffix_anchor=n_suffix_anchor,
+        )
+
+    def _align_window(
+        self, index: int, window: _Window, shift: int
+    ) -> Tuple[List[_Block], int]:
+        # Align a window of the edited texts, shift is the change in length of
+        # the edited side. Also returns the distance with the window re-aligned.
+        windows: List[List[str]] = [[], []]
+        windows[index] = self._words[index][window.start : window.end + shift]
+        windows[1 - index] = self._words[1 - index][
+            window.other_start : window.other_end
+        ]
+        window_blocks = _align(windows[0], windows[1])
+        replaced = self._blocks[window.first_replaced : window.last_replaced + 1]
+        return window_blocks, (
+            self.distance - _blocks_distance(replaced) + _blocks_distance(window_blocks)
+        )
+
+    def _replace(self, index: int, start: int, end: int, words: List[str]) -> None:
+        # Windows are found on the alignment before the edit
+        blocks = self._blocks
+        block_ends = (
+            list(accumulate(block[1] for block in blocks)),
+            list(accumulate(block[2] for block in blocks)),
+        )
+        window = self._window(index, start, end, 0, block_ends)
+        self._words[index][start:end] = words
+        shift = len(words) - (end - start)
+        window_blocks, distance = self._align_window(index, window, shift)
+
+        # The anchors need not lie on an optimal alignment, e.g. in repetitive
+        # text, so keep widening the window past further anchors until it twice
+        # in a row doesn't lower the distance
+        n_skip = n_misses = 0
+        while n_misses < 2 and (window.n_prefix_anchor or window.n_suffix_anchor):
+            n_skip = 2 * n_skip + 1
+            wider = self._window(index, start, end, n_skip, block_ends)
+            if (wider.first_replaced, wider.last_replaced) == (
+                window.first_replaced,
+                window.last_replaced,
+            ):
+                break
+            wider_blocks, wider_distance = self._align_window(index, wider, shift)
+            if wider_distance < distance:
+                window, window_blocks, distance = wider, wider_blocks, wider_distance
+            else:
+                n_misses += 1
+
+        self._add_errors(blocks[window.first_replaced : window.last_replaced + 1], -1)
+        self._add_errors(window_blocks, 1)
+
+        # Keep the blocks around the window, trimming the anchors to the edit,
+        # and join the equal blocks left on either side of the window seams
+        prefix: List[_Block] = []
+        suffix: List[_Block] = []
+        if window.n_prefix_anchor > 0:
+            n_anchor = window.n_prefix_anchor
+            prefix = blocks[: window.first_replaced] + [(_EQUAL, n_anchor, n_anchor)]
+        if window.n_suffix_anchor > 0:
+            n_anchor = window.n_suffix_anchor
+            suffix = [(_EQUAL, n_anchor, n_anchor)] + blocks[window.last_replaced + 1 :]
+        for block in window_blocks + suffix[:1]:
+            if prefix and block[0] == _EQUAL and prefix[-1][0] == _EQUAL:
+                _, n_1, n_2 = prefix[-1]
+                prefix[-1] = (_EQUAL, n_1 + block[1], n_2 + block[2])
+            else:
+                prefix.append(block)
+        prefix.extend(suffix[1:])
+        self._blocks = prefix
+
+        if self.exact:
+            self.verify()
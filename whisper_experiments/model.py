@@ -3,54 +3,115 @@
 
 import shutil
 import time
-from dataclasses import dataclass
 from pathlib import Path
-
-import pandas as pd
-from cdp_backend.sr_models.google_cloud_sr_model import GoogleCloudSRModel
-from tqdm.contrib.concurrent import thread_map
+from typing import TYPE_CHECKING, Any, Dict, Optional
 
 from .data import FullDatasetFields
+from .serialization import (
+    DEFAULT_TRANSCRIPT_FORMAT,
+    TRANSCRIPT_FORMAT_SUFFIXES,
+    write_transcript,
+)
+from .streaming import (
+    DEFAULT_MAX_IN_FLIGHT,
+    DEFAULT_ROW_GROUP_SIZE,
+    ParquetPartWriter,
+    bounded_map,
+    read_parquet_parts,
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
 
 ###############################################################################
 
 
-@dataclass
 class GSRTranscribeParams:
-    row: pd.Series
-    credentials_file: str
-    storage_dir: Path
+    # Plain slotted record rather than a pd.Series (or dataclass) per session,
+    # thousands are created and passed between threads
+    __slots__ = (
+        "row_index",
+        "session_id",
+        "audio_uri",
+        "credentials_file",
+        "storage_dir",
+        "transcript_format",
+    )
 
+    def __init__(
+        self,
+        row_index: int,
+        session_id: str,
+        audio_uri: str,
+        credentials_file: str,
+        storage_dir: Path,
+        transcript_format: str = DEFAULT_TRANSCRIPT_FORMAT,
+    ):
+        self.row_index = row_index
+        self.session_id = session_id
+        self.audio_uri = audio_uri
+        self.credentials_file = credentials_file
+        self.storage_dir = storage_dir
+        self.transcript_format = transcript_format
+
+
+class GSRTranscribeResult:
+    __slots__ = ("row_index", "gsr_transcript_path", "gsr_transcription_time")
+
+    def __init__(
+        self,
+        row_index: int,
+        gsr_transcript_path: str,
+        gsr_transcription_time: float,
+    ):
+        self.row_index = row_index
+        self.gsr_transcript_path = gsr_transcript_path
+        self.gsr_transcription_time = gsr_transcription_time
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            FullDatasetFields.gsr_transcript_path: self.gsr_transcript_path,
+            FullDatasetFields.gsr_transcription_time: self.gsr_transcription_time,
+        }
+
+
+def _wrapped_gsr_transcribe(params: GSRTranscribeParams) -> GSRTranscribeResult:
+    # Heavy import, only needed once transcription starts
+    from cdp_backend.sr_models.google_cloud_sr_model import GoogleCloudSRModel
 
-def _wrapped_gsr_transcribe(
-    params: GSRTranscribeParams,
-) -> pd.Series:
     # Init
     model = GoogleCloudSRModel(credentials_file=params.credentials_file)
 
     # Transcribe
     start_time = time.time()
-    transcript = model.transcribe(
-        params.row.audio_uri,
-    )
+    transcript = model.transcribe(params.audio_uri)
     end_time = time.time()
 
     # Dump to disk
-    local_storage_path = params.storage_dir / f"{params.row.id}.json"
-    with open(local_storage_path, "w") as open_f:
-        open_f.write(transcript.to_json(indent=4))
+    suffix = TRANSCRIPT_FORMAT_SUFFIXES[params.transcript_format]
+    local_storage_path = write_transcript(
+        transcript,
+        params.storage_dir / f"{params.session_id}{suffix}",
+        transcript_format=params.transcript_format,
+    )
 
-    # Add local storage path to row and return
-    params.row[FullDatasetFields.gsr_transcript_path] = local_storage_path
-    params.row[FullDatasetFields.gsr_transcription_time] = end_time - start_time
-    return params.row
+    return GSRTranscribeResult(
+        row_index=params.row_index,
+        gsr_transcript_path=str(local_storage_path),
+        gsr_transcription_time=end_time - start_time,
+    )
 
 
 def generate_google_sr_dataset(
-    sessions: pd.DataFrame,
+    sessions: "pd.DataFrame",
     credentials_file: str,
     storage_dir: Path = Path("gsr-transcripts/"),
-) -> pd.DataFrame:
+    transcript_format: str = DEFAULT_TRANSCRIPT_FORMAT,
+    results_dir: Optional[Path] = None,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+    max_workers: Optional[int] = None,
+) -> "pd.DataFrame":
     """
     Process the audio files from the dataset with Google Speech-to-Text.
 
@@ -64,12 +125,31 @@ def generate_google_sr_dataset(
     storage_dir: Path
         The path to a directory to store the generated transcripts in.
         Default: gsr-transcripts/
+    transcript_format: str
+        The format to store the generated transcripts in,
+        see whisper_experiments.serialization.TranscriptFormats.
+        Default: "gzip" (minified JSON, gzip framed)
+    results_dir: Optional[Path]
+        The directory to write result rows to as Parquet part files while the
+        run is going. Read the rows completed so far at any time with
+        whisper_experiments.streaming.read_parquet_parts.
+        Default: None ({storage_dir}/results/)
+    max_in_flight: int
+        The maximum number of sessions being transcribed or waiting to be
+        written at once.
+        Default: 32
+    row_group_size: int
+        The number of result rows per Parquet part file.
+        Default: 16
+    max_workers: Optional[int]
+        The number of transcription threads.
+        Default: None (the executor default)
 
     Returns
     -------
     pd.DataFrame
-        The same session dataset with GSR transcription columns added.
-        Note: the rows may be in different order due to threading.
+        The same session dataset, in the same order,
+        with GSR transcription columns added.
 
     See Also
     --------
@@ -80,25 +160,69 @@ def generate_google_sr_dataset(
     ----
     Whatever directory is provided as the storage_dir be emptied prior to run.
     """
+    import pandas as pd
+    from tqdm import tqdm
+
     # Empty Directory
     if storage_dir.exists():
         shutil.rmtree(storage_dir)
 
     # Create again
     storage_dir.mkdir(parents=True)
-
-    # Transcribe
-    transcribed_results = thread_map(
-        _wrapped_gsr_transcribe,
-        [
-            GSRTranscribeParams(
-                row,
-                credentials_file=credentials_file,
-                storage_dir=storage_dir,
+    if results_dir is None:
+        results_dir = storage_dir / "results"
+    elif results_dir.exists():
+        shutil.rmtree(results_dir)
+
+    # Nothing to transcribe, so no part files to read the new columns back from
+    if len(sessions) == 0:
+        return sessions.assign(
+            **{
+                FullDatasetFields.gsr_transcript_path: pd.Series(dtype=object),
+                FullDatasetFields.gsr_transcription_time: pd.Series(dtype=float),
+            }
+        )
+
+    # Params are created lazily (straight from the columns) as the in-flight
+    # window frees up
+    params = (
+        GSRTranscribeParams(
+            row_index=row_index,
+            session_id=session_id,
+            audio_uri=audio_uri,
+            credentials_file=credentials_file,
+            storage_dir=storage_dir,
+            transcript_format=transcript_format,
+        )
+        for row_index, (session_id, audio_uri) in enumerate(
+            zip(
+                sessions[FullDatasetFields.id_],
+                sessions[FullDatasetFields.audio_uri],
             )
-            for _, row in sessions.iterrows()
-        ],
+        )
     )
 
-    # Merge back to DataFrame and return
-    return pd.DataFrame(transcribed_results)
+    # Transcribe, writing each row as soon as it completes
+    with ParquetPartWriter(results_dir, row_group_size=row_group_size) as writer:
+        for _, result in tqdm(
+            bounded_map(
+                _wrapped_gsr_transcribe,
+                params,
+                max_in_flight=max_in_flight,
+                max_workers=max_workers,
+            ),
+            total=len(sessions),
+        ):
+            writer.write(result.row_index, result.to_dict())
+
+    # Only the new columns round trip through the part files,
+    # the session columns (and their dtypes) are kept as they were
+    results = read_parquet_parts(results_dir)
+    sessions = sessions.copy()
+    for column in (
+        FullDatasetFields.gsr_transcript_path,
+        FullDatasetFields.gsr_transcription_time,
+    ):
+        sessions[column] = results[column].to_numpy()
+
+    return sessions
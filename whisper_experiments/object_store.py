@@ -0,0 +1,517 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import shutil
+import uuid
+import zipfile
+from datetime import datetime
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Set,
+    Tuple,
+    Union,
+)
+
+import pandas as pd
+
+from .archive import write_zip_archive
+from .data import ARCHIVED_DATA_PATH, FullDatasetFields
+from .serialization import transcript_suffix
+
+###############################################################################
+
+log = logging.getLogger(__name__)
+
+###############################################################################
+
+DEFAULT_OBJECT_STORE_DIR = Path("cdp-whisper-experiments-store/")
+
+TRANSCRIPT_PATH_COLUMNS = (
+    FullDatasetFields.ground_truth_transcript_path,
+    FullDatasetFields.gsr_transcript_path,
+)
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# The only member names a delta may contain
+_DELTA_OBJECT_NAME = re.compile(r"objects/([0-9a-f]{2})/\1[0-9a-f]{62}(\.[a-z0-9]+)+")
+_DELTA_MANIFEST_NAME = re.compile(r"manifests/v[0-9]+\.(parquet|json)")
+
+###############################################################################
+
+
+class ArchiveVersion(NamedTuple):
+    # Incrementing version number, starting at 1
+    version: int
+    # ISO formatted UTC datetime the version was committed
+    created: str
+    # The version this version was committed on top of, None for the first
+    parent: Optional[int]
+    # Number of sessions in the version
+    n_sessions: int
+    # Number of distinct objects the version references
+    n_objects: int
+    # Number of objects this version added to the store
+    n_new_objects: int
+    # Total size of the objects this version added to the store
+    new_bytes: int
+
+
+def _hash_file(path: Union[str, Path]) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as open_f:
+        for chunk in iter(lambda: open_f.read(_HASH_CHUNK_SIZE), b""):
+            hasher.update(chunk)
+
+    return hasher.hexdigest()
+
+
+class ObjectStore:
+    """
+    A content-addressed store of transcripts with versioned session manifests.
+
+    Every transcript is stored once, under the hash of its bytes, no matter how
+    many archive versions reference it. A version is a small manifest: the
+    sessions table with transcript paths replaced by object keys. Committing a
+    new version only writes the objects that changed, and versions can be
+    shipped as deltas containing only the objects the receiver is missing.
+
+    Layout::
+
+        {store_dir}/
+        ├── objects/
+        │   └── {hash[:2]}/
+        │       └── {hash}{suffix}
+        └── manifests/
+            ├── v0001.parquet
+            └── v0001.json
+    """
+
+    def __init__(self, store_dir: Union[str, Path] = DEFAULT_OBJECT_STORE_DIR):
+        """
+        Parameters
+        ----------
+        store_dir: Union[str, Path]
+            The directory to keep the store in. Created if it doesn't exist.
+            Default: cdp-whisper-experiments-store/
+        """
+        self.store_dir = Path(store_dir)
+        self.objects_dir = self.store_dir / "objects"
+        self.manifests_dir = self.store_dir / "manifests"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.manifests_dir.mkdir(parents=True, exist_ok=True)
+
+    def object_path(self, key: str) -> Path:
+        """
+        Parameters
+        ----------
+        key: str
+            The object key, "{sha256}{suffix}".
+
+        Returns
+        -------
+        Path
+            The path the object is (or would be) stored at.
+        """
+        return self.objects_dir / key[:2] / key
+
+    def __contains__(self, key: str) -> bool:
+        return self.object_path(key).exists()
+
+    def _put(self, key: str, write: Callable[[Path], Any]) -> int:
+        object_path = self.object_path(key)
+        if object_path.exists():
+            return 0
+
+        # Write then rename so a crash never leaves a partial object
+        object_path.parent.mkdir(exist_ok=True)
+        temp_path = object_path.with_name(f".{key}.{uuid.uuid4().hex}.tmp")
+        try:
+            write(temp_path)
+            os.replace(temp_path, object_path)
+        finally:
+            if temp_path.exists():
+                temp_path.unlink()
+
+        return object_path.stat().st_size
+
+    def put_file(self, path: Union[str, Path]) -> Tuple[str, int]:
+        """
+        Store a transcript file.
+
+        Parameters
+        ----------
+        path: Union[str, Path]
+            The path to the transcript.
+
+        Returns
+        -------
+        key: str
+            The object key, "{sha256}{suffix}".
+        new_bytes: int
+            The number of bytes written. 0 if the object was already stored.
+        """
+        key = f"{_hash_file(path)}{transcript_suffix(path)}"
+        return key, self._put(key, lambda dest: shutil.copyfile(path, dest))
+
+    def put_bytes(self, data: bytes, suffix: str = ".json") -> Tuple[str, int]:
+        """
+        Store transcript data.
+
+        Parameters
+        ----------
+        data: bytes
+            The serialized transcript.
+        suffix: str
+            The transcript format suffix to store the object with.
+            Default: ".json"
+
+        Returns
+        -------
+        key: str
+            The object key, "{sha256}{suffix}".
+        new_bytes: int
+            The number of bytes written. 0 if the object was already stored.
+        """
+        key = f"{hashlib.sha256(data).hexdigest()}{suffix}"
+        return key, self._put(key, lambda dest: dest.write_bytes(data))
+
+    ###########################################################################
+    # Versions
+
+    def _manifest_paths(self, version: int) -> Tuple[Path, Path]:
+        stem = self.manifests_dir / f"v{version:04d}"
+        return stem.with_suffix(".parquet"), stem.with_suffix(".json")
+
+    def versions(self) -> List[ArchiveVersion]:
+        """
+        Returns
+        -------
+        List[ArchiveVersion]
+            Every committed version, oldest first.
+        """
+        versions = []
+        for info_path in sorted(self.manifests_dir.glob("v*.json")):
+            with open(info_path, "r") as open_f:
+                versions.append(ArchiveVersion(**json.load(open_f)))
+
+        return versions
+
+    def latest_version(self) -> Optional[int]:
+        """
+        Returns
+        -------
+        Optional[int]
+            The most recently committed version. None if nothing is committed.
+        """
+        versions = self.versions()
+        if len(versions) == 0:
+            return None
+        return versions[-1].version
+
+    def manifest(self, version: Optional[int] = None) -> pd.DataFrame:
+        """
+        Read the sessions of a version with transcript columns as object keys.
+
+        Parameters
+        ----------
+        version: Optional[int]
+            The version to read.
+            Default: None (the latest version)
+
+        Returns
+        -------
+        pd.DataFrame
+            The stored sessions.
+
+        Raises
+        ------
+        ValueError
+            No versions have been committed.
+        """
+        if version is None:
+            version = self.latest_version()
+            if version is None:
+                raise ValueError(f"No versions committed to {self.store_dir}")
+
+        manifest_path, _ = self._manifest_paths(version)
+        return pd.read_parquet(manifest_path)
+
+    def _object_keys(self, version: Optional[int]) -> Set[str]:
+        if version is None:
+            return set()
+
+        manifest = self.manifest(version)
+        return {
+            key
+            for column in TRANSCRIPT_PATH_COLUMNS
+            if column in manifest.columns
+            for key in manifest[column].dropna()
+        }
+
+    def commit(self, sessions: pd.DataFrame) -> ArchiveVersion:
+        """
+        Store the transcripts of a sessions dataset and record it as a new version.
+
+        Parameters
+        ----------
+        sessions: pd.DataFrame
+            The full dataset, see model.generate_google_sr_dataset.
+            Transcript path columns must point to local files.
+
+        Returns
+        -------
+        ArchiveVersion
+            The newly committed version.
+        """
+        manifest = sessions.copy()
+        n_new_objects = 0
+        new_bytes = 0
+        for column in TRANSCRIPT_PATH_COLUMNS:
+            if column not in manifest.columns:
+                continue
+
+            keys = []
+            for path in manifest[column]:
+                key, n_bytes = self.put_file(path)
+                keys.append(key)
+                if n_bytes > 0:
+                    n_new_objects += 1
+                    new_bytes += n_bytes
+            manifest[column] = keys
+
+        buffer = io.BytesIO()
+        manifest.to_parquet(buffer)
+
+        # Exclusive create so concurrent commits never take the same number,
+        # the parent is re-read with each attempt as a lost race moves it too
+        while True:
+            parent = max(
+                (int(path.stem[1:]) for path in self.manifests_dir.glob("v*.parquet")),
+                default=None,
+            )
+            version = 1 + (parent or 0)
+            manifest_path, info_path = self._manifest_paths(version)
+            try:
+                with open(manifest_path, "xb") as open_f:
+                    open_f.write(buffer.getvalue())
+                break
+            except FileExistsError:
+                continue
+
+        info = ArchiveVersion(
+            version=version,
+            created=datetime.utcnow().isoformat(),
+            parent=parent,
+            n_sessions=len(manifest),
+            n_objects=len(self._object_keys(version)),
+            n_new_objects=n_new_objects,
+            new_bytes=new_bytes,
+        )
+
+        # The info file marks the version as committed
+        with open(info_path, "x") as open_f:
+            json.dump(info._asdict(), open_f, indent=4)
+
+        log.info(
+            f"Committed version {version}: {info.n_new_objects} new objects "
+            f"({info.new_bytes} bytes) of {info.n_objects}"
+        )
+        return info
+
+    def load_version(self, version: Optional[int] = None) -> pd.DataFrame:
+        """
+        Read the sessions of a version with transcript paths fully resolved.
+
+        Parameters
+        ----------
+        version: Optional[int]
+            The version to read.
+            Default: None (the latest version)
+
+        Returns
+        -------
+        pd.DataFrame
+            The stored sessions, transcript path columns point into the store.
+        """
+        sessions = self.manifest(version)
+        for column in TRANSCRIPT_PATH_COLUMNS:
+            if column in sessions.columns:
+                sessions[column] = [
+                    str(self.object_path(key).resolve()) for key in sessions[column]
+                ]
+
+        return sessions
+
+    def export_archive(
+        self,
+        version: Optional[int] = None,
+        archive_name: Path = ARCHIVED_DATA_PATH.with_suffix(""),
+    ) -> Path:
+        """
+        Write a version as a standalone data archive,
+        see data.load_cdp_whisper_experiment_data.
+
+        Parameters
+        ----------
+        version: Optional[int]
+            The version to export.
+            Default: None (the latest version)
+        archive_name: Path
+            The path to store the archive to (without the ".zip" suffix).
+            Default: the packaged archive path
+
+        Returns
+        -------
+        Path
+            The path to the created archive.
+        """
+        from .data import _archive_dataset
+
+        return _archive_dataset(self.load_version(version), archive_name=archive_name)
+
+    ###########################################################################
+    # Deltas
+
+    def export_delta(
+        self,
+        output_path: Union[str, Path],
+        version: Optional[int] = None,
+        since_version: Optional[int] = None,
+    ) -> Path:
+        """
+        Write the objects and manifests needed to bring a store that already has
+        since_version up to version.
+
+        Parameters
+        ----------
+        output_path: Union[str, Path]
+            The path to write the delta (a zip file) to.
+        version: Optional[int]
+            The version to bring the receiver up to.
+            Default: None (the latest version)
+        since_version: Optional[int]
+            The version the receiver already has.
+            Default: None (the receiver has nothing, export everything)
+
+        Returns
+        -------
+        Path
+            The path to the delta.
+        """
+        if version is None:
+            version = self.latest_version()
+            if version is None:
+                raise ValueError(f"No versions committed to {self.store_dir}")
+
+        # Every shipped version needs its objects, apart from those the receiver
+        # already has
+        delta_versions = range((since_version or 0) + 1, version + 1)
+        new_keys = set().union(
+            *(self._object_keys(delta_version) for delta_version in delta_versions)
+        ) - self._object_keys(since_version)
+        log.info(
+            f"Exporting delta v{since_version or 0}..v{version}: "
+            f"{len(new_keys)} objects"
+        )
+
+        def _iter_members() -> Iterator[Tuple[str, Path]]:
+            for key in sorted(new_keys):
+                object_path = self.object_path(key)
+                yield object_path.relative_to(self.store_dir).as_posix(), object_path
+            # Manifests go last, the info files mark the version as committed
+            for delta_version in delta_versions:
+                for manifest_path in self._manifest_paths(delta_version):
+                    if manifest_path.exists():
+                        yield manifest_path.relative_to(
+                            self.store_dir
+                        ).as_posix(), manifest_path
+
+        return write_zip_archive(_iter_members(), output_path)
+
+    def _delta_member_path(self, name: str) -> Path:
+        if not (
+            _DELTA_OBJECT_NAME.fullmatch(name) or _DELTA_MANIFEST_NAME.fullmatch(name)
+        ):
+            raise ValueError(f"Unexpected member in delta: {name!r}")
+
+        # The names can't escape the store, but check the resolved path anyway
+        # in case of symlinks inside the store
+        path = (self.store_dir / name).resolve()
+        try:
+            path.relative_to(self.store_dir.resolve())
+        except ValueError:
+            raise ValueError(f"Delta member {name!r} resolves outside {self.store_dir}")
+
+        return path
+
+    def import_delta(self, delta_path: Union[str, Path]) -> int:
+        """
+        Add the objects and versions of a delta to this store.
+
+        Parameters
+        ----------
+        delta_path: Union[str, Path]
+            The path to a delta written by export_delta.
+
+        Returns
+        -------
+        int
+            The number of objects added.
+
+        Raises
+        ------
+        ValueError
+            A member isn't an object or manifest of this store's layout, an
+            object's content doesn't match its hash, or a manifest conflicts with
+            a version this store already has (the stores have diverged).
+            Nothing is added when a member name or manifest is rejected.
+        """
+        n_added = 0
+        with zipfile.ZipFile(delta_path) as delta:
+            names = delta.namelist()
+            member_paths = {name: self._delta_member_path(name) for name in names}
+
+            # Check every manifest before writing anything
+            new_manifests = []
+            for name in names:
+                if not name.startswith("manifests/"):
+                    continue
+                manifest_path = member_paths[name]
+                if not manifest_path.exists():
+                    new_manifests.append(name)
+                elif manifest_path.read_bytes() != delta.read(name):
+                    raise ValueError(
+                        f"Delta manifest {name} conflicts with the version already "
+                        f"in {self.store_dir}"
+                    )
+
+            # Objects before manifests so a version is never visible before its
+            # data, and info files last as they mark the version as committed
+            for name in names:
+                if name.startswith("objects/"):
+                    data = delta.read(name)
+                    key = member_paths[name].name
+                    if hashlib.sha256(data).hexdigest() != key[:64]:
+                        raise ValueError(f"Corrupt object in delta: {name}")
+                    if self._put(key, lambda dest: dest.write_bytes(data)) > 0:
+                        n_added += 1
+            for name in sorted(new_manifests, key=lambda name: name.endswith(".json")):
+                manifest_path = member_paths[name]
+                temp_path = manifest_path.with_name(f".{uuid.uuid4().hex}.tmp")
+                temp_path.write_bytes(delta.read(name))
+                os.replace(temp_path, manifest_path)
+
+        return n_added
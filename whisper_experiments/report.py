@@ -0,0 +1,495 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import html
+import json
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from .columnar import ColumnarTranscript, to_columnar
+from .diff import LineComparison, iter_transcript_differences
+
+if TYPE_CHECKING:
+    from cdp_backend.pipeline.transcript_model import Transcript
+
+###############################################################################
+
+DEFAULT_PAGE_SIZE = 100
+DEFAULT_LABELS = ("ground truth", "hypothesis")
+
+INDEX_JSON_NAME = "index.json"
+INDEX_HTML_NAME = "index.html"
+
+_STYLE = """
+body { font-family: sans-serif; margin: 0; }
+table { border-collapse: collapse; width: 100%; table-layout: fixed; }
+th, td { border-bottom: 1px solid #ddd; padding: 4px 8px; vertical-align: top; }
+td.time { width: 6em; color: #666; font-family: monospace; }
+tr.target { background: #fff6d5; }
+nav { padding: 8px; background: #f4f4f4; }
+.removed { background: #fdd; text-decoration: line-through; }
+.added { background: #dfd; }
+.modified { background: #ffe9a8; }
+"""
+
+# Scrolls to the first row starting at or after "#t={seconds}"
+_PAGE_SCRIPT = """
+function jump() {
+  var match = /t=([0-9.]+)/.exec(window.location.hash);
+  if (!match) { return; }
+  var seconds = parseFloat(match[1]);
+  var rows = document.querySelectorAll("tr[data-start]");
+  var target = rows.length > 0 ? rows[rows.length - 1] : null;
+  for (var i = 0; i < rows.length; i++) {
+    if (parseFloat(rows[i].dataset.start) >= seconds) { target = rows[i]; break; }
+  }
+  if (target) { target.classList.add("target"); target.scrollIntoView(); }
+}
+window.addEventListener("hashchange", jump);
+window.addEventListener("load", jump);
+"""
+
+# Only the page holding the requested time is loaded into the frame
+_VIEWER_SCRIPT = """
+var pages = JSON.parse(document.getElementById("pages").textContent);
+function parseTime(value) {
+  var seconds = 0;
+  value.split(":").forEach(function (part) {
+    seconds = seconds * 60 + parseFloat(part);
+  });
+  return seconds;
+}
+function show(page, seconds) {
+  var hash = seconds === undefined ? "" : "#t=" + seconds;
+  document.getElementById("page").src = page.html_path + hash;
+  document.getElementById("current").textContent =
+    "Page " + page.page + " of " + pages.length;
+}
+function jumpTo(value) {
+  var seconds = parseTime(value);
+  var low = 0, high = pages.length - 1, found = 0;
+  while (low <= high) {
+    var middle = (low + high) >> 1;
+    var start = pages[middle].start_time;
+    if (start === null || start <= seconds) { found = middle; low = middle + 1; }
+    else { high = middle - 1; }
+  }
+  show(pages[found], seconds);
+  return false;
+}
+if (pages.length > 0) { show(pages[0]); }
+"""
+
+###############################################################################
+
+
+class ReportPage(NamedTuple):
+    # 1 based page number
+    page: int
+    # Index of the first difference on the page, across the whole report
+    first_item: int
+    n_items: int
+    # Earliest and latest time of the differences on the page, if known
+    start_time: Optional[float]
+    end_time: Optional[float]
+    # Paths relative to the report directory
+    json_path: str
+    html_path: str
+
+
+def _format_time(seconds: Optional[float]) -> str:
+    if seconds is None:
+        return ""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}"
+
+
+class ReportWriter:
+    """
+    Write differences to a paginated static report as they arrive.
+
+    Every page_size differences are written as one JSON page and one side by
+    side HTML page, then dropped from memory. Closing the writer adds an index
+    (JSON, plus an HTML viewer that loads one page at a time and can jump to a
+    time).
+
+    Layout::
+
+        {output_dir}/
+        ├── index.json
+        ├── index.html
+        ├── page-00001.json
+        ├── page-00001.html
+        └── ...
+    """
+
+    def __init__(
+        self,
+        output_dir: Union[str, Path],
+        page_size: int = DEFAULT_PAGE_SIZE,
+        title: str = "Transcript differences",
+        labels: Sequence[str] = DEFAULT_LABELS,
+    ):
+        """
+        Parameters
+        ----------
+        output_dir: Union[str, Path]
+            The directory to write the report to. Created if it doesn't exist.
+        page_size: int
+            The number of differences per page.
+            Default: 100
+        title: str
+            The report title.
+            Default: "Transcript differences"
+        labels: Sequence[str]
+            The names of the left and right sides.
+            Default: ("ground truth", "hypothesis")
+        """
+        if page_size < 1:
+            raise ValueError(f"page_size must be at least 1, got {page_size}")
+
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.page_size = page_size
+        self.title = title
+        self.labels = tuple(labels)
+        self.n_items = 0
+        self.pages: List[ReportPage] = []
+        self._records: List[Dict[str, Any]] = []
+        self._rows: List[str] = []
+        # Rows of the last written page, rewritten without the next link on close
+        self._page_rows: List[str] = []
+
+    def add(
+        self,
+        record: Dict[str, Any],
+        left_html: str,
+        right_html: str,
+        start_time: Optional[float] = None,
+    ) -> None:
+        """
+        Add a difference, writing a page if the current page is full.
+
+        Parameters
+        ----------
+        record: Dict[str, Any]
+            The difference as JSON serializable data, stored in the JSON page.
+        left_html: str
+            The left side of the difference, already escaped.
+        right_html: str
+            The right side of the difference, already escaped.
+        start_time: Optional[float]
+            The time of the difference in seconds, used to jump to it.
+            Default: None (unknown)
+        """
+        item = self.n_items
+        self.n_items += 1
+        self._records.append({"item": item, "start_time": start_time, **record})
+        start_attr = "" if start_time is None else f' data-start="{start_time}"'
+        self._rows.append(
+            f'<tr id="item-{item}"{start_attr}>'
+            f'<td class="time">{_format_time(start_time)}</td>'
+            f"<td>{left_html}</td><td>{right_html}</td></tr>"
+        )
+        if len(self._records) >= self.page_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write the buffered differences as a page.
+        """
+        if len(self._records) == 0:
+            return
+
+        number = len(self.pages) + 1
+        times = [
+            record["start_time"]
+            for record in self._records
+            if record["start_time"] is not None
+        ]
+        page = ReportPage(
+            page=number,
+            first_item=self._records[0]["item"],
+            n_items=len(self._records),
+            start_time=min(times) if len(times) > 0 else None,
+            end_time=max(times) if len(times) > 0 else None,
+            json_path=f"page-{number:05d}.json",
+            html_path=f"page-{number:05d}.html",
+        )
+
+        with open(self.output_dir / page.json_path, "w") as open_f:
+            json.dump({**page._asdict(), "items": self._records}, open_f)
+        # More differences may follow, close() drops the link from the last page
+        self._page_rows = self._rows
+        self._write_page_html(page, has_next=True)
+
+        self.pages.append(page)
+        self._records = []
+        self._rows = []
+
+    def _write_page_html(self, page: ReportPage, has_next: bool) -> None:
+        with open(self.output_dir / page.html_path, "w") as open_f:
+            open_f.write(self._page_html(page, has_next))
+
+    def _page_html(self, page: ReportPage, has_next: bool) -> str:
+        links = [f'<a href="{INDEX_HTML_NAME}" target="_top">index</a>']
+        if page.page > 1:
+            links.append(f'<a href="page-{page.page - 1:05d}.html">previous</a>')
+        if has_next:
+            links.append(f'<a href="page-{page.page + 1:05d}.html">next</a>')
+        left_label, right_label = (html.escape(label) for label in self.labels)
+        return (
+            "<!DOCTYPE html>\n"
+            '<html><head><meta charset="utf-8">'
+            f"<title>{html.escape(self.title)} - page {page.page}</title>"
+            f"<style>{_STYLE}</style></head><body>\n"
+            f"<nav>Page {page.page} {' | '.join(links)}</nav>\n"
+            f"<table><tr><th></th><th>{left_label}</th><th>{right_label}</th></tr>\n"
+            + "\n".join(self._page_rows)
+            + f"\n</table><script>{_PAGE_SCRIPT}</script></body></html>\n"
+        )
+
+    def close(self) -> Path:
+        """
+        Write the last page and the index.
+
+        Returns
+        -------
+        Path
+            The path to the HTML viewer.
+        """
+        self.flush()
+        if len(self.pages) > 0:
+            self._write_page_html(self.pages[-1], has_next=False)
+
+        index = {
+            "title": self.title,
+            "labels": list(self.labels),
+            "page_size": self.page_size,
+            "n_items": self.n_items,
+            "pages": [page._asdict() for page in self.pages],
+        }
+        with open(self.output_dir / INDEX_JSON_NAME, "w") as open_f:
+            json.dump(index, open_f, indent=4)
+
+        # Page summaries are embedded so the viewer also works from file://
+        pages_json = json.dumps(index["pages"]).replace("</", "<\\/")
+        page_links = "".join(
+            f'<li><a href="{page.html_path}" target="page">{page.page}</a> '
+            f"{_format_time(page.start_time)} ({page.n_items})</li>"
+            for page in self.pages
+        )
+        viewer_path = self.output_dir / INDEX_HTML_NAME
+        with open(viewer_path, "w") as open_f:
+            open_f.write(
+                "<!DOCTYPE html>\n"
+                '<html><head><meta charset="utf-8">'
+                f"<title>{html.escape(self.title)}</title><style>{_STYLE}"
+                "#layout { display: flex; height: 100vh; }"
+                "#pages-list { width: 14em; overflow-y: auto; }"
+                "iframe { flex: 1; border: none; }</style></head><body>\n"
+                f'<script id="pages" type="application/json">{pages_json}</script>\n'
+                f"<nav><b>{html.escape(self.title)}</b> {self.n_items} differences "
+                '<form style="display: inline" '
+                'onsubmit="return jumpTo(this.time.value)">'
+                '<input name="time" placeholder="jump to h:mm:ss"></form> '
+                '<span id="current"></span></nav>\n'
+                f'<div id="layout"><ol id="pages-list">{page_links}</ol>'
+                '<iframe id="page" name="page"></iframe></div>\n'
+                f"<script>{_VIEWER_SCRIPT}</script></body></html>\n"
+            )
+
+        return viewer_path
+
+    def __enter__(self) -> "ReportWriter":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+###############################################################################
+
+
+def _highlight(words: Sequence[str], classes: Dict[int, str], offset: int) -> str:
+    return " ".join(
+        f'<span class="{classes[offset + i]}">{html.escape(word)}</span>'
+        if offset + i in classes
+        else html.escape(word)
+        for i, word in enumerate(words)
+    )
+
+
+def export_transcript_report(
+    transcript_1: Union["Transcript", Dict[str, Any], ColumnarTranscript],
+    transcript_2: Union["Transcript", Dict[str, Any], ColumnarTranscript],
+    output_dir: Union[str, Path],
+    normalize: Optional[Callable[[str], str]] = None,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    title: str = "Transcript differences",
+    labels: Sequence[str] = DEFAULT_LABELS,
+) -> Path:
+    """
+    Write the sentence and word differences of two transcripts as a paginated
+    side by side report that can jump to a time.
+
+    Differences are written a page at a time as they are found, so memory use
+    depends on page_size rather than on the length of the session.
+
+    Parameters
+    ----------
+    transcript_1: Union[Transcript, Dict[str, Any], ColumnarTranscript]
+        Left transcript
+    transcript_2: Union[Transcript, Dict[str, Any], ColumnarTranscript]
+        Right transcript
+    output_dir: Union[str, Path]
+        The directory to write the report to.
+    normalize: Optional[Callable[[str], str]]
+        Function applied to each word before comparing, e.g. str.lower.
+        Default: None (compare words as is)
+    page_size: int
+        The number of changed sentence blocks per page.
+        Default: 100
+    title: str
+        The report title.
+        Default: "Transcript differences"
+    labels: Sequence[str]
+        The names of the left and right transcripts.
+        Default: ("ground truth", "hypothesis")
+
+    Returns
+    -------
+    Path
+        The path to the HTML viewer, see ReportWriter for the full layout.
+    """
+    columns_1 = to_columnar(transcript_1)
+    columns_2 = to_columnar(transcript_2)
+    offsets_1 = columns_1.word_offsets
+    offsets_2 = columns_2.word_offsets
+
+    with ReportWriter(output_dir, page_size, title, labels) as writer:
+        for sentence in iter_transcript_differences(columns_1, columns_2, normalize):
+            classes_1 = {
+                word.word_index_1: word.kind
+                for word in sentence.words
+                if word.word_index_1 is not None
+            }
+            classes_2 = {
+                word.word_index_2: word.kind
+                for word in sentence.words
+                if word.word_index_2 is not None
+            }
+            word_start_1 = int(offsets_1[sentence.sentence_start_1])
+            word_end_1 = int(offsets_1[sentence.sentence_end_1])
+            word_start_2 = int(offsets_2[sentence.sentence_start_2])
+            word_end_2 = int(offsets_2[sentence.sentence_end_2])
+
+            record = sentence._asdict()
+            record["kind"] = sentence.kind
+            record["words"] = [word._asdict() for word in sentence.words]
+            writer.add(
+                record,
+                _highlight(
+                    columns_1.word_text[word_start_1:word_end_1],
+                    classes_1,
+                    word_start_1,
+                ),
+                _highlight(
+                    columns_2.word_text[word_start_2:word_end_2],
+                    classes_2,
+                    word_start_2,
+                ),
+                start_time=(
+                    sentence.start_time_1
+                    if sentence.start_time_1 is not None
+                    else sentence.start_time_2
+                ),
+            )
+
+    return writer.output_dir / INDEX_HTML_NAME
+
+
+def _line_side_html(content: Optional[str], changed: Dict[str, str]) -> str:
+    if content is None:
+        return ""
+    return " ".join(
+        f'<span class="{changed[word]}">{html.escape(word)}</span>'
+        if word in changed
+        else html.escape(word)
+        for word in content.split()
+    )
+
+
+def export_text_report(
+    lines: Iterable[LineComparison],
+    output_dir: Union[str, Path],
+    page_size: int = DEFAULT_PAGE_SIZE,
+    title: str = "Text differences",
+    labels: Sequence[str] = DEFAULT_LABELS,
+) -> Path:
+    """
+    Write line differences as a paginated side by side report.
+
+    Parameters
+    ----------
+    lines: Iterable[LineComparison]
+        The line differences, e.g. from line_differences or
+        token_line_differences. Consumed lazily.
+    output_dir: Union[str, Path]
+        The directory to write the report to.
+    page_size: int
+        The number of lines per page.
+        Default: 100
+    title: str
+        The report title.
+        Default: "Text differences"
+    labels: Sequence[str]
+        The names of the left and right texts.
+        Default: ("ground truth", "hypothesis")
+
+    Returns
+    -------
+    Path
+        The path to the HTML viewer, see ReportWriter for the full layout.
+
+    Notes
+    -----
+    Lines carry no timestamps, so the viewer can only page through them.
+    Changed words are highlighted wherever they appear in their line.
+    """
+    with ReportWriter(output_dir, page_size, title, labels) as writer:
+        for line in lines:
+            words: List[Tuple[str, Optional[str], Optional[str]]] = [
+                (word.kind, word.content_before, word.content_after)
+                for word in line.words
+            ]
+            changed_1 = {before: kind for kind, before, _ in words if before}
+            changed_2 = {after: kind for kind, _, after in words if after}
+            writer.add(
+                {
+                    "kind": line.line.kind,
+                    "before": line.line.content_before,
+                    "after": line.line.content_after,
+                    "words": [
+                        {"kind": kind, "before": before, "after": after}
+                        for kind, before, after in words
+                    ],
+                },
+                _line_side_html(line.line.content_before, changed_1),
+                _line_side_html(line.line.content_after, changed_2),
+            )
+
+    return writer.output_dir / INDEX_HTML_NAME
@@ -0,0 +1,370 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import gzip
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Optional, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None  # type: ignore
+
+if TYPE_CHECKING:
+    from cdp_backend.pipeline.transcript_model import Transcript
+
+###############################################################################
+
+
+class TranscriptFormats:
+    # Indented JSON, what Transcript.to_json(indent=4) produces
+    json = "json"
+    # Minified JSON
+    compact = "compact"
+    # Minified JSON, gzip framed
+    gzip = "gzip"
+    # Minified JSON, zstd framed (requires the zstandard package)
+    zstd = "zstd"
+
+
+ALL_TRANSCRIPT_FORMATS = [
+    getattr(TranscriptFormats, attr)
+    for attr in dir(TranscriptFormats)
+    if "__" not in attr
+]
+
+TRANSCRIPT_FORMAT_SUFFIXES = {
+    TranscriptFormats.json: ".json",
+    TranscriptFormats.compact: ".json",
+    TranscriptFormats.gzip: ".json.gz",
+    TranscriptFormats.zstd: ".json.zst",
+}
+
+DEFAULT_TRANSCRIPT_FORMAT = TranscriptFormats.gzip
+
+_GZIP_MAGIC = b"\x1f\x8b"
+_ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+# Fast to write and still most of the size win, level 9 is ~3x slower for ~5% smaller
+_GZIP_LEVEL = 6
+_ZSTD_LEVEL = 9
+
+###############################################################################
+
+TranscriptLike = Union["Transcript", Dict[str, Any]]
+
+
+def _zstandard() -> Any:
+    try:
+        import zstandard
+    except ImportError as e:
+        raise ImportError(
+            "Reading or writing zstd transcripts requires the zstandard package. "
+            "Install it with `pip install zstandard`."
+        ) from e
+
+    return zstandard
+
+
+def _annotations_to_dict(annotations: Any) -> Optional[Dict[str, Any]]:
+    if annotations is None:
+        return None
+    return annotations.to_dict()
+
+
+def transcript_to_dict(transcript: TranscriptLike) -> Dict[str, Any]:
+    """
+    Convert a Transcript to the dictionary stored in transcript files.
+
+    Equivalent to transcript.to_dict() but built directly from the dataclass
+    fields, which is several times faster for transcripts with many words.
+
+    Parameters
+    ----------
+    transcript: Union[Transcript, Dict[str, Any]]
+        The transcript to convert. Dictionaries are returned untouched.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The transcript as plain Python types.
+    """
+    if isinstance(transcript, dict):
+        return transcript
+
+    return {
+        "generator": transcript.generator,
+        "confidence": transcript.confidence,
+        "session_datetime": transcript.session_datetime,
+        "created_datetime": transcript.created_datetime,
+        "sentences": [
+            {
+                "index": sentence.index,
+                "confidence": sentence.confidence,
+                "start_time": sentence.start_time,
+                "end_time": sentence.end_time,
+                "words": [
+                    {
+                        "index": word.index,
+                        "start_time": word.start_time,
+                        "end_time": word.end_time,
+                        "text": word.text,
+                        "annotations": _annotations_to_dict(word.annotations),
+                    }
+                    for word in sentence.words
+                ],
+                "text": sentence.text,
+                "speaker_index": sentence.speaker_index,
+                "speaker_name": sentence.speaker_name,
+                "annotations": _annotations_to_dict(sentence.annotations),
+            }
+            for sentence in transcript.sentences
+        ],
+        "annotations": _annotations_to_dict(transcript.annotations),
+    }
+
+
+def transcript_from_dict(transcript: Dict[str, Any]) -> "Transcript":
+    """
+    Convert a stored transcript dictionary back to a Transcript.
+
+    Equivalent to Transcript.from_dict(transcript) but skips the per-field type
+    decoding, which is several times faster for transcripts with many words.
+
+    Parameters
+    ----------
+    transcript: Dict[str, Any]
+        The transcript dictionary, see transcript_to_dict.
+
+    Returns
+    -------
+    Transcript
+        The transcript model.
+    """
+    from cdp_backend.pipeline.transcript_model import (
+        Sentence,
+        SentenceAnnotations,
+        Transcript,
+        TranscriptAnnotations,
+        Word,
+        WordAnnotations,
+    )
+
+    def _annotations(cls: Any, annotations: Optional[Dict[str, Any]]) -> Any:
+        if annotations is None:
+            return None
+        return cls.from_dict(annotations)
+
+    return Transcript(
+        generator=transcript["generator"],
+        confidence=transcript["confidence"],
+        session_datetime=transcript.get("session_datetime"),
+        created_datetime=transcript["created_datetime"],
+        sentences=[
+            Sentence(
+                index=sentence["index"],
+                confidence=sentence["confidence"],
+                start_time=sentence["start_time"],
+                end_time=sentence["end_time"],
+                words=[
+                    Word(
+                        index=word["index"],
+                        start_time=word["start_time"],
+                        end_time=word["end_time"],
+                        text=word["text"],
+                        annotations=_annotations(
+                            WordAnnotations, word.get("annotations")
+                        ),
+                    )
+                    for word in sentence["words"]
+                ],
+                text=sentence["text"],
+                speaker_index=sentence.get("speaker_index"),
+                speaker_name=sentence.get("speaker_name"),
+                annotations=_annotations(
+                    SentenceAnnotations, sentence.get("annotations")
+                ),
+            )
+            for sentence in transcript["sentences"]
+        ],
+        annotations=_annotations(TranscriptAnnotations, transcript.get("annotations")),
+    )
+
+
+###############################################################################
+
+
+def encode_transcript(
+    transcript: TranscriptLike,
+    transcript_format: str = DEFAULT_TRANSCRIPT_FORMAT,
+) -> bytes:
+    """
+    Serialize a transcript to bytes.
+
+    Parameters
+    ----------
+    transcript: Union[Transcript, Dict[str, Any]]
+        The transcript to serialize.
+    transcript_format: str
+        One of TranscriptFormats.
+        Default: "gzip" (minified JSON, gzip framed)
+
+    Returns
+    -------
+    bytes
+        The serialized transcript.
+
+    Raises
+    ------
+    ValueError
+        Unknown transcript format.
+    """
+    if transcript_format not in ALL_TRANSCRIPT_FORMATS:
+        raise ValueError(
+            f"Unknown transcript format: '{transcript_format}'. "
+            f"Options: {ALL_TRANSCRIPT_FORMATS}"
+        )
+
+    transcript_dict = transcript_to_dict(transcript)
+    if transcript_format == TranscriptFormats.json:
+        return json.dumps(transcript_dict, indent=4).encode("utf-8")
+
+    if orjson is not None:
+        # Numpy scalars are common in generated timings, the stdlib encoder
+        # accepts them as float subclasses so match that
+        encoded = orjson.dumps(transcript_dict, option=orjson.OPT_SERIALIZE_NUMPY)
+    else:  # pragma: no cover
+        encoded = json.dumps(transcript_dict, separators=(",", ":")).encode("utf-8")
+
+    if transcript_format == TranscriptFormats.gzip:
+        # mtime=0 so identical transcripts produce identical bytes
+        return gzip.compress(encoded, compresslevel=_GZIP_LEVEL, mtime=0)
+    if transcript_format == TranscriptFormats.zstd:
+        return _zstandard().ZstdCompressor(level=_ZSTD_LEVEL).compress(encoded)
+    return encoded
+
+
+def decode_transcript(data: bytes) -> Dict[str, Any]:
+    """
+    Deserialize a transcript stored in any of the TranscriptFormats.
+
+    The format is detected from the leading bytes.
+
+    Parameters
+    ----------
+    data: bytes
+        The serialized transcript.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The transcript dictionary.
+    """
+    if data[:2] == _GZIP_MAGIC:
+        data = gzip.decompress(data)
+    elif data[:4] == _ZSTD_MAGIC:
+        data = _zstandard().ZstdDecompressor().decompressobj().decompress(data)
+
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)  # pragma: no cover
+
+
+def write_transcript(
+    transcript: TranscriptLike,
+    path: Union[str, Path],
+    transcript_format: str = DEFAULT_TRANSCRIPT_FORMAT,
+) -> Path:
+    """
+    Serialize a transcript to a file.
+
+    Parameters
+    ----------
+    transcript: Union[Transcript, Dict[str, Any]]
+        The transcript to store.
+    path: Union[str, Path]
+        The path to store the transcript to. Replaced atomically if it exists.
+        See TRANSCRIPT_FORMAT_SUFFIXES for the conventional suffix of each format.
+    transcript_format: str
+        One of TranscriptFormats.
+        Default: "gzip" (minified JSON, gzip framed)
+
+    Returns
+    -------
+    Path
+        The path the transcript was stored to.
+    """
+    path = Path(path)
+    # Write then rename so readers (and other writers of the same path, e.g. a
+    # worker whose lease was reclaimed) never see a partial file
+    temp_path = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    try:
+        with open(temp_path, "wb") as open_f:
+            open_f.write(encode_transcript(transcript, transcript_format))
+        os.replace(temp_path, path)
+    finally:
+        if temp_path.exists():
+            temp_path.unlink()
+
+    return path
+
+
+def read_transcript_dict(path: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Read a transcript file of any of the TranscriptFormats as a dictionary.
+
+    Parameters
+    ----------
+    path: Union[str, Path]
+        The path to the transcript file.
+
+    Returns
+    -------
+    Dict[str, Any]
+        The transcript dictionary.
+    """
+    with open(path, "rb") as open_f:
+        return decode_transcript(open_f.read())
+
+
+def read_transcript(path: Union[str, Path]) -> "Transcript":
+    """
+    Read a transcript file of any of the TranscriptFormats as a Transcript.
+
+    Parameters
+    ----------
+    path: Union[str, Path]
+        The path to the transcript file.
+
+    Returns
+    -------
+    Transcript
+        The transcript model.
+    """
+    return transcript_from_dict(read_transcript_dict(path))
+
+
+def transcript_suffix(path: Union[str, Path]) -> str:
+    """
+    Get the transcript format suffix of a path, e.g. ".json.gz".
+
+    Parameters
+    ----------
+    path: Union[str, Path]
+        The path to a transcript file.
+
+    Returns
+    -------
+    str
+        The longest known transcript suffix the path ends with.
+        ".json" if no known suffix matches.
+    """
+    name = Path(path).name
+    for suffix in sorted(set(TRANSCRIPT_FORMAT_SUFFIXES.values()), key=len)[::-1]:
+        if name.endswith(suffix):
+            return suffix
+
+    return ".json"
@@ -0,0 +1,433 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import hashlib
+import math
+from collections import OrderedDict
+from pathlib import Path
+from typing import NamedTuple, Optional, Union
+
+import numpy as np
+
+from . import __version__
+
+###############################################################################
+
+DEFAULT_SHINGLE_SIZE = 5
+DEFAULT_EPSILON = 0.05
+DEFAULT_DELTA = 0.05
+DEFAULT_SEED = 42
+# Sketches kept in memory by ApproximateSimilarity (~6KB each at the defaults)
+DEFAULT_MAX_SKETCHES = 4096
+
+# Multiplier for the rolling shingle hash (a large odd 64-bit constant)
+_SHINGLE_HASH_BASE = np.uint64(0x100000001B3)
+
+###############################################################################
+
+
+class MinHashSketch(NamedTuple):
+    # Minimum hash value of the shingle set for each permutation
+    hashvalues: np.ndarray
+    # Number of bytes per shingle
+    shingle_size: int
+    # Seed used to generate the permutations
+    seed: int
+
+    @property
+    def num_perm(self) -> int:
+        """
+        Returns
+        -------
+        int
+            The number of permutations (hash functions) in the sketch.
+        """
+        return len(self.hashvalues)
+
+    def is_compatible(self, other: "MinHashSketch") -> bool:
+        """
+        Returns
+        -------
+        bool
+            True if both sketches were produced with the same parameters
+            and can be compared against each other.
+        """
+        return (
+            self.shingle_size == other.shingle_size
+            and self.seed == other.seed
+            and self.num_perm == other.num_perm
+        )
+
+    def save(self, path: Union[str, Path]) -> Path:
+        """
+        Store the sketch to disk as an uncompressed NumPy archive.
+
+        Parameters
+        ----------
+        path: Union[str, Path]
+            The path to store the sketch to.
+
+        Returns
+        -------
+        Path
+            The path the sketch was stored to.
+        """
+        path = Path(path)
+        with open(path, "wb") as open_f:
+            np.savez(
+                open_f,
+                hashvalues=self.hashvalues,
+                shingle_size=self.shingle_size,
+                seed=self.seed,
+            )
+
+        return path
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "MinHashSketch":
+        """
+        Load a sketch previously stored with `MinHashSketch.save`.
+
+        Parameters
+        ----------
+        path: Union[str, Path]
+            The path to the stored sketch.
+
+        Returns
+        -------
+        MinHashSketch
+            The loaded sketch.
+        """
+        with np.load(path) as stored:
+            return cls(
+                hashvalues=stored["hashvalues"],
+                shingle_size=int(stored["shingle_size"]),
+                seed=int(stored["seed"]),
+            )
+
+
+def num_perm_for_error_bound(epsilon: float, delta: float) -> int:
+    """
+    Get the number of MinHash permutations required so that the estimated
+    similarity is within epsilon of the true shingle similarity with
+    probability of at least 1 - delta.
+
+    Parameters
+    ----------
+    epsilon: float
+        Maximum absolute error of the estimate, as a fraction in (0, 1).
+        I.e. 0.05 is five points on the 0 - 100 similarity scale.
+    delta: float
+        Allowed probability that the estimate falls outside of the error bound.
+
+    Returns
+    -------
+    int
+        The number of permutations to use.
+
+    Notes
+    -----
+    Uses the Hoeffding bound: P(|estimate - J| >= epsilon) <= 2 * exp(-2 k epsilon^2)
+    """
+    if not 0 < epsilon < 1:
+        raise ValueError(f"epsilon must be between 0 and 1 (exclusive), got {epsilon}")
+    if not 0 < delta < 1:
+        raise ValueError(f"delta must be between 0 and 1 (exclusive), got {delta}")
+
+    return math.ceil(math.log(2 / delta) / (2 * epsilon**2))
+
+
+def _shingle_hashes(text: str, shingle_size: int = DEFAULT_SHINGLE_SIZE) -> np.ndarray:
+    """
+    Get the sorted, unique, 64-bit hashes of every byte n-gram in the text.
+    """
+    encoded = np.frombuffer(text.encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+
+    # Texts shorter than a single shingle are treated as one shingle
+    if len(encoded) == 0:
+        return np.empty(0, dtype=np.uint64)
+    if len(encoded) < shingle_size:
+        shingle_size = len(encoded)
+
+    # Polynomial rolling hash over every window, computed column-wise
+    # uint64 arithmetic intentionally wraps
+    n_shingles = len(encoded) - shingle_size + 1
+    hashes = np.zeros(n_shingles, dtype=np.uint64)
+    for offset in range(shingle_size):
+        hashes = hashes * _SHINGLE_HASH_BASE + encoded[offset : offset + n_shingles]
+
+    return np.unique(hashes)
+
+
+def _permutation_params(num_perm: int, seed: int) -> np.ndarray:
+    """
+    Get the (odd) multipliers and offsets for the multiply-shift hash family.
+    """
+    rng = np.random.default_rng(seed)
+    params = rng.integers(
+        0, np.iinfo(np.uint64).max, size=(2, num_perm), dtype=np.uint64, endpoint=True
+    )
+    params[0] |= np.uint64(1)
+    return params
+
+
+def sketch_text(
+    text: str,
+    num_perm: Optional[int] = None,
+    shingle_size: int = DEFAULT_SHINGLE_SIZE,
+    seed: int = DEFAULT_SEED,
+    epsilon: float = DEFAULT_EPSILON,
+    delta: float = DEFAULT_DELTA,
+    chunk_size: int = 8192,
+) -> MinHashSketch:
+    """
+    Compute the MinHash sketch of the byte shingles of a text.
+
+    Parameters
+    ----------
+    text: str
+        The text to sketch.
+    num_perm: Optional[int]
+        The number of permutations to use.
+        Default: None (derive from epsilon and delta)
+    shingle_size: int
+        The number of bytes per shingle.
+        Default: 5
+    seed: int
+        The seed for generating permutations.
+        Sketches are only comparable when produced with the same seed.
+        Default: 42
+    epsilon: float
+        Error bound used to derive num_perm when not provided.
+        Default: 0.05
+    delta: float
+        Failure probability used to derive num_perm when not provided.
+        Default: 0.05
+    chunk_size: int
+        Number of shingles to hash at once. Bounds peak memory to roughly
+        chunk_size * num_perm * 8 bytes.
+        Default: 8192
+
+    Returns
+    -------
+    MinHashSketch
+        The sketch, which can be stored and reused for every comparison of the text.
+
+    See Also
+    --------
+    num_perm_for_error_bound
+        How num_perm is derived from epsilon and delta.
+    """
+    if num_perm is None:
+        num_perm = num_perm_for_error_bound(epsilon, delta)
+
+    multipliers, offsets = _permutation_params(num_perm, seed)
+    shingles = _shingle_hashes(text, shingle_size)
+
+    # Empty texts get the maximum value in every slot so two empty texts match
+    hashvalues = np.full(num_perm, np.iinfo(np.uint32).max, dtype=np.uint64)
+    for start in range(0, len(shingles), chunk_size):
+        chunk = shingles[start : start + chunk_size]
+        permuted = (chunk[:, None] * multipliers[None, :] + offsets[None, :]) >> 32
+        np.minimum(hashvalues, permuted.min(axis=0), out=hashvalues)
+
+    return MinHashSketch(
+        hashvalues=hashvalues.astype(np.uint32),
+        shingle_size=shingle_size,
+        seed=seed,
+    )
+
+
+def sketch_similarity(sketch_1: MinHashSketch, sketch_2: MinHashSketch) -> float:
+    """
+    Estimate the shingle similarity of two texts from their sketches.
+
+    Parameters
+    ----------
+    sketch_1: MinHashSketch
+        Left text sketch
+    sketch_2: MinHashSketch
+        Right text sketch
+
+    Returns
+    -------
+    float
+        The estimated Jaccard similarity of the shingle sets, scaled to 0 - 100.
+    """
+    if not sketch_1.is_compatible(sketch_2):
+        raise ValueError(
+            "Sketches were produced with different parameters and cannot be compared."
+        )
+
+    return float(np.mean(sketch_1.hashvalues == sketch_2.hashvalues)) * 100
+
+
+def shingle_similarity(
+    text_1: str,
+    text_2: str,
+    shingle_size: int = DEFAULT_SHINGLE_SIZE,
+) -> float:
+    """
+    Exact Jaccard similarity of the byte shingles of two texts.
+    This is the quantity estimated by `sketch_similarity`, computed in linear time.
+
+    Parameters
+    ----------
+    text_1: str
+        Left text
+    text_2: str
+        Right text
+    shingle_size: int
+        The number of bytes per shingle.
+        Default: 5
+
+    Returns
+    -------
+    float
+        The Jaccard similarity of the shingle sets, scaled to 0 - 100.
+    """
+    shingles_1 = _shingle_hashes(text_1, shingle_size)
+    shingles_2 = _shingle_hashes(text_2, shingle_size)
+    n_shared = len(np.intersect1d(shingles_1, shingles_2, assume_unique=True))
+    n_union = len(shingles_1) + len(shingles_2) - n_shared
+    if n_union == 0:
+        return 100.0
+
+    return n_shared / n_union * 100
+
+
+class ApproximateSimilarity:
+    """
+    A drop-in `similarity_calc` for `text_differences` that estimates similarity
+    from MinHash sketches and only computes an exact score when the estimate is
+    too close to a decision threshold to be trusted.
+    """
+
+    def __init__(
+        self,
+        threshold: float,
+        epsilon: float = DEFAULT_EPSILON,
+        delta: float = DEFAULT_DELTA,
+        shingle_size: int = DEFAULT_SHINGLE_SIZE,
+        seed: int = DEFAULT_SEED,
+        sketch_dir: Optional[Union[str, Path]] = None,
+        max_sketches: int = DEFAULT_MAX_SKETCHES,
+    ):
+        """
+        Parameters
+        ----------
+        threshold: float
+            The decision threshold (0 - 100) the caller will compare scores against.
+        epsilon: float
+            Maximum absolute error of the estimate as a fraction in (0, 1).
+            Estimates within epsilon * 100 of the threshold are rescored exactly.
+            Default: 0.05
+        delta: float
+            Allowed probability that an estimate falls outside of the error bound.
+            Default: 0.05
+        shingle_size: int
+            The number of bytes per shingle.
+            Default: 5
+        seed: int
+            The seed for generating permutations.
+            Default: 42
+        sketch_dir: Optional[Union[str, Path]]
+            Directory to store and reuse sketches in, keyed by text content hash.
+            Default: None (sketches are only kept in memory)
+        max_sketches: int
+            The maximum number of sketches kept in memory, least recently used
+            sketches are dropped first (and reloaded from sketch_dir if set).
+            Default: 4096
+
+        Notes
+        -----
+        Every score is shingle Jaccard similarity, estimated or exact, so the
+        threshold should be chosen for that scale rather than for QRatio. There
+        is no other exact scorer, as mixing it with the estimates would put one
+        comparison's scores on two scales.
+        """
+        self.threshold = threshold
+        self.epsilon = epsilon
+        self.delta = delta
+        self.shingle_size = shingle_size
+        self.seed = seed
+        self.num_perm = num_perm_for_error_bound(epsilon, delta)
+        self.sketch_dir = Path(sketch_dir) if sketch_dir is not None else None
+        self.max_sketches = max_sketches
+        if self.sketch_dir is not None:
+            self.sketch_dir.mkdir(parents=True, exist_ok=True)
+
+        # Counters for how often the exact fallback was used
+        self.n_approximate = 0
+        self.n_exact = 0
+
+        self._sketches: "OrderedDict[str, MinHashSketch]" = OrderedDict()
+
+    @property
+    def cache_identity(self) -> str:
+        """
+        Returns
+        -------
+        str
+            A stable description of the scoring settings for comparison cache keys.
+        """
+        return (
+            f"{type(self).__module__}.{type(self).__qualname__}=={__version__}("
+            f"threshold={self.threshold}, num_perm={self.num_perm}, "
+            f"shingle_size={self.shingle_size}, seed={self.seed})"
+        )
+
+    def _sketch_key(self, text: str) -> str:
+        content_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        return f"{content_hash}-{self.shingle_size}-{self.num_perm}-{self.seed}"
+
+    def sketch(self, text: str) -> MinHashSketch:
+        """
+        Get the sketch for a text, from memory, the sketch directory, or computed.
+
+        Parameters
+        ----------
+        text: str
+            The text to sketch.
+
+        Returns
+        -------
+        MinHashSketch
+            The sketch of the text.
+        """
+        key = self._sketch_key(text)
+        cached = self._sketches.get(key)
+        if cached is not None:
+            self._sketches.move_to_end(key)
+            return cached
+
+        stored_path = None
+        if self.sketch_dir is not None:
+            stored_path = self.sketch_dir / f"{key}.npz"
+        if stored_path is not None and stored_path.exists():
+            sketch = MinHashSketch.load(stored_path)
+        else:
+            sketch = sketch_text(
+                text,
+                num_perm=self.num_perm,
+                shingle_size=self.shingle_size,
+                seed=self.seed,
+            )
+            if stored_path is not None:
+                sketch.save(stored_path)
+
+        self._sketches[key] = sketch
+        if len(self._sketches) > self.max_sketches:
+            self._sketches.popitem(last=False)
+        return sketch
+
+    def __call__(self, text_1: str, text_2: str) -> float:
+        estimate = sketch_similarity(self.sketch(text_1), self.sketch(text_2))
+
+        # Too close to call, score exactly
+        if abs(estimate - self.threshold) <= self.epsilon * 100:
+            self.n_exact += 1
+            return shingle_similarity(text_1, text_2, self.shingle_size)
+
+        self.n_approximate += 1
+        return estimate
@@ -0,0 +1,626 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Protocol, Set, Tuple, Union
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+###############################################################################
+
+log = logging.getLogger(__name__)
+
+###############################################################################
+
+DEFAULT_SNAPSHOT_DIR = Path("cdp-whisper-experiments-snapshot/")
+
+DatetimeLike = Union[str, datetime, pd.Timestamp]
+DatetimeRange = Tuple[pd.Timestamp, pd.Timestamp]
+
+
+class SnapshotFields:
+    infrastructure_slug = "infrastructure_slug"
+    id_ = "id"
+    key = "key"
+    session_datetime = "session_datetime"
+    session_index = "session_index"
+    session_content_hash = "session_content_hash"
+    transcript_path = "transcript_path"
+    year = "year"
+    month = "month"
+
+
+# Columns stored from the source dataset (the source also returns
+# unserializable model references which are dropped)
+STORED_SOURCE_FIELDS = [
+    SnapshotFields.id_,
+    SnapshotFields.key,
+    SnapshotFields.session_datetime,
+    SnapshotFields.session_index,
+    SnapshotFields.session_content_hash,
+    SnapshotFields.transcript_path,
+]
+
+PARTITION_FIELDS = [
+    SnapshotFields.infrastructure_slug,
+    SnapshotFields.year,
+    SnapshotFields.month,
+]
+
+# Explicit so that every write agrees and an empty snapshot can be queried
+SNAPSHOT_SCHEMA = pa.schema(
+    [
+        (SnapshotFields.id_, pa.string()),
+        (SnapshotFields.key, pa.string()),
+        (SnapshotFields.session_datetime, pa.timestamp("ns", tz="UTC")),
+        (SnapshotFields.session_index, pa.int64()),
+        (SnapshotFields.session_content_hash, pa.string()),
+        (SnapshotFields.transcript_path, pa.string()),
+        (SnapshotFields.infrastructure_slug, pa.string()),
+        (SnapshotFields.year, pa.int32()),
+        (SnapshotFields.month, pa.int32()),
+    ]
+)
+
+_PARTITIONING = ds.partitioning(
+    pa.schema(
+        [
+            (SnapshotFields.infrastructure_slug, pa.string()),
+            (SnapshotFields.year, pa.int32()),
+            (SnapshotFields.month, pa.int32()),
+        ]
+    ),
+    flavor="hive",
+)
+
+###############################################################################
+
+
+class InstanceRange(NamedTuple):
+    # The CDP instance to pull sessions from
+    infrastructure_slug: str
+    # The (inclusive) start of the range, naive datetimes are treated as UTC
+    start_datetime: DatetimeLike
+    # The (inclusive) end of the range, naive datetimes are treated as UTC
+    end_datetime: DatetimeLike
+
+
+class SessionSource(Protocol):
+    """
+    Anything that can provide sessions (with stored ground truth transcripts)
+    for a CDP instance and datetime range, e.g. `cdp_data.datasets`.
+    """
+
+    def get_session_dataset(
+        self,
+        infrastructure_slug: str,
+        start_datetime: Optional[Union[str, datetime]] = None,
+        end_datetime: Optional[Union[str, datetime]] = None,
+        store_transcript: bool = False,
+    ) -> pd.DataFrame:
+        ...
+
+
+class CDPDataSessionSource:
+    """
+    Sessions pulled from a CDP instance's database and file store with cdp_data.
+    """
+
+    def get_session_dataset(
+        self,
+        infrastructure_slug: str,
+        start_datetime: Optional[Union[str, datetime]] = None,
+        end_datetime: Optional[Union[str, datetime]] = None,
+        store_transcript: bool = False,
+    ) -> pd.DataFrame:
+        # Heavy import, only needed when actually pulling from a CDP instance
+        from cdp_data import datasets
+
+        return datasets.get_session_dataset(
+            infrastructure_slug=infrastructure_slug,
+            start_datetime=start_datetime,
+            end_datetime=end_datetime,
+            store_transcript=store_transcript,
+        )
+
+
+class LocalSessionSource:
+    """
+    An offline stand-in for `cdp_data.datasets` backed by an in-memory dataset
+    of sessions whose transcripts are already on disk.
+
+    Every query is recorded in `queries` so callers can check what would have
+    been pulled from the CDP instance.
+    """
+
+    def __init__(self, sessions: pd.DataFrame):
+        """
+        Parameters
+        ----------
+        sessions: pd.DataFrame
+            The sessions to serve. Must contain the columns returned by
+            cdp_data.datasets.get_session_dataset (including transcript_path) and,
+            to serve multiple instances, an infrastructure_slug column.
+        """
+        self.sessions = sessions.copy()
+        self.sessions[SnapshotFields.session_datetime] = _to_utc(
+            self.sessions[SnapshotFields.session_datetime]
+        )
+        self.queries: List[Tuple[str, pd.Timestamp, pd.Timestamp]] = []
+
+    def get_session_dataset(
+        self,
+        infrastructure_slug: str,
+        start_datetime: Optional[Union[str, datetime]] = None,
+        end_datetime: Optional[Union[str, datetime]] = None,
+        store_transcript: bool = False,
+    ) -> pd.DataFrame:
+        start = _to_timestamp(start_datetime or pd.Timestamp.min.tz_localize("UTC"))
+        end = _to_timestamp(end_datetime or pd.Timestamp.max.tz_localize("UTC"))
+        self.queries.append((infrastructure_slug, start, end))
+
+        selected = self.sessions[
+            self.sessions[SnapshotFields.session_datetime].between(start, end)
+        ]
+        if SnapshotFields.infrastructure_slug in selected.columns:
+            selected = selected[
+                selected[SnapshotFields.infrastructure_slug] == infrastructure_slug
+            ]
+        if not store_transcript:
+            selected = selected.drop(columns=[SnapshotFields.transcript_path])
+
+        return selected.reset_index(drop=True)
+
+
+###############################################################################
+
+
+def _to_timestamp(value: DatetimeLike) -> pd.Timestamp:
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is None:
+        return timestamp.tz_localize("UTC")
+    return timestamp.tz_convert("UTC")
+
+
+def _to_utc(values: pd.Series) -> pd.Series:
+    values = pd.to_datetime(values)
+    if values.dt.tz is None:
+        return values.dt.tz_localize("UTC")
+    return values.dt.tz_convert("UTC")
+
+
+def _merge_ranges(ranges: List[DatetimeRange]) -> List[DatetimeRange]:
+    merged: List[DatetimeRange] = []
+    for start, end in sorted(ranges):
+        if len(merged) > 0 and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+def _subtract_ranges(
+    requested: DatetimeRange,
+    covered: List[DatetimeRange],
+) -> List[DatetimeRange]:
+    missing = []
+    cursor, end = requested
+    for covered_start, covered_end in _merge_ranges(covered):
+        if covered_end < cursor or covered_start > end:
+            continue
+        if covered_start > cursor:
+            missing.append((cursor, covered_start))
+        cursor = max(cursor, covered_end)
+    if cursor < end:
+        missing.append((cursor, end))
+
+    return missing
+
+
+class SessionSnapshot:
+    """
+    A local store of sessions and their ground truth transcripts.
+
+    Sessions from any number of CDP instances are stored as a Hive-partitioned
+    (instance / year / month) Parquet dataset alongside a directory of transcripts.
+    The store remembers which datetime ranges have been pulled from the source
+    for each instance so that syncing only pulls what is missing, and queries
+    only read the partitions of the requested instances and range.
+
+    Layout::
+
+        {snapshot_dir}/
+        ├── sync-state/
+        │   └── {infrastructure-slug}.json
+        ├── sessions/
+        │   └── infrastructure_slug={infrastructure-slug}/
+        │       └── year=2020/
+        │           └── month=8/
+        │               └── part-{uuid}-0.parquet
+        └── transcripts/
+            └── {infrastructure-slug}/
+                └── {session-id}.json
+    """
+
+    def __init__(
+        self,
+        snapshot_dir: Union[str, Path] = DEFAULT_SNAPSHOT_DIR,
+        source: Optional[SessionSource] = None,
+    ):
+        """
+        Parameters
+        ----------
+        snapshot_dir: Union[str, Path]
+            The directory to store the snapshot in.
+            Default: cdp-whisper-experiments-snapshot/
+        source: Optional[SessionSource]
+            Where to pull sessions from.
+            Default: None (pull from the CDP instance with cdp_data)
+        """
+        self.snapshot_dir = Path(snapshot_dir)
+        self.sessions_dir = self.snapshot_dir / "sessions"
+        self.transcripts_dir = self.snapshot_dir / "transcripts"
+        self.sync_state_dir = self.snapshot_dir / "sync-state"
+        self.source: SessionSource = (
+            source if source is not None else CDPDataSessionSource()
+        )
+
+        self.sessions_dir.mkdir(parents=True, exist_ok=True)
+        self.transcripts_dir.mkdir(parents=True, exist_ok=True)
+        self.sync_state_dir.mkdir(parents=True, exist_ok=True)
+
+    def _read_sync_state(self, infrastructure_slug: str) -> List[DatetimeRange]:
+        # One file per instance so instances can be synced in parallel
+        sync_state_path = self.sync_state_dir / f"{infrastructure_slug}.json"
+        if not sync_state_path.exists():
+            return []
+
+        with open(sync_state_path, "r") as open_f:
+            stored = json.load(open_f)
+
+        return [(pd.Timestamp(start), pd.Timestamp(end)) for start, end in stored]
+
+    def _write_sync_state(
+        self,
+        infrastructure_slug: str,
+        ranges: List[DatetimeRange],
+    ) -> None:
+        # Write then rename so an interrupted sync never leaves a corrupt state
+        sync_state_path = self.sync_state_dir / f"{infrastructure_slug}.json"
+        temp_path = sync_state_path.with_suffix(".json.tmp")
+        with open(temp_path, "w") as open_f:
+            json.dump(
+                [
+                    [start.isoformat(), end.isoformat()]
+                    for start, end in _merge_ranges(ranges)
+                ],
+                open_f,
+                indent=4,
+            )
+        os.replace(temp_path, sync_state_path)
+
+    def synced_ranges(self, infrastructure_slug: str) -> List[DatetimeRange]:
+        """
+        Parameters
+        ----------
+        infrastructure_slug: str
+            The CDP instance to get the synced ranges for.
+
+        Returns
+        -------
+        List[DatetimeRange]
+            The merged (UTC) datetime ranges already pulled from the source.
+        """
+        return _merge_ranges(self._read_sync_state(infrastructure_slug))
+
+    def last_synced_datetime(self, infrastructure_slug: str) -> Optional[pd.Timestamp]:
+        """
+        Parameters
+        ----------
+        infrastructure_slug: str
+            The CDP instance to get the last synced datetime for.
+
+        Returns
+        -------
+        Optional[pd.Timestamp]
+            The end of the latest synced range. None if never synced.
+        """
+        ranges = self.synced_ranges(infrastructure_slug)
+        if len(ranges) == 0:
+            return None
+        return ranges[-1][1]
+
+    def _dataset(self) -> ds.Dataset:
+        return ds.dataset(
+            self.sessions_dir,
+            schema=SNAPSHOT_SCHEMA,
+            format="parquet",
+            partitioning=_PARTITIONING,
+        )
+
+    def _stored_ids(self, infrastructure_slug: str) -> Set[str]:
+        table = self._dataset().to_table(
+            columns=[SnapshotFields.id_],
+            filter=ds.field(SnapshotFields.infrastructure_slug) == infrastructure_slug,
+        )
+        return set(table.column(SnapshotFields.id_).to_pylist())
+
+    def _store_sessions(self, infrastructure_slug: str, sessions: pd.DataFrame) -> int:
+        # Skip anything already stored (ranges may touch at their edges)
+        sessions = sessions[
+            ~sessions[SnapshotFields.id_].isin(self._stored_ids(infrastructure_slug))
+        ]
+        if len(sessions) == 0:
+            return 0
+
+        sessions = sessions[STORED_SOURCE_FIELDS].copy()
+        sessions[SnapshotFields.infrastructure_slug] = infrastructure_slug
+        sessions[SnapshotFields.session_datetime] = _to_utc(
+            sessions[SnapshotFields.session_datetime]
+        )
+        sessions[SnapshotFields.year] = sessions[
+            SnapshotFields.session_datetime
+        ].dt.year
+        sessions[SnapshotFields.month] = sessions[
+            SnapshotFields.session_datetime
+        ].dt.month
+
+        # Copy transcripts into the snapshot and store the relative path
+        instance_transcripts_dir = self.transcripts_dir / infrastructure_slug
+        instance_transcripts_dir.mkdir(exist_ok=True)
+        relative_paths: List[Optional[str]] = []
+        for session_id, transcript_path in zip(
+            sessions[SnapshotFields.id_], sessions[SnapshotFields.transcript_path]
+        ):
+            if pd.isna(transcript_path):
+                relative_paths.append(None)
+                continue
+
+            relative_path = (
+                instance_transcripts_dir / f"{session_id}.json"
+            ).relative_to(self.snapshot_dir)
+            shutil.copyfile(transcript_path, self.snapshot_dir / relative_path)
+            relative_paths.append(relative_path.as_posix())
+        sessions[SnapshotFields.transcript_path] = relative_paths
+
+        ds.write_dataset(
+            pa.Table.from_pandas(
+                sessions, schema=SNAPSHOT_SCHEMA, preserve_index=False
+            ),
+            self.sessions_dir,
+            format="parquet",
+            partitioning=_PARTITIONING,
+            basename_template=f"part-{uuid.uuid4().hex}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+        )
+        return len(sessions)
+
+    def sync(
+        self,
+        infrastructure_slug: str,
+        start_datetime: DatetimeLike,
+        end_datetime: DatetimeLike,
+    ) -> int:
+        """
+        Pull any sessions in the datetime range that haven't been pulled before.
+
+        Parameters
+        ----------
+        infrastructure_slug: str
+            The CDP instance to pull sessions from.
+        start_datetime: DatetimeLike
+            The start of the range. Naive datetimes are treated as UTC.
+        end_datetime: DatetimeLike
+            The end of the range. Naive datetimes are treated as UTC.
+
+        Returns
+        -------
+        int
+            The number of newly stored sessions.
+        """
+        requested = (_to_timestamp(start_datetime), _to_timestamp(end_datetime))
+        covered = self._read_sync_state(infrastructure_slug)
+
+        n_stored = 0
+        for missing_start, missing_end in _subtract_ranges(requested, covered):
+            log.info(
+                f"Pulling {infrastructure_slug} sessions from "
+                f"{missing_start.isoformat()} to {missing_end.isoformat()}"
+            )
+            sessions = self.source.get_session_dataset(
+                infrastructure_slug=infrastructure_slug,
+                start_datetime=missing_start.to_pydatetime(),
+                end_datetime=missing_end.to_pydatetime(),
+                store_transcript=True,
+            )
+            n_stored += self._store_sessions(infrastructure_slug, sessions)
+
+            # Record progress per range so an interrupted sync resumes
+            covered = covered + [(missing_start, missing_end)]
+            self._write_sync_state(infrastructure_slug, covered)
+
+        return n_stored
+
+    def sync_many(
+        self,
+        instance_ranges: List[InstanceRange],
+        max_workers: Optional[int] = None,
+    ) -> int:
+        """
+        Pull any missing sessions for many instances and ranges, one thread per
+        instance.
+
+        Parameters
+        ----------
+        instance_ranges: List[InstanceRange]
+            The instances and datetime ranges to pull.
+            An instance may be listed multiple times with different ranges.
+        max_workers: Optional[int]
+            The maximum number of instances to pull at the same time.
+            Default: None (one thread per instance, up to the executor default)
+
+        Returns
+        -------
+        int
+            The number of newly stored sessions.
+        """
+        # Ranges of the same instance are synced sequentially by the same worker
+        # so that they never race on the instance's sync state
+        by_instance: Dict[str, List[InstanceRange]] = {}
+        for instance_range in instance_ranges:
+            by_instance.setdefault(instance_range.infrastructure_slug, []).append(
+                instance_range
+            )
+
+        def _sync_instance(ranges: List[InstanceRange]) -> int:
+            return sum(
+                self.sync(
+                    instance_range.infrastructure_slug,
+                    instance_range.start_datetime,
+                    instance_range.end_datetime,
+                )
+                for instance_range in ranges
+            )
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return sum(executor.map(_sync_instance, by_instance.values()))
+
+    def refresh(
+        self,
+        infrastructure_slug: str,
+        end_datetime: Optional[DatetimeLike] = None,
+    ) -> int:
+        """
+        Pull only the sessions newer than the last sync.
+
+        Parameters
+        ----------
+        infrastructure_slug: str
+            The CDP instance to pull sessions from. Must have been synced before.
+        end_datetime: Optional[DatetimeLike]
+            The end of the range to pull up to.
+            Default: None (now)
+
+        Returns
+        -------
+        int
+            The number of newly stored sessions.
+        """
+        last_synced = self.last_synced_datetime(infrastructure_slug)
+        if last_synced is None:
+            raise ValueError(
+                f"{infrastructure_slug} has never been synced, "
+                f"use SessionSnapshot.sync with an explicit start datetime."
+            )
+        if end_datetime is None:
+            end_datetime = datetime.now(timezone.utc)
+
+        return self.sync(infrastructure_slug, last_synced, end_datetime)
+
+    def query(
+        self,
+        start_datetime: Optional[DatetimeLike] = None,
+        end_datetime: Optional[DatetimeLike] = None,
+        infrastructure_slug: Optional[Union[str, List[str]]] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Read the stored sessions in a datetime range.
+        Only partitions overlapping the range are read.
+
+        Parameters
+        ----------
+        start_datetime: Optional[DatetimeLike]
+            The (inclusive) start of the range.
+            Default: None (no lower bound)
+        end_datetime: Optional[DatetimeLike]
+            The (inclusive) end of the range.
+            Default: None (no upper bound)
+        infrastructure_slug: Optional[Union[str, List[str]]]
+            Only return sessions from this instance (or these instances).
+            Default: None (all instances)
+        columns: Optional[List[str]]
+            The columns to read.
+            Default: None (all stored columns)
+
+        Returns
+        -------
+        pd.DataFrame
+            The sessions, sorted by session datetime, with transcript paths resolved.
+
+        Notes
+        -----
+        Does not pull from the source, call `sync` or `refresh` first.
+        """
+        dataset = self._dataset()
+        expression = self._filter_expression(
+            start_datetime, end_datetime, infrastructure_slug
+        )
+        table = dataset.to_table(columns=columns, filter=expression)
+        sessions = table.to_pandas()
+        if len(sessions) == 0:
+            return sessions
+
+        if SnapshotFields.transcript_path in sessions.columns:
+            root = str(self.snapshot_dir.resolve())
+            sessions[SnapshotFields.transcript_path] = sessions[
+                SnapshotFields.transcript_path
+            ].map(lambda path: None if path is None else f"{root}/{path}")
+        if SnapshotFields.session_datetime in sessions.columns:
+            sessions = sessions.sort_values(SnapshotFields.session_datetime)
+
+        return sessions.reset_index(drop=True)
+
+    @staticmethod
+    def _filter_expression(
+        start_datetime: Optional[DatetimeLike],
+        end_datetime: Optional[DatetimeLike],
+        infrastructure_slug: Optional[Union[str, List[str]]],
+    ) -> Optional[Any]:
+        year = ds.field(SnapshotFields.year)
+        month = ds.field(SnapshotFields.month)
+        session_datetime = ds.field(SnapshotFields.session_datetime)
+
+        # Partition bounds let pyarrow skip whole directories,
+        # the row bounds then trim the partitions on the edges
+        expressions = []
+        if start_datetime is not None:
+            start = _to_timestamp(start_datetime)
+            expressions.append(
+                (year > start.year) | ((year == start.year) & (month >= start.month))
+            )
+            expressions.append(
+                session_datetime >= pa.scalar(start, pa.timestamp("ns", "UTC"))
+            )
+        if end_datetime is not None:
+            end = _to_timestamp(end_datetime)
+            expressions.append(
+                (year < end.year) | ((year == end.year) & (month <= end.month))
+            )
+            expressions.append(
+                session_datetime <= pa.scalar(end, pa.timestamp("ns", "UTC"))
+            )
+        if infrastructure_slug is not None:
+            if isinstance(infrastructure_slug, str):
+                infrastructure_slug = [infrastructure_slug]
+            expressions.append(
+                ds.field(SnapshotFields.infrastructure_slug).isin(infrastructure_slug)
+            )
+
+        if len(expressions) == 0:
+            return None
+
+        combined = expressions[0]
+        for expression in expressions[1:]:
+            combined = combined & expression
+        return combined
@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import uuid
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ThreadPoolExecutor,
+    wait,
+)
+from contextlib import ExitStack
+from pathlib import Path
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+###############################################################################
+
+DEFAULT_MAX_IN_FLIGHT = 32
+DEFAULT_ROW_GROUP_SIZE = 16
+
+# Column added to every written row to recover the input order
+ROW_INDEX_COLUMN = "row_index"
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+###############################################################################
+
+
+def bounded_map(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    max_workers: Optional[int] = None,
+    executor: Optional[Executor] = None,
+) -> Iterator[Tuple[int, R]]:
+    """
+    Run a function over items in a thread pool, yielding results as they complete.
+
+    Unlike ThreadPoolExecutor.map, items are pulled from the iterable lazily and
+    at most max_in_flight items are submitted or waiting to be consumed at once,
+    so memory use doesn't grow with the number of items.
+
+    Parameters
+    ----------
+    func: Callable[[T], R]
+        The function to run on each item.
+    items: Iterable[T]
+        The items to process. Consumed lazily.
+    max_in_flight: int
+        The maximum number of submitted but not yet yielded items.
+        Default: 32
+    max_workers: Optional[int]
+        The number of threads.
+        Default: None (the executor default)
+    executor: Optional[Executor]
+        An executor to submit to instead of a new thread pool, e.g. a
+        ProcessPoolExecutor. It is not shut down, and max_workers is ignored.
+        Default: None (a new thread pool)
+
+    Yields
+    ------
+    index: int
+        The position of the item in the input iterable.
+    result: R
+        The result of func on the item.
+
+    Notes
+    -----
+    Results are yielded in completion order, not input order.
+    Any exception raised by func is raised from the generator.
+    """
+    if max_in_flight < 1:
+        raise ValueError(f"max_in_flight must be at least 1, got {max_in_flight}")
+
+    with ExitStack() as stack:
+        if executor is None:
+            executor = stack.enter_context(ThreadPoolExecutor(max_workers=max_workers))
+
+        in_flight: Dict["Future[R]", int] = {}
+        item_iter = enumerate(items)
+        exhausted = False
+        while True:
+            # Top up the window
+            while not exhausted and len(in_flight) < max_in_flight:
+                try:
+                    index, item = next(item_iter)
+                except StopIteration:
+                    exhausted = True
+                    break
+                in_flight[executor.submit(func, item)] = index
+
+            if len(in_flight) == 0:
+                return
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = in_flight.pop(future)
+                yield index, future.result()
+
+
+class ParquetPartWriter:
+    """
+    Write rows to a directory of Parquet part files as they arrive.
+
+    Rows are buffered and flushed as one part file (a single row group) every
+    row_group_size rows. Part files are written to a temporary name and renamed
+    into place, so the directory can be read at any time for the rows written
+    so far, see read_parquet_parts.
+    """
+
+    def __init__(
+        self,
+        output_dir: Union[str, Path],
+        row_group_size: int = DEFAULT_ROW_GROUP_SIZE,
+    ):
+        """
+        Parameters
+        ----------
+        output_dir: Union[str, Path]
+            The directory to write part files to. Created if it doesn't exist.
+        row_group_size: int
+            The number of rows per part file.
+            Default: 16
+        """
+        self.output_dir = Path(output_dir)
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self.row_group_size = row_group_size
+        self.n_rows = 0
+        self.n_parts = 0
+        self._buffer: List[Dict[str, Any]] = []
+        # Unique per writer so several writers can share a directory
+        self._prefix = f"part-{uuid.uuid4().hex[:8]}"
+
+    def write(self, row_index: int, row: Union["pd.Series", Dict[str, Any]]) -> None:
+        """
+        Add a row, flushing a part file if the buffer is full.
+
+        Parameters
+        ----------
+        row_index: int
+            The position of the row in the input, stored as "row_index".
+        row: Union["pd.Series", Dict[str, Any]]
+            The row values. Path values are stored as strings.
+        """
+        values = {
+            key: str(value) if isinstance(value, Path) else value
+            for key, value in dict(row).items()
+        }
+        values[ROW_INDEX_COLUMN] = row_index
+        self._buffer.append(values)
+        if len(self._buffer) >= self.row_group_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """
+        Write any buffered rows as a part file.
+        """
+        import pandas as pd
+
+        if len(self._buffer) == 0:
+            return
+
+        part_path = self.output_dir / f"{self._prefix}-{self.n_parts:05d}.parquet"
+        temp_path = part_path.with_name(f".{part_path.name}.tmp")
+        pd.DataFrame(self._buffer).to_parquet(temp_path, index=False)
+        os.replace(temp_path, part_path)
+
+        self.n_rows += len(self._buffer)
+        self.n_parts += 1
+        self._buffer = []
+
+    def close(self) -> None:
+        """
+        Write any buffered rows.
+        """
+        self.flush()
+
+    def __enter__(self) -> "ParquetPartWriter":
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+def read_parquet_parts(output_dir: Union[str, Path]) -> "pd.DataFrame":
+    """
+    Read every complete part file in a directory back into input order.
+
+    Safe to call while a ParquetPartWriter is still writing to the directory.
+
+    Parameters
+    ----------
+    output_dir: Union[str, Path]
+        The directory of part files.
+
+    Returns
+    -------
+    pd.DataFrame
+        All rows written so far, sorted by and indexed by their row index.
+    """
+    import pandas as pd
+
+    part_paths = sorted(Path(output_dir).glob("part-*.parquet"))
+    if len(part_paths) == 0:
+        return pd.DataFrame()
+
+    # Read parts separately, columns that are all null in one part
+    # may be typed differently than in another
+    rows = pd.concat(
+        [pd.read_parquet(part_path) for part_path in part_paths],
+        ignore_index=True,
+    )
+    rows = rows.sort_values(ROW_INDEX_COLUMN).set_index(ROW_INDEX_COLUMN)
+    rows.index.name = None
+    return rows
@@ -0,0 +1,436 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import wave
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple, Union
+
+import numpy as np
+
+###############################################################################
+
+DEFAULT_WORDS_PER_MINUTE = 150
+DEFAULT_VOCAB_SIZE = 5_000
+DEFAULT_SAMPLE_RATE = 16_000
+DEFAULT_SESSION_DATETIME = datetime(2020, 8, 1, 9, 30)
+
+GROUND_TRUTH_GENERATOR = "Synthetic Ground Truth -- whisper-experiments"
+HYPOTHESIS_GENERATOR = "Synthetic Hypothesis -- whisper-experiments"
+
+_CONSONANTS = list("bcdfghjklmnprstvwz")
+_VOWELS = list("aeiou")
+
+###############################################################################
+
+
+class EditCounts(NamedTuple):
+    # Words replaced by a different vocabulary word
+    substitutions: int
+    # Words replaced by a misspelling of themselves, e.g. "you" -> "yoou"
+    near_miss_substitutions: int
+    # Words added to the hypothesis
+    insertions: int
+    # Words dropped from the hypothesis
+    deletions: int
+
+
+class SyntheticTranscriptPair(NamedTuple):
+    # CDP transcript (as a dict) for the reference side
+    ground_truth: Dict[str, Any]
+    # CDP transcript (as a dict) of the reference after applying edits
+    hypothesis: Dict[str, Any]
+    # The edits actually applied
+    edits: EditCounts
+    # Path to the generated audio, if requested
+    audio_path: Optional[Path]
+
+
+###############################################################################
+
+
+def _make_vocab(rng: np.random.Generator, vocab_size: int) -> List[str]:
+    """
+    Create pronounceable, unique, pseudo-words made of one to four syllables.
+    """
+    vocab: List[str] = []
+    seen = set()
+    while len(vocab) < vocab_size:
+        n_syllables = int(rng.integers(1, 5))
+        consonants = rng.choice(_CONSONANTS, size=n_syllables)
+        vowels = rng.choice(_VOWELS, size=n_syllables)
+        word = "".join(c + v for c, v in zip(consonants, vowels))
+        if word not in seen:
+            seen.add(word)
+            vocab.append(word)
+
+    return vocab
+
+
+def _near_miss(rng: np.random.Generator, word: str) -> str:
+    """
+    Misspell a word by duplicating, dropping, or replacing one character.
+    """
+    position = int(rng.integers(0, len(word)))
+    operation = int(rng.integers(0, 3))
+    if operation == 0 or len(word) == 1:
+        return word[: position + 1] + word[position:]
+    if operation == 1:
+        return word[:position] + word[position + 1 :]
+
+    replacement = str(rng.choice(_VOWELS + _CONSONANTS))
+    if replacement == word[position]:
+        return word[: position + 1] + word[position:]
+    return word[:position] + replacement + word[position + 1 :]
+
+
+def _build_transcript(
+    sentence_words: List[List[Tuple[str, float, float]]],
+    confidences: np.ndarray,
+    generator: str,
+    session_datetime: datetime,
+) -> Dict[str, Any]:
+    """
+    Build the CDP transcript JSON structure from lists of (text, start, end) words.
+    """
+    sentences = []
+    for sentence_index, words in enumerate(sentence_words):
+        text = " ".join(word for word, _, _ in words)
+        sentences.append(
+            {
+                "index": sentence_index,
+                "confidence": float(confidences[sentence_index]),
+                "start_time": words[0][1],
+                "end_time": words[-1][2],
+                "words": [
+                    {
+                        "index": word_index,
+                        "start_time": start_time,
+                        "end_time": end_time,
+                        "text": word,
+                        "annotations": None,
+                    }
+                    for word_index, (word, start_time, end_time) in enumerate(words)
+                ],
+                "text": f"{text[:1].upper()}{text[1:]}.",
+                "speaker_index": None,
+                "speaker_name": None,
+                "annotations": None,
+            }
+        )
+
+    return {
+        "generator": generator,
+        "confidence": float(np.mean(confidences)) if len(confidences) > 0 else 0.0,
+        "session_datetime": session_datetime.isoformat(),
+        # Fixed so that output is fully determined by the seed
+        "created_datetime": (session_datetime + timedelta(days=1)).isoformat(),
+        "sentences": sentences,
+        "annotations": None,
+    }
+
+
+def _write_audio(
+    audio_path: Path,
+    sentence_words: List[List[Tuple[str, float, float]]],
+    vocab_index: Dict[str, int],
+    duration: float,
+    sample_rate: int,
+) -> Path:
+    """
+    Write a mono 16-bit WAV with a tone burst for every word and silence between.
+    Each vocabulary word has its own pitch so the audio matches the transcript.
+    """
+    audio_path.parent.mkdir(parents=True, exist_ok=True)
+    with wave.open(str(audio_path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+
+        # Write one sentence at a time to bound memory for long sessions
+        written = 0
+        for words in sentence_words:
+            sentence_end = int(words[-1][2] * sample_rate)
+            samples = np.zeros(sentence_end - written, dtype=np.int16)
+            for word, start_time, end_time in words:
+                start = int(start_time * sample_rate) - written
+                end = int(end_time * sample_rate) - written
+                frequency = 200 + (vocab_index.get(word, 0) % 400) * 2
+                t = np.arange(end - start) / sample_rate
+                samples[start:end] = (
+                    np.sin(2 * np.pi * frequency * t) * np.hanning(end - start) * 8000
+                ).astype(np.int16)
+
+            wav.writeframes(samples.tobytes())
+            written = sentence_end
+
+        # Trailing silence to the full duration
+        n_trailing = max(int(duration * sample_rate) - written, 0)
+        wav.writeframes(np.zeros(n_trailing, dtype=np.int16).tobytes())
+
+    return audio_path
+
+
+def generate_transcript_pair(
+    duration: float,
+    seed: int = 0,
+    substitution_rate: float = 0.05,
+    insertion_rate: float = 0.02,
+    deletion_rate: float = 0.02,
+    near_miss_fraction: float = 0.5,
+    resegment_rate: float = 0.2,
+    timestamp_jitter: float = 0.1,
+    words_per_minute: int = DEFAULT_WORDS_PER_MINUTE,
+    vocab_size: int = DEFAULT_VOCAB_SIZE,
+    session_datetime: datetime = DEFAULT_SESSION_DATETIME,
+    audio_path: Optional[Union[str, Path]] = None,
+    sample_rate: int = DEFAULT_SAMPLE_RATE,
+) -> SyntheticTranscriptPair:
+    """
+    Generate a ground truth transcript and a hypothesis transcript derived from it
+    with controlled error rates, for load and scaling tests.
+
+    Parameters
+    ----------
+    duration: float
+        The length of the session in seconds.
+    seed: int
+        The seed for all randomness. Equal seeds (and parameters) produce
+        byte-identical output.
+        Default: 0
+    substitution_rate: float
+        The probability a reference word is substituted in the hypothesis.
+        Default: 0.05
+    insertion_rate: float
+        The probability an extra word is inserted after a reference word.
+        Default: 0.02
+    deletion_rate: float
+        The probability a reference word is dropped from the hypothesis.
+        Default: 0.02
+    near_miss_fraction: float
+        The fraction of substitutions that are misspellings of the reference word
+        rather than a different word.
+        Default: 0.5
+    resegment_rate: float
+        The probability a sentence is merged with the next one or split in two
+        in the hypothesis.
+        Default: 0.2
+    timestamp_jitter: float
+        The standard deviation in seconds of noise added to hypothesis word times.
+        Default: 0.1
+    words_per_minute: int
+        The average speaking rate.
+        Default: 150
+    vocab_size: int
+        The number of distinct words. Words are drawn with a Zipfian distribution.
+        Default: 5000
+    session_datetime: datetime
+        The session datetime to store in both transcripts.
+        Default: 2020-08-01 09:30
+    audio_path: Optional[Union[str, Path]]
+        If provided, also write matching synthetic audio (WAV) to this path.
+        Default: None (no audio)
+    sample_rate: int
+        The sample rate of the synthetic audio.
+        Default: 16000
+
+    Returns
+    -------
+    SyntheticTranscriptPair
+        Both transcripts in the CDP transcript JSON structure, the applied edit
+        counts, and the audio path (if requested).
+
+    Notes
+    -----
+    The transcripts are plain dicts so that very long sessions can be generated and
+    written quickly. Use `cdp_backend.pipeline.transcript_model.Transcript.from_dict`
+    to get the model objects.
+    """
+    rng = np.random.default_rng(seed)
+    vocab = _make_vocab(rng, vocab_size)
+
+    # Draw the reference words (Zipfian) and sentence lengths
+    n_words = max(int(duration / 60 * words_per_minute), 1)
+    ranks = np.arange(1, vocab_size + 1)
+    word_probabilities = (1 / ranks) / np.sum(1 / ranks)
+    word_ids = rng.choice(vocab_size, size=n_words, p=word_probabilities)
+    sentence_lengths = rng.integers(4, 26, size=n_words // 4 + 1)
+    sentence_bounds = np.cumsum(sentence_lengths)
+    sentence_bounds = np.concatenate(
+        [[0], sentence_bounds[sentence_bounds < n_words], [n_words]]
+    )
+
+    # Word timings: spoken words take most of their slot, plus pauses
+    # between sentences, all scaled to fit the requested duration
+    word_slots = rng.uniform(0.7, 1.3, size=n_words)
+    word_durations = word_slots * rng.uniform(0.6, 0.9, size=n_words)
+    pauses = np.zeros(n_words)
+    pauses[sentence_bounds[:-1]] = rng.uniform(0.3, 1.5, size=len(sentence_bounds) - 1)
+    slot_starts = np.cumsum(np.concatenate([[0.0], word_slots[:-1]])) + np.cumsum(
+        pauses
+    )
+    scale = duration / (slot_starts[-1] + word_slots[-1])
+    starts = np.round(slot_starts * scale, 3)
+    ends = np.round((slot_starts + word_durations) * scale, 3)
+
+    # Ground truth
+    reference: List[List[Tuple[str, float, float]]] = [
+        [
+            (vocab[word_ids[i]], float(starts[i]), float(ends[i]))
+            for i in range(sentence_start, sentence_end)
+        ]
+        for sentence_start, sentence_end in zip(
+            sentence_bounds[:-1], sentence_bounds[1:]
+        )
+    ]
+
+    # Hypothesis word stream with edits applied
+    # Draw all the randomness up front for speed
+    operation_draws = rng.random(n_words)
+    insertion_draws = rng.random(n_words)
+    near_miss_draws = rng.random(n_words)
+    replacement_ids = rng.choice(vocab_size, size=n_words, p=word_probabilities)
+    jitter = rng.normal(0, timestamp_jitter, size=(n_words, 2))
+    n_substitutions = n_near_misses = n_insertions = n_deletions = 0
+    hypothesis_stream: List[List[Tuple[str, float, float]]] = []
+    i = 0
+    for sentence in reference:
+        hypothesis_sentence = []
+        for word, start_time, end_time in sentence:
+            start_time = max(round(start_time + jitter[i, 0], 3), 0.0)
+            end_time = max(round(end_time + jitter[i, 1], 3), start_time)
+
+            if operation_draws[i] < deletion_rate:
+                n_deletions += 1
+            elif operation_draws[i] < deletion_rate + substitution_rate:
+                # Drawing the same word again falls back to a misspelling
+                replacement = vocab[replacement_ids[i]]
+                if near_miss_draws[i] < near_miss_fraction or replacement == word:
+                    word = _near_miss(rng, word)
+                    n_near_misses += 1
+                else:
+                    word = replacement
+                    n_substitutions += 1
+                hypothesis_sentence.append((word, start_time, end_time))
+            else:
+                hypothesis_sentence.append((word, start_time, end_time))
+
+            if insertion_draws[i] < insertion_rate:
+                hypothesis_sentence.append(
+                    (vocab[int(rng.integers(0, vocab_size))], end_time, end_time)
+                )
+                n_insertions += 1
+
+            i += 1
+
+        hypothesis_stream.append(hypothesis_sentence)
+
+    # Re-segment: merge with the next sentence or split in two
+    hypothesis: List[List[Tuple[str, float, float]]] = []
+    resegment_draws = rng.random(len(hypothesis_stream))
+    carry: List[Tuple[str, float, float]] = []
+    for sentence, draw in zip(hypothesis_stream, resegment_draws):
+        sentence = carry + sentence
+        carry = []
+        if len(sentence) == 0:
+            continue
+        if draw < resegment_rate / 2:
+            carry = sentence
+        elif draw < resegment_rate and len(sentence) > 1:
+            split = int(rng.integers(1, len(sentence)))
+            hypothesis.extend([sentence[:split], sentence[split:]])
+        else:
+            hypothesis.append(sentence)
+    if len(carry) > 0:
+        hypothesis.append(carry)
+
+    # Word times may have been jittered out of order, keep them monotonic
+    previous_end = 0.0
+    for sentence in hypothesis:
+        for i, (word, start_time, end_time) in enumerate(sentence):
+            start_time = max(start_time, previous_end)
+            end_time = max(end_time, start_time)
+            sentence[i] = (word, start_time, end_time)
+            previous_end = end_time
+
+    ground_truth_transcript = _build_transcript(
+        reference,
+        np.full(len(reference), 0.97),
+        GROUND_TRUTH_GENERATOR,
+        session_datetime,
+    )
+    hypothesis_transcript = _build_transcript(
+        hypothesis,
+        rng.uniform(0.6, 1.0, size=len(hypothesis)),
+        HYPOTHESIS_GENERATOR,
+        session_datetime,
+    )
+
+    # Optional audio matching the ground truth timings
+    if audio_path is not None:
+        audio_path = _write_audio(
+            Path(audio_path),
+            reference,
+            {word: i for i, word in enumerate(vocab)},
+            duration,
+            sample_rate,
+        )
+
+    return SyntheticTranscriptPair(
+        ground_truth=ground_truth_transcript,
+        hypothesis=hypothesis_transcript,
+        edits=EditCounts(
+            substitutions=n_substitutions,
+            near_miss_substitutions=n_near_misses,
+            insertions=n_insertions,
+            deletions=n_deletions,
+        ),
+        audio_path=audio_path,
+    )
+
+
+def write_transcript_pair(
+    pair: SyntheticTranscriptPair,
+    storage_dir: Union[str, Path],
+) -> Tuple[Path, Path]:
+    """
+    Store a synthetic pair using the same file names as the archived sessions.
+
+    Parameters
+    ----------
+    pair: SyntheticTranscriptPair
+        The pair to store.
+    storage_dir: Union[str, Path]
+        The directory to store the transcripts in.
+
+    Returns
+    -------
+    Tuple[Path, Path]
+        The paths to the ground truth and hypothesis transcripts.
+    """
+    storage_dir = Path(storage_dir)
+    storage_dir.mkdir(parents=True, exist_ok=True)
+    paths = (storage_dir / "ground-truth.json", storage_dir / "gsr.json")
+    for path, transcript in zip(paths, (pair.ground_truth, pair.hypothesis)):
+        with open(path, "w") as open_f:
+            json.dump(transcript, open_f)
+
+    return paths
+
+
+def transcript_text(transcript: Dict[str, Any]) -> str:
+    """
+    Get the newline separated sentence text of a CDP transcript dict.
+
+    Parameters
+    ----------
+    transcript: Dict[str, Any]
+        The transcript in the CDP transcript JSON structure.
+
+    Returns
+    -------
+    str
+        One line per sentence.
+    """
+    return "\n".join(sentence["text"] for sentence in transcript["sentences"])
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from whisper_experiments.align import align_hypotheses
+from whisper_experiments.diff import transcript_differences
+from whisper_experiments.synthetic import generate_transcript_pair
+
+###############################################################################
+
+
+def test_align_hypotheses() -> None:
+    alignment = align_hypotheses(
+        "the cat sat on the mat",
+        {
+            "a": "the cat sat on the mat",
+            "b": "the bat sat on mat",
+            "c": "the cat sat on the mat today",
+        },
+    )
+    assert alignment.names == ["a", "b", "c"]
+    assert [
+        (stats.substitutions, stats.deletions, stats.insertions)
+        for stats in alignment.stats
+    ] == [(0, 0, 0), (1, 1, 0), (0, 0, 1)]
+    assert alignment.stats[1].word_error_rate == 2 / 6
+
+    assert alignment.disagreement_positions().tolist() == [1, 4]
+    assert alignment.agreement_positions().tolist() == [0, 2, 3, 5]
+    assert alignment.all_wrong_positions().tolist() == []
+    assert alignment.column(1) == {"a": "cat", "b": "bat", "c": "cat"}
+    assert alignment.column(4) == {"a": "the", "b": None, "c": "the"}
+    assert alignment.insertions[2] == {6: [alignment.vocabulary.index("today")]}
+    assert alignment.consensus() == "the cat sat on the mat".split()
+
+
+def test_align_hypotheses_normalize() -> None:
+    alignment = align_hypotheses(["Hello", "World"], {"a": ["hello", "world"]})
+    assert alignment.stats[0].substitutions == 2
+    alignment = align_hypotheses(
+        ["Hello", "World"], {"a": ["hello", "world"]}, normalize=str.lower
+    )
+    assert alignment.stats[0].substitutions == 0
+
+
+def test_align_hypotheses_normalize_keeps_surface_forms() -> None:
+    alignment = align_hypotheses(
+        "The cat sat.",
+        {
+            "a": "the Cat sat",
+            "b": "THE cat, SAT. Today",
+            "c": "the cat sat. today!",
+        },
+        normalize=lambda word: word.lower().strip(".,!"),
+    )
+    assert [stats.substitutions for stats in alignment.stats] == [0, 0, 0]
+    assert alignment.vocabulary == ["the", "cat", "sat", "today"]
+    # The reference's form, then the first hypothesis form of inserted words
+    assert alignment.column(2) == {"a": "sat.", "b": "sat.", "c": "sat."}
+    assert alignment.consensus() == ["The", "cat", "sat.", "Today"]
+
+
+def test_align_hypotheses_matches_pairwise() -> None:
+    # Same seed, so every pair shares the same ground truth
+    pairs = [
+        generate_transcript_pair(duration=300, seed=4, substitution_rate=rate)
+        for rate in (0.02, 0.1)
+    ]
+    ground_truth = pairs[0].ground_truth
+    alignment = align_hypotheses(
+        ground_truth,
+        {str(i): pair.hypothesis for i, pair in enumerate(pairs)},
+    )
+    for stats, pair in zip(alignment.stats, pairs):
+        comparison = transcript_differences(ground_truth, pair.hypothesis)
+        assert (stats.substitutions, stats.deletions, stats.insertions) == (
+            comparison.substitutions,
+            comparison.deletions,
+            comparison.insertions,
+        )
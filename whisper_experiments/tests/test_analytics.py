@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+import pytest
+
+from whisper_experiments.align import align_hypotheses
+from whisper_experiments.analytics import (
+    ALL_BREAKDOWNS,
+    AlignmentFields,
+    Breakdowns,
+    ErrorRateFields,
+    Operations,
+    dataset_alignment_frame,
+    error_breakdowns,
+    error_rates,
+    word_alignment_frame,
+)
+from whisper_experiments.compare import Normalizations, normalize_text
+from whisper_experiments.data import FullDatasetFields
+from whisper_experiments.synthetic import (
+    generate_transcript_pair,
+    write_transcript_pair,
+)
+
+###############################################################################
+
+
+def _transcript(
+    sentences: List[str], confidences: Optional[List[float]] = None
+) -> Dict[str, Any]:
+    # One second per word, sentences back to back
+    transcript_sentences = []
+    time = 0.0
+    for sentence_index, sentence in enumerate(sentences):
+        words = []
+        for word_index, text in enumerate(sentence.split()):
+            words.append(
+                {
+                    "index": word_index,
+                    "start_time": time,
+                    "end_time": time + 1.0,
+                    "text": text,
+                }
+            )
+            time += 1.0
+        transcript_sentences.append(
+            {
+                "index": sentence_index,
+                "confidence": None
+                if confidences is None
+                else confidences[sentence_index],
+                "start_time": words[0]["start_time"],
+                "end_time": words[-1]["end_time"],
+                "text": sentence,
+                "speaker_index": 0,
+                "words": words,
+            }
+        )
+
+    return {"sentences": transcript_sentences}
+
+
+###############################################################################
+
+
+def test_word_alignment_frame() -> None:
+    frame = word_alignment_frame(
+        _transcript(["a b c", "d e g"]),
+        _transcript(["a x c e g", "f"], confidences=[0.9, 0.5]),
+    )
+    assert frame[AlignmentFields.operation].tolist() == [
+        Operations.correct,
+        Operations.substitution,
+        Operations.correct,
+        Operations.deletion,
+        Operations.correct,
+        Operations.correct,
+        Operations.insertion,
+    ]
+    assert frame[AlignmentFields.reference_index].tolist() == [0, 1, 2, 3, 4, 5, -1]
+    assert frame[AlignmentFields.hypothesis_index].tolist() == [0, 1, 2, -1, 3, 4, 5]
+    assert frame[AlignmentFields.word].tolist() == ["a", "b", "c", "d", "e", "g", "f"]
+    # The deleted "d" takes the confidence of the next hypothesis word "e"
+    assert frame[AlignmentFields.confidence].tolist() == [0.9] * 6 + [0.5]
+    assert frame[AlignmentFields.sentence_length].tolist() == [3] * 7
+    assert frame[AlignmentFields.time].tolist() == [0, 1, 2, 3, 4, 5, 5]
+
+
+def test_word_alignment_frame_drops_empty_normalized_words() -> None:
+    frame = word_alignment_frame(
+        _transcript(["A, b -- c"]),
+        _transcript(["-- a b", "C ?"], confidences=[0.9, 0.5]),
+        normalize=partial(normalize_text, normalization=Normalizations.basic),
+    )
+    # The punctuation only words are neither deletions nor insertions
+    assert frame[AlignmentFields.operation].tolist() == [Operations.correct] * 3
+    assert frame[AlignmentFields.word].tolist() == ["a", "b", "c"]
+    # Indices and joined columns still refer to the full transcripts
+    assert frame[AlignmentFields.reference_index].tolist() == [0, 1, 3]
+    assert frame[AlignmentFields.hypothesis_index].tolist() == [1, 2, 3]
+    assert frame[AlignmentFields.time].tolist() == [0, 1, 3]
+    assert frame[AlignmentFields.confidence].tolist() == [0.9, 0.9, 0.5]
+
+
+def test_word_alignment_frame_matches_align_hypotheses() -> None:
+    pair = generate_transcript_pair(duration=300, seed=4)
+    frame = word_alignment_frame(pair.ground_truth, pair.hypothesis)
+    stats = align_hypotheses(pair.ground_truth, {"h": pair.hypothesis}).stats[0]
+    rates = error_rates(frame, lambda _: "all")
+    assert rates[ErrorRateFields.substitutions].iloc[0] == stats.substitutions
+    assert rates[ErrorRateFields.deletions].iloc[0] == stats.deletions
+    assert rates[ErrorRateFields.insertions].iloc[0] == stats.insertions
+    assert rates[ErrorRateFields.word_error_rate].iloc[0] == pytest.approx(
+        stats.word_error_rate
+    )
+
+
+def test_dataset_error_breakdowns(tmp_path: Path) -> None:
+    rows = []
+    for seed in range(2):
+        ground_truth_path, gsr_path = write_transcript_pair(
+            generate_transcript_pair(duration=180, seed=seed),
+            tmp_path / f"session-{seed}",
+        )
+        rows.append(
+            {
+                FullDatasetFields.id_: f"session-{seed}",
+                FullDatasetFields.ground_truth_transcript_path: str(ground_truth_path),
+                FullDatasetFields.gsr_transcript_path: str(gsr_path),
+            }
+        )
+
+    frame = dataset_alignment_frame(pd.DataFrame(rows), normalization="basic")
+    assert set(frame[AlignmentFields.id_]) == {"session-0", "session-1"}
+    assert set(frame[AlignmentFields.source]) == {"gsr"}
+
+    breakdowns = error_breakdowns(frame)
+    assert list(breakdowns) == ALL_BREAKDOWNS
+    n_reference_words = (frame[AlignmentFields.operation] != Operations.insertion).sum()
+    for breakdown in [
+        Breakdowns.confidence_decile,
+        Breakdowns.minute,
+        Breakdowns.sentence_length,
+    ]:
+        rates = breakdowns[breakdown]
+        assert rates[ErrorRateFields.n_reference_words].sum() == n_reference_words
+    assert len(breakdowns[Breakdowns.confidence_decile]) == 10
+    assert breakdowns[Breakdowns.minute].index.get_level_values(1).tolist() == [0, 1, 2]
+
+    with pytest.raises(ValueError):
+        dataset_alignment_frame(pd.DataFrame(rows), sources=["whisper"])
@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import zipfile
+from pathlib import Path
+
+import pandas as pd
+
+from whisper_experiments import data
+from whisper_experiments.archive import write_zip_archive
+from whisper_experiments.data import FullDatasetFields
+from whisper_experiments.serialization import TranscriptFormats, write_transcript
+
+###############################################################################
+
+
+def test_write_zip_archive(tmp_path: Path) -> None:
+    source = tmp_path / "source.txt"
+    source.write_text("hello world " * 1000)
+    archive_path = write_zip_archive(
+        [
+            ("a/source.txt", source),
+            ("b/inline.txt", b"inline data"),
+            ("c/already.json.gz", b"\x1f\x8bnot really gzip"),
+            ("d/empty.txt", b""),
+        ],
+        tmp_path / "archive.zip",
+    )
+
+    with zipfile.ZipFile(archive_path) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == [
+            "a/source.txt",
+            "b/inline.txt",
+            "c/already.json.gz",
+            "d/empty.txt",
+        ]
+        assert archive.read("a/source.txt") == source.read_bytes()
+        assert archive.read("b/inline.txt") == b"inline data"
+        assert archive.read("d/empty.txt") == b""
+
+        infos = {info.filename: info for info in archive.infolist()}
+        assert infos["a/source.txt"].compress_type == zipfile.ZIP_DEFLATED
+        assert infos["a/source.txt"].compress_size < infos["a/source.txt"].file_size
+        assert infos["c/already.json.gz"].compress_type == zipfile.ZIP_STORED
+
+    # No temp files left behind
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "archive.zip",
+        "source.txt",
+    ]
+
+
+def test_archive_dataset(tmp_path: Path) -> None:
+    rows = []
+    for i in range(10):
+        session_id = f"session{i:03d}"
+        ground_truth_path = tmp_path / f"{session_id}-gt.json"
+        ground_truth_path.write_text(json.dumps({"session": i}))
+        gsr_path = write_transcript(
+            {"session": i},
+            tmp_path / f"{session_id}-gsr.json.gz",
+            transcript_format=TranscriptFormats.gzip,
+        )
+        rows.append(
+            {
+                FullDatasetFields.id_: session_id,
+                FullDatasetFields.ground_truth_transcript_path: str(ground_truth_path),
+                FullDatasetFields.gsr_transcript_path: gsr_path,
+            }
+        )
+    sessions = pd.DataFrame(rows)
+
+    archive_path = data._archive_dataset(sessions, archive_name=tmp_path / "archive")
+    assert archive_path == tmp_path / "archive.zip"
+
+    # Input isn't modified
+    assert (
+        sessions[FullDatasetFields.gsr_transcript_path][0]
+        == rows[0][FullDatasetFields.gsr_transcript_path]
+    )
+
+    unpacked_dir = tmp_path / "unpacked"
+    with zipfile.ZipFile(archive_path) as archive:
+        archive.extractall(unpacked_dir)
+
+    archived = pd.read_parquet(unpacked_dir / "data.parquet")
+    assert list(archived[FullDatasetFields.gsr_transcript_path])[:2] == [
+        "session000/gsr.json.gz",
+        "session001/gsr.json.gz",
+    ]
+    for _, row in archived.iterrows():
+        for path_col in (
+            FullDatasetFields.ground_truth_transcript_path,
+            FullDatasetFields.gsr_transcript_path,
+        ):
+            assert (unpacked_dir / row[path_col]).exists()
+
+
+def test_resolve_transcript_paths(tmp_path: Path) -> None:
+    sessions = pd.DataFrame(
+        {
+            FullDatasetFields.id_: ["a", "b"],
+            FullDatasetFields.session_datetime: pd.to_datetime(
+                ["2020-08-01", "2020-08-02"], utc=True
+            ),
+            FullDatasetFields.ground_truth_transcript_path: [
+                "a/ground-truth.json",
+                "b/ground-truth.json",
+            ],
+            FullDatasetFields.gsr_transcript_path: ["a/gsr.json.gz", "b/gsr.json.gz"],
+        }
+    )
+    dtypes = sessions.dtypes
+
+    resolved = data._resolve_transcript_paths(sessions, tmp_path / "unpacked")
+    pd.testing.assert_series_equal(resolved.dtypes, dtypes)
+    assert resolved[FullDatasetFields.gsr_transcript_path][1] == (
+        (tmp_path / "unpacked" / "b" / "gsr.json.gz").resolve()
+    )
+    assert isinstance(resolved[FullDatasetFields.ground_truth_transcript_path][0], Path)
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import time
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+import pytest
+
+from whisper_experiments.batching import (
+    AudioWindow,
+    DynamicBatcher,
+    _timestamped_segments,
+    cached_batch_decoder,
+    split_windows,
+    transcribe_sessions,
+)
+from whisper_experiments.cache import DiskCache
+
+###############################################################################
+
+
+class _RecordingDecoder:
+    # Each window decodes to one segment holding its first sample
+    def __init__(self) -> None:
+        self.batch_sizes: List[int] = []
+
+    def __call__(
+        self, windows: List[np.ndarray]
+    ) -> List[List[Tuple[float, float, str]]]:
+        self.batch_sizes.append(len(windows))
+        return [[(0.5, 1.0, f"{samples[0]:g}")] for samples in windows]
+
+
+def _session_audio(session_number: int, n_seconds: int) -> np.ndarray:
+    # Every second of audio holds "{session}.{second}" as its value
+    return np.repeat(session_number + np.arange(n_seconds, dtype=np.float64) / 1000, 10)
+
+
+###############################################################################
+
+
+def test_split_windows() -> None:
+    windows = list(split_windows("a", np.arange(25), sample_rate=10, window_seconds=1))
+    assert [window.window_index for window in windows] == [0, 1, 2]
+    assert [window.start_time for window in windows] == [0.0, 1.0, 2.0]
+    assert windows[-1].end_time == 2.5
+    assert windows[-1].samples.tolist() == [20, 21, 22, 23, 24]
+
+
+def test_transcribe_sessions_routes_results() -> None:
+    decoder = _RecordingDecoder()
+    sessions_audio = {
+        "a": _session_audio(1, 7),
+        "b": _session_audio(2, 3),
+        "c": _session_audio(3, 12),
+    }
+    segments = transcribe_sessions(
+        sessions_audio,
+        decoder,
+        sample_rate=10,
+        window_seconds=2,
+        max_batch_size=4,
+        max_wait_seconds=1.0,
+    )
+
+    # 4 + 2 + 6 windows, batches mix sessions and never exceed the maximum
+    assert sum(decoder.batch_sizes) == 12
+    assert max(decoder.batch_sizes) == 4
+    assert len(decoder.batch_sizes) == 3
+
+    for session_number, session_id in enumerate(["a", "b", "c"], start=1):
+        session_segments = segments[session_id]
+        n_windows = len(session_segments)
+        assert [segment.start_time for segment in session_segments] == [
+            window * 2 + 0.5 for window in range(n_windows)
+        ]
+        assert [segment.text for segment in session_segments] == [
+            f"{session_number + window * 2 / 1000:g}" for window in range(n_windows)
+        ]
+
+    # Segment ends are clipped to the shorter last window
+    assert segments["b"][-1].end_time == 3.0
+
+
+def test_dynamic_batcher_max_wait() -> None:
+    decoder = _RecordingDecoder()
+    with DynamicBatcher(decoder, max_batch_size=8, max_wait_seconds=0.05) as batcher:
+        start = time.monotonic()
+        future = batcher.submit(AudioWindow("a", 0, 10.0, 40.0, np.ones(3)))
+        result = future.result(timeout=5)
+        assert time.monotonic() - start < 2
+
+    assert result.batch_size == 1
+    assert result.segments[0].start_time == 10.5
+    assert decoder.batch_sizes == [1]
+
+
+def test_dynamic_batcher_errors() -> None:
+    def failing_decoder(
+        windows: List[np.ndarray],
+    ) -> List[List[Tuple[float, float, str]]]:
+        raise RuntimeError("out of memory")
+
+    with DynamicBatcher(failing_decoder, max_wait_seconds=0) as batcher:
+        future = batcher.submit(AudioWindow("a", 0, 0.0, 1.0, np.ones(3)))
+        with pytest.raises(RuntimeError, match="out of memory"):
+            future.result(timeout=5)
+
+    with pytest.raises(RuntimeError):
+        batcher.submit(AudioWindow("a", 1, 1.0, 2.0, np.ones(3)))
+    with pytest.raises(ValueError):
+        DynamicBatcher(failing_decoder, max_batch_size=0)
+
+
+def test_timestamped_segments() -> None:
+    # Tokens >= 100 are timestamps in steps of 0.02 seconds
+    tokens = [100, 1, 2, 150, 150, 3, 200, 4]
+    segments = _timestamped_segments(
+        tokens,
+        timestamp_begin=100,
+        decode_tokens=lambda text_tokens: " ".join(map(str, text_tokens)),
+        duration=30.0,
+    )
+    assert segments == [(0.0, 1.0, "1 2"), (1.0, 2.0, "3"), (2.0, 30.0, "4")]
+
+
+def test_cached_batch_decoder(tmp_path: Path) -> None:
+    sessions_audio = {"a": _session_audio(1, 8), "b": _session_audio(2, 4)}
+    decoder = _RecordingDecoder()
+    cache = DiskCache(tmp_path)
+    cached_decoder = cached_batch_decoder(decoder, cache)
+    cold = transcribe_sessions(sessions_audio, cached_decoder, 10, 2, 4, 1.0)
+    assert sum(decoder.batch_sizes) == 6
+
+    # A warm rerun is read from disk and never reaches the decoder
+    decoder.batch_sizes.clear()
+    warm = transcribe_sessions(sessions_audio, cached_decoder, 10, 2, 4, 1.0)
+    assert warm == cold
+    assert decoder.batch_sizes == []
+
+    # Only new windows are decoded, and identical windows only once
+    new_window = np.full(20, 9.0)
+    segments = cached_decoder([sessions_audio["a"][:20], new_window, new_window])
+    assert decoder.batch_sizes == [1]
+    assert segments[1] == segments[2] == [(0.5, 1.0, "9")]
+
+    # Another decoder configuration does not reuse the stored segments
+    setattr(decoder, "cache_identity", "recording-decoder:language=fr")
+    cached_batch_decoder(decoder, cache)([new_window])
+    assert decoder.batch_sizes == [1, 1]
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+from typing import Any
+
+import pytest
+
+from whisper_experiments import benchmarks
+from whisper_experiments.benchmarks import (
+    BenchmarkResult,
+    append_history,
+    find_regressions,
+    load_history,
+    measure,
+    run_benchmarks,
+    save_baseline,
+)
+from whisper_experiments.serialization import (
+    TranscriptFormats,
+    read_transcript,
+    write_transcript,
+)
+from whisper_experiments.synthetic import generate_transcript_pair
+
+###############################################################################
+
+
+def _result(seconds: float, peak_memory_bytes: int) -> BenchmarkResult:
+    return BenchmarkResult(
+        name="text_differences",
+        case="synthetic-100",
+        seconds=seconds,
+        mean_seconds=seconds,
+        peak_memory_bytes=peak_memory_bytes,
+        repeats=1,
+    )
+
+
+def test_measure() -> None:
+    result = measure("alloc", "small", lambda: [0] * 100_000, repeats=2)
+    assert result.key == "alloc/small"
+    assert result.repeats == 2
+    assert 0 < result.seconds <= result.mean_seconds
+    assert result.peak_memory_bytes >= 100_000 * 8
+
+
+def test_run_benchmarks_synthetic_only() -> None:
+    results = run_benchmarks(repeats=1, synthetic_minutes=(1,), include_sessions=False)
+    assert [result.key for result in results] == [
+        "text_differences/synthetic-1min",
+        "text_differences_token/synthetic-1min",
+        "word_differences/synthetic-1min",
+        "fuzzy_word_differences/synthetic-1min",
+        "transcript_differences/synthetic-1min",
+        "align_hypotheses/synthetic-1min-3-hypotheses",
+        "resolve_transcript_paths/synthetic-10000-sessions",
+    ]
+
+    filtered = run_benchmarks(
+        repeats=1,
+        synthetic_minutes=(1,),
+        include_sessions=False,
+        name_filter="word_",
+    )
+    assert [result.key for result in filtered] == [
+        "word_differences/synthetic-1min",
+        "fuzzy_word_differences/synthetic-1min",
+    ]
+
+
+def test_run_benchmarks_filter_skips_setup(monkeypatch: pytest.MonkeyPatch) -> None:
+    calls = []
+
+    def generate_transcript_pair(**kwargs: Any) -> Any:
+        calls.append(kwargs)
+        raise AssertionError("Filtered out case built its inputs")
+
+    monkeypatch.setattr(
+        benchmarks, "generate_transcript_pair", generate_transcript_pair
+    )
+    results = run_benchmarks(
+        repeats=1,
+        synthetic_minutes=(1,),
+        include_sessions=False,
+        name_filter="resolve_transcript_paths",
+    )
+    assert [result.name for result in results] == ["resolve_transcript_paths"]
+    assert calls == []
+
+
+def test_history_and_regressions(tmp_path: Path) -> None:
+    history_path = tmp_path / "history.jsonl"
+    append_history([_result(1.0, 1000)], history_path)
+    append_history([_result(2.0, 1000)], history_path)
+    history = load_history(history_path)
+    assert len(history) == 2
+    assert history[1]["results"][0]["seconds"] == 2.0
+
+    baseline_path = save_baseline([_result(1.0, 1000)], tmp_path / "baseline.json")
+    assert find_regressions([_result(1.1, 1050)], baseline_path) == []
+
+    regressions = find_regressions([_result(2.0, 2000)], baseline_path)
+    assert [regression.metric for regression in regressions] == [
+        "seconds",
+        "peak_memory_bytes",
+    ]
+    assert str(regressions[0]).endswith("(+100.0%)")
+
+
+def test_parse_transcript_compressed(tmp_path: Path) -> None:
+    transcript = generate_transcript_pair(duration=60).ground_truth
+    path = write_transcript(
+        transcript, tmp_path / "gsr.json.gz", TranscriptFormats.gzip
+    )
+    assert benchmarks._parse_transcript(path) == read_transcript(path)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import sqlite3
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Tuple
+
+import rapidfuzz
+
+from whisper_experiments.cache import (
+    DiskCache,
+    audio_key,
+    callable_identity,
+    comparison_key,
+)
+from whisper_experiments.diff import text_differences
+
+###############################################################################
+
+
+def test_disk_cache_get_set_stats(tmp_path: Path) -> None:
+    cache = DiskCache(tmp_path)
+    assert cache.get("a") is None
+    cache.set("a", b"hello")
+    assert cache.get("a") == b"hello"
+    assert "a" in cache
+
+    stats = cache.stats
+    assert stats.hits == 1
+    assert stats.misses == 1
+    assert stats.n_entries == 1
+    assert stats.size_bytes == 5
+    assert stats.hit_rate == 0.5
+
+    # Replacing a value replaces its size
+    cache.set("a", b"hi")
+    assert cache.stats.size_bytes == 2
+
+    cache.clear()
+    assert cache.stats.n_entries == 0
+    assert cache.stats.hits == 0
+
+
+def test_disk_cache_lru_eviction(tmp_path: Path) -> None:
+    cache = DiskCache(tmp_path, max_size_bytes=30)
+    cache.set("a", b"0" * 10)
+    cache.set("b", b"1" * 10)
+    cache.set("c", b"2" * 10)
+
+    # Touch "a" so that "b" is the least recently used
+    assert cache.get("a") is not None
+    cache.set("d", b"3" * 10)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert "d" in cache
+    assert cache.stats.evictions == 1
+    assert cache.stats.size_bytes == 30
+
+    # Values larger than the cap are never stored
+    cache.set("e", b"4" * 31)
+    assert "e" not in cache
+
+
+def _write_and_read(args: Tuple[str, int]) -> int:
+    cache_dir, worker = args
+    cache = DiskCache(cache_dir)
+    n_found = 0
+    for i in range(25):
+        cache.set(f"{worker}-{i}", str(i).encode("utf-8"))
+        if cache.get(f"{(worker + 1) % 4}-{i}") is not None:
+            n_found += 1
+    cache.close()
+    return n_found
+
+
+def test_disk_cache_multiprocess(tmp_path: Path) -> None:
+    with Pool(4) as pool:
+        pool.map(_write_and_read, [(str(tmp_path), worker) for worker in range(4)])
+
+    cache = DiskCache(tmp_path)
+    stats = cache.stats
+    assert stats.n_entries == 100
+    assert stats.hits + stats.misses == 100
+    assert cache.get("3-24") == b"24"
+
+
+def test_comparison_key() -> None:
+    assert comparison_key("ab", "c") != comparison_key("a", "bc")
+    assert comparison_key("a", "b", engine="line") != comparison_key(
+        "a", "b", engine="token"
+    )
+    assert comparison_key("a", "b", x=1, y=2) == comparison_key("a", "b", y=2, x=1)
+    assert callable_identity(str.split).startswith("builtins.str.split==")
+    assert callable_identity(str.split) != callable_identity(str.splitlines)
+
+
+def test_audio_key() -> None:
+    assert audio_key(b"ab", model="tiny") == audio_key(b"ab", model="tiny")
+    assert audio_key(b"ab", model="tiny") != audio_key(b"ab", model="base")
+    assert audio_key(b"ab") != audio_key(b"ab", stage="encoder")
+    assert audio_key(b"ab") != comparison_key("ab", "")
+
+
+def test_text_differences_cached(tmp_path: Path) -> None:
+    cache = DiskCache(tmp_path)
+    text_1 = "hello world\nhow are you"
+    text_2 = "hello world\nhow are yoou"
+
+    cold = text_differences(text_1, text_2, cache=cache)
+    warm = text_differences(text_1, text_2, cache=cache)
+    assert cold == warm
+    assert cache.stats.hits == 1
+    assert cache.stats.misses == 1
+
+    # Different settings are different entries
+    text_differences(text_1, text_2, similarity_calc=rapidfuzz.fuzz.ratio, cache=cache)
+    assert cache.stats.misses == 2
+
+
+def test_disk_cache_get_does_not_write(tmp_path: Path) -> None:
+    cache = DiskCache(tmp_path, timeout=0.1, access_batch_size=3)
+    cache.set("a", b"hello")
+
+    # Another connection holds the write lock, lookups still go through
+    writer = sqlite3.connect(tmp_path / "cache.sqlite", isolation_level=None)
+    writer.execute("BEGIN IMMEDIATE")
+    assert cache.get("a") == b"hello"
+    assert cache.get("b") is None
+    writer.execute("ROLLBACK")
+    writer.close()
+
+    # The batch is written once full
+    assert cache.get("a") == b"hello"
+    reader = DiskCache(tmp_path)
+    assert (reader.stats.hits, reader.stats.misses) == (2, 1)
+
+
+def test_disk_cache_eviction_recovers_size_drift(tmp_path: Path) -> None:
+    cache = DiskCache(tmp_path, max_size_bytes=30)
+    cache.set("a", b"0" * 10)
+    cache._conn.execute("UPDATE stats SET value = 1000 WHERE name = 'size_bytes'")
+
+    cache.set("a", b"1" * 10)
+    assert cache.get("a") == b"1" * 10
+    assert cache.stats.size_bytes == 10
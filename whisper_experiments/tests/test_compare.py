@@ -0,0 +1,204 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+from pathlib import Path
+from typing import Any
+
+import pandas as pd
+import pytest
+
+from whisper_experiments import compare
+from whisper_experiments.compare import (
+    ALL_METRICS_FIELDS,
+    CompareTask,
+    MetricsFields,
+    Normalizations,
+    compare_session,
+    compare_sessions,
+    normalize_text,
+    transcript_sources,
+)
+from whisper_experiments.data import FullDatasetFields
+from whisper_experiments.diff import ALL_DIFF_ENGINES
+from whisper_experiments.synthetic import (
+    generate_transcript_pair,
+    write_transcript_pair,
+)
+
+###############################################################################
+
+
+@pytest.fixture
+def sessions(tmp_path: Path) -> pd.DataFrame:
+    rows = []
+    for seed in range(3):
+        ground_truth_path, gsr_path = write_transcript_pair(
+            generate_transcript_pair(duration=60, seed=seed),
+            tmp_path / f"session-{seed}",
+        )
+        rows.append(
+            {
+                FullDatasetFields.id_: f"session-{seed}",
+                FullDatasetFields.ground_truth_transcript_path: str(ground_truth_path),
+                FullDatasetFields.gsr_transcript_path: str(gsr_path),
+            }
+        )
+    return pd.DataFrame(rows)
+
+
+###############################################################################
+
+
+@pytest.mark.parametrize(
+    "text, normalization, expected",
+    [
+        ("Hello, World!\nIt's  me.", Normalizations.none, "Hello, World!\nIt's  me."),
+        ("Hello, World!\nIt's  me.", Normalizations.lower, "hello, world!\nit's  me."),
+        ("Hello, World!\nIt's  me.", Normalizations.basic, "hello world\nit's me"),
+    ],
+)
+def test_normalize_text(text: str, normalization: str, expected: str) -> None:
+    assert normalize_text(text, normalization) == expected
+
+
+def test_transcript_sources() -> None:
+    assert transcript_sources(
+        [
+            FullDatasetFields.id_,
+            FullDatasetFields.ground_truth_transcript_path,
+            FullDatasetFields.gsr_transcript_path,
+            "whisper_base_transcript_path",
+        ]
+    ) == {
+        "gsr": FullDatasetFields.gsr_transcript_path,
+        "whisper_base": "whisper_base_transcript_path",
+    }
+
+
+@pytest.mark.parametrize("metrics_name", ["metrics.parquet", "metrics.csv"])
+def test_compare_sessions(
+    sessions: pd.DataFrame, tmp_path: Path, metrics_name: str
+) -> None:
+    metrics_path = tmp_path / "out" / metrics_name
+    diffs_path = tmp_path / "out" / "diffs.jsonl"
+    metrics = compare_sessions(
+        sessions,
+        metrics_path=metrics_path,
+        diffs_path=diffs_path,
+        max_workers=1,
+    )
+    assert len(metrics) == 3
+    assert set(metrics[MetricsFields.source]) == {"gsr"}
+    assert (metrics[MetricsFields.word_error_rate] > 0).all()
+
+    if metrics_path.suffix == ".csv":
+        stored = pd.read_csv(metrics_path)
+    else:
+        stored = pd.read_parquet(metrics_path)
+    assert sorted(stored[MetricsFields.id_]) == sorted(metrics[MetricsFields.id_])
+
+    with open(diffs_path, "r") as open_f:
+        diff_lines = [json.loads(line) for line in open_f]
+    assert sum(metrics[MetricsFields.n_diff_lines]) == len(diff_lines)
+    assert {line["kind"] for line in diff_lines} <= {"modified", "removed", "added"}
+
+
+def test_compare_sessions_filters(sessions: pd.DataFrame, tmp_path: Path) -> None:
+    metrics = compare_sessions(
+        sessions,
+        metrics_path=tmp_path / "metrics.parquet",
+        diffs_path=None,
+        session_ids=["session-1"],
+        sources=["gsr"],
+        normalization=Normalizations.basic,
+        engine="line",
+        max_workers=1,
+    )
+    assert list(metrics[MetricsFields.id_]) == ["session-1"]
+    assert list(metrics[MetricsFields.engine]) == ["line"]
+
+    with pytest.raises(ValueError):
+        compare_sessions(
+            sessions, metrics_path=tmp_path / "metrics.parquet", sources=["whisper"]
+        )
+
+
+def test_compare_sessions_missing_transcripts(
+    sessions: pd.DataFrame, tmp_path: Path
+) -> None:
+    sessions.loc[1, FullDatasetFields.gsr_transcript_path] = None
+    sessions.loc[2, FullDatasetFields.gsr_transcript_path] = str(tmp_path / "gone")
+    metrics = compare_sessions(
+        sessions,
+        metrics_path=tmp_path / "metrics.parquet",
+        diffs_path=None,
+        max_workers=1,
+    ).set_index(MetricsFields.id_)
+    assert metrics.loc["session-0", MetricsFields.error] is None
+    assert metrics.loc["session-1", MetricsFields.error] == "No gsr transcript"
+    assert "FileNotFoundError" in metrics.loc["session-2", MetricsFields.error]
+    assert metrics[MetricsFields.word_error_rate].isna().tolist() == [
+        False,
+        True,
+        True,
+    ]
+    stored = pd.read_parquet(tmp_path / "metrics.parquet")
+    assert stored[MetricsFields.error].notna().sum() == 2
+
+
+def test_compare_sessions_no_rows(sessions: pd.DataFrame, tmp_path: Path) -> None:
+    metrics = compare_sessions(
+        sessions,
+        metrics_path=tmp_path / "metrics.parquet",
+        diffs_path=None,
+        session_ids=[],
+        max_workers=1,
+    )
+    assert len(metrics) == 0
+    stored = pd.read_parquet(tmp_path / "metrics.parquet")
+    assert len(stored) == 0
+    assert list(stored.columns) == ALL_METRICS_FIELDS
+
+
+def test_token_engine_error_counts_match_alignment(sessions: pd.DataFrame) -> None:
+    # The token engine's counts come from its own word alignment
+    task = CompareTask(
+        session_id="session-0",
+        source="gsr",
+        reference_path=sessions[FullDatasetFields.ground_truth_transcript_path][0],
+        hypothesis_path=sessions[FullDatasetFields.gsr_transcript_path][0],
+        engine="token",
+        normalization=Normalizations.none,
+        include_diffs=False,
+    )
+    token_metrics = compare_session(task).metrics
+    line_metrics = compare_session(task._replace(engine="line")).metrics
+    assert token_metrics[MetricsFields.word_error_rate] > 0
+    assert token_metrics[MetricsFields.word_error_rate] == pytest.approx(
+        line_metrics[MetricsFields.word_error_rate]
+    )
+
+
+@pytest.mark.parametrize("engine", ALL_DIFF_ENGINES)
+def test_compare_session_comparison_error(
+    sessions: pd.DataFrame, monkeypatch: pytest.MonkeyPatch, engine: str
+) -> None:
+    def _raise(*args: Any, **kwargs: Any) -> Any:
+        raise RuntimeError("scorer failed")
+
+    monkeypatch.setattr(compare, "text_differences", _raise)
+    task = CompareTask(
+        session_id="session-0",
+        source="gsr",
+        reference_path=sessions[FullDatasetFields.ground_truth_transcript_path][0],
+        hypothesis_path=sessions[FullDatasetFields.gsr_transcript_path][0],
+        engine=engine,
+        normalization=Normalizations.none,
+        include_diffs=True,
+    )
+    result = compare_session(task)
+    assert result.diff_lines == []
+    assert result.metrics[MetricsFields.id_] == "session-0"
+    assert result.metrics[MetricsFields.error] == "RuntimeError('scorer failed')"
+    assert result.metrics[MetricsFields.word_error_rate] is None
@@ -14,6 +14,8 @@ from whisper_experiments.diff import (
     RemovedWord,
     TextDiff,
     line_differences,
+    text_differences,
+    token_line_differences,
     word_differences,
 )
 
@@ -218,3 +220,60 @@ def test_line_differences(text_1: str, text_2: str, diff_lines: List[LC]) -> Non
     lines_1 = text_1.splitlines()
     lines_2 = text_2.splitlines()
     assert list(line_differences(lines_1, lines_2)) == diff_lines
+
+
+def _mw(content_before: str, content_after: str) -> ModifiedLine:
+    # Masks aren't compared by TextDiff
+    return MW(
+        content_before=content_before,
+        mask_before=Mask(list()),
+        content_after=content_after,
+        mask_after=Mask(list()),
+    )
+
+
+# Test token_line_differences() i.e.
+# 1. compare all words of the two text blobs at once
+# 2. then report the different words on the left line they fall in
+@pytest.mark.parametrize(
+    "text_1, text_2, diff_lines",
+    [
+        ("", "", []),
+        ("a b\nc", "a b\nc", []),
+        # Only the line breaks moved
+        ("a b c\nd e", "a b\nc d e", []),
+        ("a b\nc", "a b", [LC(T(RL("c")), [T(RW("c"))])]),
+        ("a b", "a b\nc", [LC(T(AL("c")), [T(AW("c"))])]),
+        (
+            "a b c\nd e",
+            "a b\nc d x",
+            [LC(T(_mw("d e", "d x")), [T(_mw("e", "x"))])],
+        ),
+        (
+            "a b\nd e",
+            "x a b\nd e f",
+            [
+                LC(T(_mw("a b", "x a b")), [T(AW("x"))]),
+                LC(T(_mw("d e", "d e f")), [T(AW("f"))]),
+            ],
+        ),
+        (
+            "a b\nc d",
+            "a b\nnew line\nc d",
+            [LC(T(AL("new line")), [T(AW("new")), T(AW("line"))])],
+        ),
+    ],
+)
+def test_token_line_differences(text_1: str, text_2: str, diff_lines: List[LC]) -> None:
+    lines_1 = text_1.splitlines()
+    lines_2 = text_2.splitlines()
+    assert list(token_line_differences(lines_1, lines_2)) == diff_lines
+
+
+def test_text_differences_engine() -> None:
+    text_1 = "a b c\nd e"
+    text_2 = "a b\nc d e"
+    assert len(text_differences(text_1, text_2, engine="line").lines) > 0
+    assert text_differences(text_1, text_2, engine="token").lines == []
+    with pytest.raises(ValueError):
+        text_differences(text_1, text_2, engine="unknown")
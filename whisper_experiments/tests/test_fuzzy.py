@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+from typing import List
+
+import pytest
+from rapidfuzz.distance import Levenshtein
+
+from whisper_experiments.diff import DiffKinds, text_differences
+from whisper_experiments.fuzzy import (
+    PairScoreCache,
+    SubstitutionKinds,
+    fuzzy_line_differences,
+    fuzzy_word_differences,
+)
+
+###############################################################################
+
+
+def test_fuzzy_word_differences_classifies_substitutions() -> None:
+    comparison = fuzzy_word_differences(
+        "how you doin the cat sat".split(), "how yoou doin a dog sat".split()
+    )
+    assert [
+        (pair.text_1, pair.text_2, pair.substitution_kind) for pair in comparison.pairs
+    ] == [
+        ("you", "yoou", SubstitutionKinds.near_miss),
+        ("the", "a", SubstitutionKinds.real),
+        ("cat", "dog", SubstitutionKinds.real),
+    ]
+    assert comparison.near_misses == 1
+    assert comparison.real_substitutions == 2
+    assert comparison.word_error_rate == pytest.approx(3 / 6)
+    assert comparison.real_word_error_rate == pytest.approx(2 / 6)
+
+
+def test_fuzzy_word_differences_pairs_out_of_position() -> None:
+    # Exact alignment pairs "council" with "the", fuzzy pairing moves it to
+    # "councel" and reports "the" as added instead
+    comparison = fuzzy_word_differences(
+        "thank you council member".split(), "thank you the councel member".split()
+    )
+    assert [(pair.kind, pair.text_1, pair.text_2) for pair in comparison.pairs] == [
+        (DiffKinds.added, None, "the"),
+        (DiffKinds.modified, "council", "councel"),
+    ]
+    assert comparison.pairs[1].word_index_1 == 2
+    assert comparison.pairs[1].word_index_2 == 3
+
+
+def _mutate(word: str, rng: random.Random) -> str:
+    position = rng.randrange(len(word))
+    return word[:position] + rng.choice("xyz") + word[position + 1 :]
+
+
+def test_fuzzy_word_differences_error_counts() -> None:
+    # Pairing never changes the number of errors
+    rng = random.Random(0)
+    vocabulary = [
+        "".join(rng.choice("abcdefgh") for _ in range(rng.randint(3, 8)))
+        for _ in range(200)
+    ]
+    cache = PairScoreCache(max_size=100)
+    for _ in range(200):
+        words_1 = [rng.choice(vocabulary) for _ in range(rng.randint(0, 40))]
+        words_2: List[str] = []
+        for word in words_1:
+            roll = rng.random()
+            if roll < 0.1:
+                continue
+            if roll < 0.3:
+                words_2.append(_mutate(word, rng))
+            elif roll < 0.4:
+                words_2.append(rng.choice(vocabulary))
+            else:
+                words_2.append(word)
+
+        comparison = fuzzy_word_differences(words_1, words_2, cache=cache)
+        n_errors = (
+            comparison.substitutions + comparison.deletions + comparison.insertions
+        )
+        assert n_errors == Levenshtein.distance(words_1, words_2)
+        for pair in comparison.pairs:
+            if pair.word_index_1 is not None:
+                assert words_1[pair.word_index_1] == pair.text_1
+            if pair.word_index_2 is not None:
+                assert words_2[pair.word_index_2] == pair.text_2
+
+    assert len(cache) <= 100
+    assert cache.hits > 0
+
+
+def test_fuzzy_line_differences() -> None:
+    comparison = text_differences(
+        "How you doin'\nNice to meet you", "How yoou doin'\nFine, thank you"
+    )
+    lines = list(fuzzy_line_differences(comparison.lines))
+    assert len(lines) == len(comparison.lines)
+    assert lines[0].near_misses == 1
+    assert sum(line.deletions for line in lines) == 4
+    assert sum(line.insertions for line in lines) == 3
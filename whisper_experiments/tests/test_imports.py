@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import subprocess
+import sys
+from typing import List, Set
+
+import pytest
+
+###############################################################################
+
+# Cumulative import time allowed for each module, in a fresh interpreter.
+# Generous on purpose: this catches heavy dependencies creeping back into
+# module scope (seconds), not small fluctuations.
+IMPORT_TIME_BUDGET_SECONDS = 0.75
+
+HEAVY_MODULES = {
+    "cdp_backend",
+    "cdp_data",
+    "fireo",
+    "gcsfs",
+    "google.cloud.speech",
+    "google.cloud.firestore",
+    "pandas",
+    "pyarrow",
+    "torch",
+    "tqdm",
+    "whisper",
+}
+
+###############################################################################
+
+
+def _imported_heavy_modules(code: str) -> Set[str]:
+    # Compare against a bare interpreter so that anything preloaded by site
+    # packages (e.g. namespace package .pth files) isn't counted
+    check = (
+        "import sys\n"
+        "before = set(sys.modules)\n"
+        f"{code}\n"
+        "print('\\n'.join(set(sys.modules) - before))\n"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", check],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    loaded = set(result.stdout.split())
+    return {
+        module
+        for module in HEAVY_MODULES
+        if module in loaded or any(m.startswith(f"{module}.") for m in loaded)
+    }
+
+
+def _cumulative_import_seconds(module: str) -> float:
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # Lines are: "import time: self [us] | cumulative | imported package"
+    for line in result.stderr.splitlines():
+        parts = [part.strip() for part in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1_000_000
+
+    raise ValueError(f"No import time reported for {module}")
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "whisper_experiments.diff",
+        "whisper_experiments.bin.compare_data",
+        "whisper_experiments.bin.generate_and_archive_data",
+        "whisper_experiments.bin.run_generation_queue",
+        "whisper_experiments.work_queue",
+    ],
+)
+def test_no_heavy_imports(module: str) -> None:
+    assert _imported_heavy_modules(f"import {module}") == set()
+
+
+def test_cli_help_has_no_heavy_imports() -> None:
+    code = (
+        "sys.argv = ['generate_and_archive_cdp_whisper_experiments_data', '--help']\n"
+        "from whisper_experiments.bin import generate_and_archive_data\n"
+        "try:\n"
+        "    generate_and_archive_data.main()\n"
+        "except SystemExit:\n"
+        "    pass"
+    )
+    assert _imported_heavy_modules(code) == set()
+
+
+@pytest.mark.parametrize(
+    "module",
+    [
+        "whisper_experiments.diff",
+        "whisper_experiments.bin.compare_data",
+        "whisper_experiments.bin.generate_and_archive_data",
+    ],
+)
+def test_import_time_budget(module: str) -> None:
+    # Best of a few runs to avoid flagging a single slow (cold cache) start
+    timings: List[float] = [_cumulative_import_seconds(module) for _ in range(3)]
+    assert min(timings) < IMPORT_TIME_BUDGET_SECONDS
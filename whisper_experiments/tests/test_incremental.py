@@ -0,0 +1,156 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+from typing import List
+
+import pytest
+from rapidfuzz.distance import Levenshtein
+from text_diff import Mask
+
+from whisper_experiments.diff import AddedWord, ModifiedWord, TextDiff
+from whisper_experiments.incremental import IncrementalComparison
+
+###############################################################################
+
+VOCAB = [f"word{i}" for i in range(300)]
+
+###############################################################################
+
+
+def _random_text(rng: random.Random, n_words: int, vocab: List[str] = VOCAB) -> str:
+    words = [rng.choice(vocab) for _ in range(n_words)]
+    lines = []
+    i = 0
+    while i < len(words):
+        n_line_words = rng.randint(3, 15)
+        lines.append(" ".join(words[i : i + n_line_words]))
+        i += n_line_words
+    return "\n".join(lines)
+
+
+def _assert_consistent(comparison: IncrementalComparison, optimal: bool = True) -> None:
+    words_1, words_2 = comparison.words_1, comparison.words_2
+    full_errors = sum(
+        max(opcode.src_end - opcode.src_start, opcode.dest_end - opcode.dest_start)
+        for opcode in Levenshtein.opcodes(words_1, words_2)
+        if opcode.tag != "equal"
+    )
+    if optimal:
+        assert comparison.distance == full_errors
+        assert comparison.similarity == pytest.approx(
+            Levenshtein.normalized_similarity(words_1, words_2) * 100
+        )
+    else:
+        assert comparison.distance >= full_errors
+
+    # The opcodes cover both sides and agree with the error counts
+    counts = {"replace": 0, "delete": 0, "insert": 0}
+    src_end = dest_end = 0
+    for opcode in comparison.opcodes():
+        assert (opcode.src_start, opcode.dest_start) == (src_end, dest_end)
+        src_end, dest_end = opcode.src_end, opcode.dest_end
+        if opcode.tag == "equal":
+            assert words_1[opcode.src_start : opcode.src_end] == (
+                words_2[opcode.dest_start : opcode.dest_end]
+            )
+        elif opcode.tag == "insert":
+            counts["insert"] += opcode.dest_end - opcode.dest_start
+        else:
+            counts[opcode.tag] += opcode.src_end - opcode.src_start
+    assert (src_end, dest_end) == (len(words_1), len(words_2))
+    assert (
+        comparison.substitutions,
+        comparison.deletions,
+        comparison.insertions,
+    ) == (counts["replace"], counts["delete"], counts["insert"])
+
+
+def test_incremental_comparison() -> None:
+    comparison = IncrementalComparison("a b c\nd e", "a b c\nd e")
+    assert comparison.distance == 0
+    assert list(comparison.word_differences()) == []
+
+    comparison.replace_words(2, 1, 2, ["x"])
+    assert comparison.words_2 == ["a", "x", "c", "d", "e"]
+    assert list(comparison.word_differences()) == [
+        TextDiff(ModifiedWord("b", Mask(list()), "x", Mask(list())))
+    ]
+
+    comparison.replace_lines(2, 1, 1, ["new line"])
+    assert comparison.words_2 == ["a", "x", "c", "new", "line", "d", "e"]
+    assert (
+        comparison.substitutions,
+        comparison.deletions,
+        comparison.insertions,
+    ) == (1, 0, 2)
+    assert TextDiff(AddedWord("new")) in list(comparison.word_differences())
+    _assert_consistent(comparison)
+
+    with pytest.raises(IndexError):
+        comparison.replace_words(1, 3, 10, [])
+    with pytest.raises(ValueError):
+        comparison.replace_lines(3, 0, 0, [])
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_incremental_comparison_randomized(seed: int) -> None:
+    rng = random.Random(seed)
+    for _ in range(10):
+        text_1 = _random_text(rng, rng.randint(0, 400))
+        # Right side starts as a noisy copy of the left, split differently
+        words = [
+            word if rng.random() > 0.1 else rng.choice(VOCAB) for word in text_1.split()
+        ]
+        text_2 = "\n".join(" ".join(words[i : i + 9]) for i in range(0, len(words), 9))
+        comparison = IncrementalComparison(text_1, text_2)
+        _assert_consistent(comparison)
+
+        for _ in range(10):
+            side = rng.choice([1, 2])
+            if rng.random() < 0.5:
+                n_words = len(comparison.words_1 if side == 1 else comparison.words_2)
+                start = rng.randint(0, n_words)
+                end = rng.randint(start, min(n_words, start + 5))
+                new_words = [rng.choice(VOCAB) for _ in range(rng.randint(0, 5))]
+                comparison.replace_words(side, start, end, new_words)
+            else:
+                n_lines = comparison.n_lines_1 if side == 1 else comparison.n_lines_2
+                start = rng.randint(0, n_lines)
+                end = rng.randint(start, min(n_lines, start + 2))
+                new_lines = [
+                    _random_text(rng, rng.randint(0, 10))
+                    for _ in range(rng.randint(0, 2))
+                ]
+                comparison.replace_lines(side, start, end, new_lines)
+
+            _assert_consistent(comparison)
+
+
+@pytest.mark.parametrize("seed", range(20))
+@pytest.mark.parametrize("exact", [False, True])
+def test_incremental_comparison_repetitive(seed: int, exact: bool) -> None:
+    # With a tiny vocabulary and short anchors the anchor runs around an edit
+    # are often not on an optimal alignment
+    rng = random.Random(seed)
+    vocab = ["a", "b", "c"][: rng.randint(2, 3)]
+    comparison = IncrementalComparison(
+        _random_text(rng, rng.randint(0, 120), vocab),
+        _random_text(rng, rng.randint(0, 120), vocab),
+        anchor_length=4,
+        exact=exact,
+    )
+    _assert_consistent(comparison)
+    for _ in range(20):
+        side = rng.choice([1, 2])
+        n_words = len(comparison.words_1 if side == 1 else comparison.words_2)
+        start = rng.randint(0, n_words)
+        end = rng.randint(start, min(n_words, start + 5))
+        new_words = [rng.choice(vocab) for _ in range(rng.randint(0, 5))]
+        comparison.replace_words(side, start, end, new_words)
+        # Only local work by default, the alignment may be slightly off
+        _assert_consistent(comparison, optimal=exact)
+
+    # An explicit check always restores the optimal alignment
+    comparison.verify()
+    _assert_consistent(comparison)
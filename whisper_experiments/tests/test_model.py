@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from whisper_experiments import model
+from whisper_experiments.data import FullDatasetFields
+
+###############################################################################
+
+
+def _fake_transcribe(params: model.GSRTranscribeParams) -> model.GSRTranscribeResult:
+    return model.GSRTranscribeResult(
+        row_index=params.row_index,
+        gsr_transcript_path=str(params.storage_dir / f"{params.session_id}.json"),
+        gsr_transcription_time=float(params.row_index),
+    )
+
+
+@pytest.mark.parametrize("n_sessions", [0, 3])
+def test_generate_google_sr_dataset(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, n_sessions: int
+) -> None:
+    monkeypatch.setattr(model, "_wrapped_gsr_transcribe", _fake_transcribe)
+    sessions = pd.DataFrame(
+        {
+            FullDatasetFields.id_: [f"session{i}" for i in range(n_sessions)],
+            FullDatasetFields.audio_uri: [
+                f"gs://audio/{i}.wav" for i in range(n_sessions)
+            ],
+        }
+    )
+
+    generated = model.generate_google_sr_dataset(
+        sessions, "credentials.json", storage_dir=tmp_path / "gsr"
+    )
+    assert len(generated) == n_sessions
+    assert generated[FullDatasetFields.gsr_transcription_time].tolist() == [
+        float(i) for i in range(n_sessions)
+    ]
+    assert generated[FullDatasetFields.gsr_transcript_path].tolist() == [
+        str(tmp_path / "gsr" / f"session{i}.json") for i in range(n_sessions)
+    ]
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import zipfile
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from whisper_experiments.data import FullDatasetFields
+from whisper_experiments.object_store import ObjectStore
+
+###############################################################################
+
+
+def _sessions(source_dir: Path, gsr_version: str, n_changed: int) -> pd.DataFrame:
+    # The first n_changed GSR transcripts differ between versions
+    source_dir.mkdir(parents=True, exist_ok=True)
+    rows = []
+    for i in range(10):
+        session_id = f"session{i:03d}"
+        ground_truth_path = source_dir / f"{session_id}-gt.json"
+        ground_truth_path.write_text(json.dumps({"ground_truth": i}))
+        gsr_path = source_dir / f"{session_id}-gsr.json"
+        label = gsr_version if i < n_changed else "original"
+        gsr_path.write_text(json.dumps({"gsr": i, "version": label}))
+        rows.append(
+            {
+                FullDatasetFields.id_: session_id,
+                FullDatasetFields.ground_truth_transcript_path: str(ground_truth_path),
+                FullDatasetFields.gsr_transcript_path: str(gsr_path),
+                FullDatasetFields.gsr_transcription_time: float(i),
+            }
+        )
+
+    return pd.DataFrame(rows)
+
+
+###############################################################################
+
+
+def test_versions_only_store_changes(tmp_path: Path) -> None:
+    store = ObjectStore(tmp_path / "store")
+    first = store.commit(_sessions(tmp_path / "v1", "original", 0))
+    assert first.version == 1
+    assert first.parent is None
+    assert first.n_objects == 20
+    assert first.n_new_objects == 20
+
+    # Three regenerated GSR transcripts, everything else identical
+    second = store.commit(_sessions(tmp_path / "v2", "regenerated", 3))
+    assert second.version == 2
+    assert second.parent == 1
+    assert store.commit(_sessions(tmp_path / "v3", "regenerated", 3)).parent == 2
+    assert second.n_objects == 20
+    assert second.n_new_objects == 3
+    assert [version.version for version in store.versions()] == [1, 2, 3]
+
+    # Both versions stay readable
+    for version, expected in ((1, "original"), (2, "regenerated")):
+        sessions = store.load_version(version)
+        with open(sessions[FullDatasetFields.gsr_transcript_path][0], "r") as open_f:
+            assert json.load(open_f)["version"] == expected
+
+    # Archives can be made from any version
+    archive_path = store.export_archive(1, archive_name=tmp_path / "archive-v1")
+    with zipfile.ZipFile(archive_path) as archive:
+        assert json.loads(archive.read("session000/gsr.json"))["version"] == "original"
+
+
+def test_delta_export_import(tmp_path: Path) -> None:
+    store = ObjectStore(tmp_path / "store")
+    store.commit(_sessions(tmp_path / "v1", "original", 0))
+    store.commit(_sessions(tmp_path / "v2", "regenerated", 3))
+
+    # A receiver with the first version only gets what changed
+    receiver = ObjectStore(tmp_path / "receiver")
+    assert receiver.import_delta(store.export_delta(tmp_path / "full.zip", 1)) == 20
+    assert receiver.latest_version() == 1
+
+    delta_path = store.export_delta(tmp_path / "delta.zip", since_version=1)
+    with zipfile.ZipFile(delta_path) as delta:
+        names = delta.namelist()
+    assert len([name for name in names if name.startswith("objects/")]) == 3
+    assert receiver.import_delta(delta_path) == 3
+    assert receiver.latest_version() == 2
+    pd.testing.assert_frame_equal(receiver.manifest(2), store.manifest(2))
+
+
+def test_delta_ships_objects_of_intermediate_versions(tmp_path: Path) -> None:
+    store = ObjectStore(tmp_path / "store")
+    for label in ("original", "regenerated", "regenerated-again"):
+        store.commit(_sessions(tmp_path / label, label, 3))
+
+    receiver = ObjectStore(tmp_path / "receiver")
+    receiver.import_delta(store.export_delta(tmp_path / "full.zip", 1))
+
+    # Version 2's transcripts are in neither version 1 nor version 3
+    delta_path = store.export_delta(tmp_path / "delta.zip", 3, since_version=1)
+    assert receiver.import_delta(delta_path) == 6
+    assert [version.version for version in receiver.versions()] == [1, 2, 3]
+    for version in (1, 2, 3):
+        sessions = receiver.load_version(version)
+        for column in (
+            FullDatasetFields.ground_truth_transcript_path,
+            FullDatasetFields.gsr_transcript_path,
+        ):
+            assert all(Path(path).exists() for path in sessions[column])
+
+
+def test_corrupt_delta(tmp_path: Path) -> None:
+    store = ObjectStore(tmp_path / "store")
+    with zipfile.ZipFile(tmp_path / "bad.zip", "w") as delta:
+        delta.writestr(f"objects/ab/{'ab' * 32}.json", b"not what was hashed")
+
+    with pytest.raises(ValueError):
+        store.import_delta(tmp_path / "bad.zip")
+    with pytest.raises(ValueError):
+        store.manifest()
+
+
+def test_delta_rejects_unsafe_and_diverged_members(tmp_path: Path) -> None:
+    store = ObjectStore(tmp_path / "store")
+    for name in ["../../escaped.json", "/tmp/escaped.json", "manifests/../x.json"]:
+        with zipfile.ZipFile(tmp_path / "unsafe.zip", "w") as delta:
+            delta.writestr(name, b"{}")
+        with pytest.raises(ValueError, match="Unexpected member"):
+            store.import_delta(tmp_path / "unsafe.zip")
+    assert not (tmp_path / "escaped.json").exists()
+
+    # Two stores that each committed their own version 1 can't be merged
+    store.commit(_sessions(tmp_path / "a", "original", 0))
+    manifest = store.manifest(1)
+    other = ObjectStore(tmp_path / "other")
+    other.commit(_sessions(tmp_path / "b", "regenerated", 3))
+    with pytest.raises(ValueError, match="conflicts"):
+        store.import_delta(other.export_delta(tmp_path / "other.zip"))
+    pd.testing.assert_frame_equal(store.manifest(1), manifest)
+    assert store.latest_version() == 1
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+from pathlib import Path
+
+import pytest
+
+from whisper_experiments.diff import line_differences, transcript_differences
+from whisper_experiments.report import (
+    ReportWriter,
+    export_text_report,
+    export_transcript_report,
+)
+from whisper_experiments.synthetic import generate_transcript_pair
+
+###############################################################################
+
+
+def test_report_writer_streams_pages(tmp_path: Path) -> None:
+    writer = ReportWriter(tmp_path, page_size=2)
+    for item in range(3):
+        writer.add({"value": item}, "<b>left</b>", "right", start_time=item * 10.0)
+
+    # The first page is on disk (and out of memory) before the report is closed
+    assert (tmp_path / "page-00001.json").exists()
+    assert not (tmp_path / "page-00002.json").exists()
+    assert not (tmp_path / "index.json").exists()
+
+    viewer_path = writer.close()
+    assert viewer_path == tmp_path / "index.html"
+    assert viewer_path.exists()
+
+    with open(tmp_path / "index.json") as open_f:
+        index = json.load(open_f)
+    assert index["n_items"] == 3
+    assert [page["n_items"] for page in index["pages"]] == [2, 1]
+    assert [page["start_time"] for page in index["pages"]] == [0.0, 20.0]
+    assert index["pages"][1]["first_item"] == 2
+
+    with open(tmp_path / "page-00002.json") as open_f:
+        page = json.load(open_f)
+    assert page["items"] == [{"item": 2, "start_time": 20.0, "value": 2}]
+    html = (tmp_path / "page-00001.html").read_text()
+    assert '<tr id="item-1" data-start="10.0">' in html
+    assert "<b>left</b>" in html
+    assert 'href="page-00002.html">next' in html
+    assert ">next<" not in (tmp_path / "page-00002.html").read_text()
+
+
+def test_report_writer_last_full_page_has_no_next_link(tmp_path: Path) -> None:
+    with ReportWriter(tmp_path, page_size=2) as writer:
+        for item in range(4):
+            writer.add({"value": item}, "left", "right")
+
+    assert [page.n_items for page in writer.pages] == [2, 2]
+    last_page_html = (tmp_path / "page-00002.html").read_text()
+    assert ">next<" not in last_page_html
+    assert 'href="page-00001.html">previous' in last_page_html
+    assert '<tr id="item-3">' in last_page_html
+
+
+def test_report_writer_invalid_page_size(tmp_path: Path) -> None:
+    with pytest.raises(ValueError):
+        ReportWriter(tmp_path, page_size=0)
+
+
+def test_export_transcript_report(tmp_path: Path) -> None:
+    pair = generate_transcript_pair(300, seed=3)
+    comparison = transcript_differences(pair.ground_truth, pair.hypothesis)
+    export_transcript_report(pair.ground_truth, pair.hypothesis, tmp_path, page_size=10)
+
+    with open(tmp_path / "index.json") as open_f:
+        index = json.load(open_f)
+    assert index["n_items"] == len(comparison.sentences)
+    assert len(index["pages"]) == -(-len(comparison.sentences) // 10)
+    start_times = [page["start_time"] for page in index["pages"]]
+    assert start_times == sorted(start_times)
+
+    n_words = 0
+    for page in index["pages"]:
+        with open(tmp_path / page["json_path"]) as open_f:
+            n_words += sum(len(item["words"]) for item in json.load(open_f)["items"])
+    assert n_words == sum(len(sentence.words) for sentence in comparison.sentences)
+
+
+def test_export_text_report(tmp_path: Path) -> None:
+    lines = line_differences(
+        ["How you doin'", "Nice to meet you"], ["How yoou doin'", "Fine <thanks>"]
+    )
+    export_text_report(lines, tmp_path, page_size=1)
+
+    # One page per modified, removed, and added line
+    pages = sorted(tmp_path.glob("page-*.html"))
+    assert len(pages) == 3
+    assert '<span class="modified">yoou</span>' in pages[0].read_text()
+    assert '<span class="added">&lt;thanks&gt;</span>' in pages[2].read_text()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from pathlib import Path
+
+import pytest
+from cdp_backend.pipeline.transcript_model import Transcript
+
+from whisper_experiments.serialization import (
+    ALL_TRANSCRIPT_FORMATS,
+    TRANSCRIPT_FORMAT_SUFFIXES,
+    TranscriptFormats,
+    encode_transcript,
+    read_transcript,
+    read_transcript_dict,
+    transcript_from_dict,
+    transcript_suffix,
+    transcript_to_dict,
+    write_transcript,
+)
+from whisper_experiments.synthetic import generate_transcript_pair
+
+###############################################################################
+
+
+@pytest.fixture
+def transcript() -> Transcript:
+    pair = generate_transcript_pair(duration=120, seed=3)
+    return Transcript.from_dict(pair.hypothesis)
+
+
+###############################################################################
+
+
+def test_dict_conversion_matches_dataclasses_json(transcript: Transcript) -> None:
+    assert transcript_to_dict(transcript) == transcript.to_dict()
+    assert transcript_from_dict(transcript.to_dict()) == transcript
+
+
+@pytest.mark.parametrize("transcript_format", ALL_TRANSCRIPT_FORMATS)
+def test_round_trip(
+    tmp_path: Path,
+    transcript: Transcript,
+    transcript_format: str,
+) -> None:
+    if transcript_format == TranscriptFormats.zstd:
+        pytest.importorskip("zstandard")
+
+    path = write_transcript(
+        transcript,
+        tmp_path / f"gsr{TRANSCRIPT_FORMAT_SUFFIXES[transcript_format]}",
+        transcript_format=transcript_format,
+    )
+    assert transcript_suffix(path) == TRANSCRIPT_FORMAT_SUFFIXES[transcript_format]
+    assert read_transcript(path) == transcript
+    assert read_transcript_dict(path) == transcript.to_dict()
+
+
+def test_formats_are_smaller(transcript: Transcript) -> None:
+    sizes = {
+        transcript_format: len(encode_transcript(transcript, transcript_format))
+        for transcript_format in (
+            TranscriptFormats.json,
+            TranscriptFormats.compact,
+            TranscriptFormats.gzip,
+        )
+    }
+    assert sizes["json"] > sizes["compact"] > sizes["gzip"]
+
+    # Same transcript, same bytes
+    assert encode_transcript(transcript) == encode_transcript(transcript)
+
+
+def test_legacy_json_is_readable(tmp_path: Path, transcript: Transcript) -> None:
+    path = tmp_path / "gsr.json"
+    with open(path, "w") as open_f:
+        open_f.write(transcript.to_json(indent=4))
+
+    assert read_transcript(path) == transcript
+
+
+def test_unknown_format(transcript: Transcript) -> None:
+    with pytest.raises(ValueError):
+        encode_transcript(transcript, "xml")
@@ -0,0 +1,127 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+from pathlib import Path
+from typing import List, Tuple
+
+import pytest
+
+from whisper_experiments import __version__
+from whisper_experiments.diff import text_differences
+from whisper_experiments.similarity import (
+    ApproximateSimilarity,
+    MinHashSketch,
+    num_perm_for_error_bound,
+    shingle_similarity,
+    sketch_similarity,
+    sketch_text,
+)
+
+###############################################################################
+
+
+def _make_text_pair(seed: int, n_words: int, change_rate: float) -> Tuple[str, str]:
+    rng = random.Random(seed)
+    vocab = [f"word{i}" for i in range(500)]
+    words_1 = [rng.choice(vocab) for _ in range(n_words)]
+    words_2 = [
+        word if rng.random() > change_rate else rng.choice(vocab) for word in words_1
+    ]
+
+    def _to_lines(words: List[str]) -> str:
+        return "\n".join(" ".join(words[i : i + 12]) for i in range(0, len(words), 12))
+
+    return _to_lines(words_1), _to_lines(words_2)
+
+
+###############################################################################
+
+
+@pytest.mark.parametrize(
+    "text_1, text_2, expected",
+    [
+        ("", "", 100.0),
+        ("hello world", "hello world", 100.0),
+        ("hello world", "", 0.0),
+        ("aaaaaaaa", "bbbbbbbb", 0.0),
+    ],
+)
+def test_sketch_similarity_extremes(text_1: str, text_2: str, expected: float) -> None:
+    assert sketch_similarity(sketch_text(text_1), sketch_text(text_2)) == expected
+    assert shingle_similarity(text_1, text_2) == expected
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+@pytest.mark.parametrize("change_rate", [0.05, 0.3, 0.7])
+def test_sketch_similarity_within_error_bound(seed: int, change_rate: float) -> None:
+    text_1, text_2 = _make_text_pair(seed, 2000, change_rate)
+    estimate = sketch_similarity(
+        sketch_text(text_1, epsilon=0.05, delta=0.001),
+        sketch_text(text_2, epsilon=0.05, delta=0.001),
+    )
+    assert abs(estimate - shingle_similarity(text_1, text_2)) <= 5
+
+
+def test_sketch_deterministic_and_round_trips(tmp_path: Path) -> None:
+    text_1, _ = _make_text_pair(0, 200, 0.0)
+    sketch = sketch_text(text_1, num_perm=64)
+    assert (sketch.hashvalues == sketch_text(text_1, num_perm=64).hashvalues).all()
+
+    loaded = MinHashSketch.load(sketch.save(tmp_path / "sketch.npz"))
+    assert loaded.is_compatible(sketch)
+    assert sketch_similarity(loaded, sketch) == 100.0
+
+
+def test_incompatible_sketches_raise() -> None:
+    with pytest.raises(ValueError):
+        sketch_similarity(sketch_text("a", seed=1), sketch_text("a", seed=2))
+
+
+def test_num_perm_for_error_bound() -> None:
+    assert num_perm_for_error_bound(0.05, 0.05) == 738
+    with pytest.raises(ValueError):
+        num_perm_for_error_bound(0, 0.05)
+
+
+def test_approximate_similarity_falls_back_near_threshold(tmp_path: Path) -> None:
+    text_1, text_2 = _make_text_pair(0, 2000, 0.3)
+    exact = shingle_similarity(text_1, text_2)
+
+    # Threshold right on top of the true score, must rescore exactly
+    near = ApproximateSimilarity(threshold=exact)
+    assert near(text_1, text_2) == exact
+    assert near.n_exact == 1
+
+    # Threshold far away, estimate is returned as is
+    far = ApproximateSimilarity(threshold=exact + 40, sketch_dir=tmp_path)
+    assert far(text_1, text_2) != exact
+    assert far.n_approximate == 1
+    assert len(list(tmp_path.glob("*.npz"))) == 2
+
+    # Usable directly as the similarity_calc of text_differences
+    comparison = text_differences(text_1, text_2, similarity_calc=far)
+    assert abs(comparison.similarity - exact) <= 5
+
+
+def test_approximate_similarity_bounds_sketches() -> None:
+    similarity = ApproximateSimilarity(threshold=50, max_sketches=2)
+    first = similarity.sketch("first text")
+    similarity.sketch("second text")
+
+    # The first sketch was used most recently, so the second one is dropped
+    assert similarity.sketch("first text") is first
+    similarity.sketch("third text")
+    assert list(similarity._sketches) == [
+        similarity._sketch_key("first text"),
+        similarity._sketch_key("third text"),
+    ]
+
+
+def test_approximate_similarity_cache_identity() -> None:
+    identity = ApproximateSimilarity(threshold=50).cache_identity
+    assert identity.startswith(
+        f"whisper_experiments.similarity.ApproximateSimilarity=={__version__}("
+    )
+    assert identity == ApproximateSimilarity(threshold=50).cache_identity
+    assert identity != ApproximateSimilarity(threshold=50, seed=1).cache_identity
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from whisper_experiments import data
+from whisper_experiments.snapshot import (
+    InstanceRange,
+    LocalSessionSource,
+    SessionSnapshot,
+    SnapshotFields,
+)
+
+###############################################################################
+
+
+@pytest.fixture
+def source(tmp_path: Path) -> LocalSessionSource:
+    # Sessions on the 5th and 20th of every month from June to December 2020
+    transcripts_dir = tmp_path / "source-transcripts"
+    transcripts_dir.mkdir()
+    session_datetimes = [
+        pd.Timestamp(year=2020, month=month, day=day, hour=17, tz="UTC")
+        for month in range(6, 13)
+        for day in (5, 20)
+    ]
+    rows = []
+    for i, session_datetime in enumerate(session_datetimes):
+        session_id = f"session{i:03d}"
+        transcript_path = transcripts_dir / f"{session_id}.json"
+        with open(transcript_path, "w") as open_f:
+            json.dump({"sentences": [{"text": f"session {i}"}]}, open_f)
+
+        rows.append(
+            {
+                "id": session_id,
+                "key": f"session/{session_id}",
+                "session_datetime": session_datetime,
+                "session_index": 0,
+                "session_content_hash": f"hash{i}",
+                "transcript_path": str(transcript_path),
+                "event": object(),
+            }
+        )
+
+    return LocalSessionSource(pd.DataFrame(rows))
+
+
+###############################################################################
+
+
+def test_sync_only_pulls_missing_ranges(
+    tmp_path: Path, source: LocalSessionSource
+) -> None:
+    snapshot = SessionSnapshot(tmp_path / "snapshot", source=source)
+    assert snapshot.sync("instance", "2020-08-01", "2020-10-01") == 4
+    assert len(source.queries) == 1
+
+    # Nothing new to pull
+    assert snapshot.sync("instance", "2020-08-15", "2020-09-15") == 0
+    assert len(source.queries) == 1
+
+    # Only the tails on either side are pulled
+    assert snapshot.sync("instance", "2020-07-01", "2020-11-01") == 4
+    assert [(start.month, end.month) for _, start, end in source.queries[1:]] == [
+        (7, 8),
+        (10, 11),
+    ]
+    assert snapshot.synced_ranges("instance") == [
+        (pd.Timestamp("2020-07-01", tz="UTC"), pd.Timestamp("2020-11-01", tz="UTC"))
+    ]
+
+    # Refresh only pulls sessions after the last sync
+    assert snapshot.refresh("instance", end_datetime="2021-01-01") == 4
+    assert source.queries[-1][1] == pd.Timestamp("2020-11-01", tz="UTC")
+
+    # State survives a new snapshot object
+    reopened = SessionSnapshot(tmp_path / "snapshot", source=source)
+    assert reopened.last_synced_datetime("instance") == pd.Timestamp(
+        "2021-01-01", tz="UTC"
+    )
+    assert len(reopened.query()) == 12
+
+
+def test_refresh_requires_sync(tmp_path: Path, source: LocalSessionSource) -> None:
+    with pytest.raises(ValueError):
+        SessionSnapshot(tmp_path, source=source).refresh("instance")
+
+
+def test_query_prunes_partitions(tmp_path: Path, source: LocalSessionSource) -> None:
+    snapshot = SessionSnapshot(tmp_path / "snapshot", source=source)
+    snapshot.sync("instance", "2020-06-01", "2020-12-31")
+
+    sessions = snapshot.query("2020-08-01", "2020-09-30")
+    assert list(sessions[SnapshotFields.id_]) == [
+        "session004",
+        "session005",
+        "session006",
+        "session007",
+    ]
+    for transcript_path in sessions[SnapshotFields.transcript_path]:
+        assert Path(transcript_path).exists()
+
+    # Only the August and September directories are read
+    expression = snapshot._filter_expression("2020-08-01", "2020-09-30", None)
+    fragments = list(snapshot._dataset().get_fragments(filter=expression))
+    assert sorted(Path(fragment.path).parent.name for fragment in fragments) == [
+        "month=8",
+        "month=9",
+    ]
+
+    assert len(snapshot.query("2021-01-01", "2021-12-31")) == 0
+    assert len(snapshot.query(infrastructure_slug="other-instance")) == 0
+
+
+def test_get_ground_truth_dataset_from_snapshot(
+    tmp_path: Path, source: LocalSessionSource
+) -> None:
+    source.sessions["infrastructure_slug"] = data.INFRASTRUCTURE_SLUG
+    snapshot = SessionSnapshot(tmp_path / "snapshot", source=source)
+    sessions = data.get_ground_truth_dataset(test=True, snapshot=snapshot)
+
+    assert list(sessions.columns) == data.ALL_GROUND_TRUTH_DATASET_FIELDS
+    assert list(sessions[data.GroundTruthDatasetFields.id_]) == ["session004"]
+    assert sessions[data.GroundTruthDatasetFields.audio_uri][0].startswith(
+        f"gs://{data.INFRASTRUCTURE_SLUG}"
+    )
+
+    # A second run is served entirely from the snapshot
+    data.get_ground_truth_dataset(test=True, snapshot=snapshot)
+    assert len(source.queries) == 1
+
+
+def test_multi_instance_partitions(tmp_path: Path, source: LocalSessionSource) -> None:
+    # Split the sessions across two instances
+    source.sessions["infrastructure_slug"] = [
+        "instance-a" if i % 2 == 0 else "instance-b"
+        for i in range(len(source.sessions))
+    ]
+    snapshot = SessionSnapshot(tmp_path / "snapshot", source=source)
+    sessions = data.get_ground_truth_dataset(
+        snapshot=snapshot,
+        instance_ranges=[
+            InstanceRange("instance-a", "2020-08-01", "2020-10-01"),
+            InstanceRange("instance-b", "2020-06-01", "2020-07-01"),
+        ],
+    )
+    assert list(sessions[data.GroundTruthDatasetFields.id_]) == [
+        "session004",
+        "session006",
+        "session001",
+    ]
+    assert sessions[data.GroundTruthDatasetFields.audio_uri][2].startswith(
+        "gs://instance-b"
+    )
+    assert snapshot.synced_ranges("instance-b") == [
+        (pd.Timestamp("2020-06-01", tz="UTC"), pd.Timestamp("2020-07-01", tz="UTC"))
+    ]
+
+    # Only the requested instance's directories are read
+    expression = snapshot._filter_expression(None, None, "instance-b")
+    fragments = list(snapshot._dataset().get_fragments(filter=expression))
+    assert {Path(fragment.path).parents[2].name for fragment in fragments} == {
+        "infrastructure_slug=instance-b"
+    }
+    assert len(snapshot.query(infrastructure_slug=["instance-a", "instance-b"])) == 3
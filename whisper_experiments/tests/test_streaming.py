@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List
+
+import pytest
+
+from whisper_experiments.streaming import (
+    ParquetPartWriter,
+    bounded_map,
+    read_parquet_parts,
+)
+
+###############################################################################
+
+
+def _slow_square(value: int) -> int:
+    time.sleep(random.uniform(0, 0.01))
+    return value * value
+
+
+def test_bounded_map_limits_in_flight() -> None:
+    pulled: List[int] = []
+
+    def _items() -> Iterator[int]:
+        for i in range(100):
+            pulled.append(i)
+            yield i
+
+    results: Dict[int, int] = {}
+    for index, result in bounded_map(_slow_square, _items(), max_in_flight=4):
+        # Never more than the window ahead of what has been consumed
+        assert len(pulled) - len(results) <= 4
+        results[index] = result
+
+    assert results == {i: i * i for i in range(100)}
+
+
+def test_bounded_map_executor() -> None:
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = dict(bounded_map(_slow_square, range(10), executor=executor))
+        # Still usable, bounded_map doesn't shut it down
+        assert executor.submit(_slow_square, 3).result() == 9
+
+    assert results == {i: i * i for i in range(10)}
+
+
+def test_bounded_map_raises() -> None:
+    def _fails(value: int) -> int:
+        raise RuntimeError(f"failed on {value}")
+
+    with pytest.raises(RuntimeError):
+        list(bounded_map(_fails, range(3)))
+    with pytest.raises(ValueError):
+        list(bounded_map(_slow_square, range(3), max_in_flight=0))
+
+
+def test_parquet_parts_readable_mid_run(tmp_path: Path) -> None:
+    results_dir = tmp_path / "results"
+    completion_order = list(range(50))
+    random.Random(0).shuffle(completion_order)
+
+    with ParquetPartWriter(results_dir, row_group_size=8) as writer:
+        for n_written, row_index in enumerate(completion_order, start=1):
+            writer.write(
+                row_index,
+                {"id": f"session{row_index:03d}", "path": tmp_path / f"{row_index}"},
+            )
+
+            # Everything in a flushed part is visible, the buffer is not
+            if n_written == 20:
+                partial = read_parquet_parts(results_dir)
+                assert len(partial) == 16
+                assert list(partial.index) == sorted(completion_order[:16])
+
+    assert writer.n_rows == 50
+    assert writer.n_parts == 7
+    results = read_parquet_parts(results_dir)
+    assert list(results.index) == list(range(50))
+    assert list(results["id"])[:2] == ["session000", "session001"]
+    assert results["path"][3] == str(tmp_path / "3")
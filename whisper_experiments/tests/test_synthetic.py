@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import wave
+from pathlib import Path
+
+import pytest
+from cdp_backend.pipeline.transcript_model import Transcript
+
+from whisper_experiments.synthetic import (
+    generate_transcript_pair,
+    transcript_text,
+    write_transcript_pair,
+)
+
+###############################################################################
+
+
+def test_generate_transcript_pair_deterministic(tmp_path: Path) -> None:
+    pair_a = generate_transcript_pair(duration=120, seed=7)
+    pair_b = generate_transcript_pair(duration=120, seed=7)
+    pair_c = generate_transcript_pair(duration=120, seed=8)
+
+    paths_a = write_transcript_pair(pair_a, tmp_path / "a")
+    paths_b = write_transcript_pair(pair_b, tmp_path / "b")
+    for path_a, path_b in zip(paths_a, paths_b):
+        assert path_a.read_bytes() == path_b.read_bytes()
+
+    assert transcript_text(pair_a.hypothesis) != transcript_text(pair_c.hypothesis)
+
+
+@pytest.mark.parametrize("duration", [60, 3600])
+def test_generate_transcript_pair_shape(duration: float) -> None:
+    pair = generate_transcript_pair(duration=duration, words_per_minute=150)
+    gt_words = [
+        word
+        for sentence in pair.ground_truth["sentences"]
+        for word in sentence["words"]
+    ]
+    hyp_words = [
+        word for sentence in pair.hypothesis["sentences"] for word in sentence["words"]
+    ]
+
+    assert len(gt_words) == duration / 60 * 150
+    assert gt_words[-1]["end_time"] <= duration
+    assert len(hyp_words) == (
+        len(gt_words) + pair.edits.insertions - pair.edits.deletions
+    )
+
+    # Word times stay ordered after jitter
+    starts = [word["start_time"] for word in hyp_words]
+    assert starts == sorted(starts)
+
+    # Loadable as the CDP transcript model
+    transcript = Transcript.from_dict(pair.hypothesis)
+    assert len(transcript.sentences) == len(pair.hypothesis["sentences"])
+
+
+def test_generate_transcript_pair_rates() -> None:
+    pair = generate_transcript_pair(
+        duration=3600,
+        substitution_rate=0.1,
+        insertion_rate=0.0,
+        deletion_rate=0.05,
+        near_miss_fraction=0.5,
+        resegment_rate=0.0,
+    )
+    n_words = 9000
+    n_substitutions = pair.edits.substitutions + pair.edits.near_miss_substitutions
+    assert pair.edits.insertions == 0
+    assert abs(n_substitutions / n_words - 0.1) < 0.02
+    assert abs(pair.edits.deletions / n_words - 0.05) < 0.02
+    assert len(pair.ground_truth["sentences"]) == len(pair.hypothesis["sentences"])
+
+
+def test_generate_transcript_pair_no_edits() -> None:
+    pair = generate_transcript_pair(
+        duration=300,
+        substitution_rate=0.0,
+        insertion_rate=0.0,
+        deletion_rate=0.0,
+        resegment_rate=0.0,
+    )
+    assert transcript_text(pair.ground_truth) == transcript_text(pair.hypothesis)
+
+
+def test_generate_transcript_pair_audio(tmp_path: Path) -> None:
+    pair = generate_transcript_pair(
+        duration=30,
+        audio_path=tmp_path / "audio.wav",
+        sample_rate=8000,
+    )
+    assert pair.audio_path is not None
+    with wave.open(str(pair.audio_path), "rb") as wav:
+        assert wav.getframerate() == 8000
+        assert wav.getnframes() == 30 * 8000
+
+    # Transcripts are plain JSON
+    json.dumps(pair.ground_truth)
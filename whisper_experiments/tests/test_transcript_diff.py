@@ -0,0 +1,122 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from typing import Any, Dict, List
+
+import pytest
+
+from whisper_experiments.columnar import to_columnar
+from whisper_experiments.diff import DiffKinds, transcript_differences
+from whisper_experiments.synthetic import generate_transcript_pair
+
+###############################################################################
+
+
+def _transcript(sentences: List[str]) -> Dict[str, Any]:
+    # One second per word, sentences back to back
+    transcript_sentences = []
+    time = 0.0
+    for sentence_index, sentence in enumerate(sentences):
+        words = []
+        for word_index, text in enumerate(sentence.split()):
+            words.append(
+                {
+                    "index": word_index,
+                    "start_time": time,
+                    "end_time": time + 1.0,
+                    "text": text,
+                }
+            )
+            time += 1.0
+        transcript_sentences.append(
+            {
+                "index": sentence_index,
+                "start_time": words[0]["start_time"],
+                "end_time": words[-1]["end_time"],
+                "text": sentence,
+                "speaker_index": 0,
+                "words": words,
+            }
+        )
+
+    return {"sentences": transcript_sentences}
+
+
+###############################################################################
+
+
+def test_to_columnar() -> None:
+    columns = to_columnar(_transcript(["a b", "c", "d e f"]))
+    assert columns.n_words == 6
+    assert columns.n_sentences == 3
+    assert columns.word_offsets.tolist() == [0, 2, 3, 6]
+    assert columns.word_sentence_index.tolist() == [0, 0, 1, 2, 2, 2]
+    assert columns.sentence_words(2) == ["d", "e", "f"]
+    assert columns.sentence_end_time.tolist() == [2.0, 3.0, 6.0]
+    assert to_columnar(columns) is columns
+
+
+@pytest.mark.parametrize(
+    "sentences_1, sentences_2, kinds, similarity",
+    [
+        (["a b c", "d e"], ["a b c", "d e"], [], 100.0),
+        # Resegmentation alone is not a difference
+        (["a b c", "d e"], ["a b", "c d e"], [], 100.0),
+        (["a b c", "d e"], ["a x c", "d e"], [DiffKinds.modified], 80.0),
+        (["a b c", "d e"], ["a c", "d e"], [DiffKinds.removed], 2 * 4 / 9 * 100),
+        (["a b c", "d e"], ["a b c", "d e f"], [DiffKinds.added], 2 * 5 / 11 * 100),
+        ([], [], [], 100.0),
+    ],
+)
+def test_transcript_differences(
+    sentences_1: List[str],
+    sentences_2: List[str],
+    kinds: List[str],
+    similarity: float,
+) -> None:
+    comparison = transcript_differences(
+        _transcript(sentences_1), _transcript(sentences_2)
+    )
+    assert [
+        word.kind for sentence in comparison.sentences for word in sentence.words
+    ] == kinds
+    assert comparison.similarity == pytest.approx(similarity)
+
+
+def test_transcript_differences_indices_and_times() -> None:
+    comparison = transcript_differences(
+        _transcript(["a b c", "d e"]),
+        _transcript(["a b c", "x d", "e"]),
+    )
+    assert len(comparison.sentences) == 1
+    sentence = comparison.sentences[0]
+    assert (sentence.sentence_start_1, sentence.sentence_end_1) == (1, 2)
+    assert (sentence.sentence_start_2, sentence.sentence_end_2) == (1, 3)
+    assert (sentence.start_time_2, sentence.end_time_2) == (3.0, 6.0)
+
+    (word,) = sentence.words
+    assert word.kind == DiffKinds.added
+    assert word.word_index_1 is None
+    assert (word.word_index_2, word.sentence_index_2, word.text_2) == (3, 1, "x")
+    assert (word.start_time_2, word.end_time_2) == (3.0, 4.0)
+
+
+def test_transcript_differences_normalize() -> None:
+    transcript_1 = _transcript(["Hello World"])
+    transcript_2 = _transcript(["hello world"])
+    assert transcript_differences(transcript_1, transcript_2).substitutions == 2
+    assert (
+        len(transcript_differences(transcript_1, transcript_2, str.lower).sentences)
+        == 0
+    )
+
+
+def test_transcript_differences_error_counts() -> None:
+    pair = generate_transcript_pair(duration=600, seed=2)
+    comparison = transcript_differences(pair.ground_truth, pair.hypothesis)
+    n_edits = sum(pair.edits)
+    n_errors = comparison.substitutions + comparison.deletions + comparison.insertions
+    # The minimal alignment can't need more edits than were made
+    assert 0 < n_errors <= n_edits
+    assert comparison.n_words_1 == to_columnar(pair.ground_truth).n_words
+    assert comparison.word_error_rate == pytest.approx(n_errors / comparison.n_words_1)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import multiprocessing
+import time
+import zipfile
+from functools import partial
+from pathlib import Path
+from typing import Any, Dict
+
+import pandas as pd
+import pytest
+
+from whisper_experiments import generation
+from whisper_experiments.data import FullDatasetFields
+from whisper_experiments.work_queue import WorkQueue, run_worker
+
+###############################################################################
+
+
+def _fake_transcribe(
+    session_id: str,
+    payload: Dict[str, Any],
+    queue_dir: Path,
+) -> Dict[str, Any]:
+    # Stand-in for generation.gsr_transcribe_task
+    time.sleep(0.01)
+    relative_path = Path(generation.GSR_DIR_NAME) / f"{session_id}.json"
+    with open(queue_dir / relative_path, "w") as open_f:
+        json.dump({"audio_uri": payload[FullDatasetFields.audio_uri]}, open_f)
+
+    return {
+        FullDatasetFields.gsr_transcript_path: relative_path.as_posix(),
+        FullDatasetFields.gsr_transcription_time: 0.01,
+    }
+
+
+def _always_fails(session_id: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    raise RuntimeError(f"Could not transcribe {session_id}")
+
+
+def _run_fake_worker(queue_dir: Path, worker_id: str) -> None:
+    run_worker(
+        generation.queue_db_path(queue_dir),
+        handler=partial(_fake_transcribe, queue_dir=queue_dir),
+        worker_id=worker_id,
+        poll_interval=0.05,
+    )
+
+
+@pytest.fixture
+def sessions(tmp_path: Path) -> pd.DataFrame:
+    ground_truth_dir = tmp_path / "ground-truth-source"
+    ground_truth_dir.mkdir()
+    rows = []
+    for i in range(20):
+        session_id = f"session{i:03d}"
+        transcript_path = ground_truth_dir / f"{session_id}.json"
+        with open(transcript_path, "w") as open_f:
+            json.dump({"sentences": []}, open_f)
+
+        rows.append(
+            {
+                FullDatasetFields.id_: session_id,
+                FullDatasetFields.audio_uri: f"gs://instance/{session_id}.wav",
+                FullDatasetFields.ground_truth_transcript_path: str(transcript_path),
+            }
+        )
+
+    return pd.DataFrame(rows)
+
+
+###############################################################################
+
+
+def test_workers_share_queue(
+    tmp_path: Path,
+    sessions: pd.DataFrame,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    queue_dir = tmp_path / "queue"
+    assert generation.enqueue_generation(sessions, queue_dir) == 20
+    # Enqueueing again adds nothing
+    assert generation.enqueue_generation(sessions, queue_dir) == 0
+
+    workers = [
+        multiprocessing.Process(
+            target=_run_fake_worker, args=(queue_dir, f"worker-{i}")
+        )
+        for i in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=60)
+        assert worker.exitcode == 0
+
+    queue = WorkQueue(generation.queue_db_path(queue_dir))
+    assert queue.counts.done == 20
+    assert queue.counts.finished
+    queue.close()
+
+    # Merge into an archive
+    monkeypatch.chdir(tmp_path)
+    archive_path = generation.merge_generation(queue_dir, archive_name=tmp_path / "a")
+    with zipfile.ZipFile(archive_path) as archive:
+        names = set(archive.namelist())
+    assert "data.parquet" in names
+    assert "session007/gsr.json" in names
+    assert "session007/ground-truth.json" in names
+
+
+def test_expired_lease_is_reclaimed(tmp_path: Path) -> None:
+    db_path = tmp_path / "queue.sqlite"
+    queue = WorkQueue(db_path, lease_seconds=0.1)
+    queue.enqueue({"a": {}, "b": {}})
+
+    # A worker claims a task then dies without heartbeating
+    dead_lease = queue.claim("dead-worker")
+    assert dead_lease is not None
+    time.sleep(0.2)
+
+    completed = run_worker(
+        db_path,
+        handler=lambda task_id, payload: {"task": task_id},
+        worker_id="live-worker",
+        lease_seconds=0.1,
+    )
+    assert sorted(completed) == ["a", "b"]
+    assert queue.results() == {"a": {"task": "a"}, "b": {"task": "b"}}
+
+    # The dead worker coming back can't overwrite the result
+    assert not queue.complete(dead_lease, {"task": "stale"})
+    assert not queue.heartbeat(dead_lease)
+    assert queue.results()["a"] == {"task": "a"}
+    queue.close()
+
+
+def test_reclaim_expired_records_error(tmp_path: Path) -> None:
+    queue = WorkQueue(tmp_path / "queue.sqlite", lease_seconds=0.05, max_attempts=1)
+    queue.enqueue({"a": {}})
+    assert queue.claim("dead-worker") is not None
+    time.sleep(0.1)
+
+    assert queue.reclaim_expired() == 1
+    assert queue.counts.failed == 1
+    assert "dead-worker" in queue.errors()["a"]
+    queue.close()
+
+
+def test_heartbeat_keeps_lease(tmp_path: Path) -> None:
+    db_path = tmp_path / "queue.sqlite"
+    queue = WorkQueue(db_path, lease_seconds=0.5)
+    queue.enqueue({"a": {}})
+
+    lease = queue.claim("worker")
+    assert lease is not None
+    for _ in range(3):
+        time.sleep(0.2)
+        assert queue.heartbeat(lease)
+    assert queue.claim("other-worker") is None
+    assert queue.complete(lease, {})
+    queue.close()
+
+
+def test_failed_tasks_retry_then_fail(tmp_path: Path) -> None:
+    db_path = tmp_path / "queue.sqlite"
+    queue = WorkQueue(db_path)
+    queue.enqueue({"a": {}})
+
+    assert run_worker(db_path, handler=_always_fails, max_attempts=2) == []
+    counts = queue.counts
+    assert counts.failed == 1
+    assert counts.finished
+    assert "Could not transcribe a" in queue.errors()["a"]
+
+    # Merging refuses incomplete queues
+    with pytest.raises(ValueError):
+        generation.merge_generation(tmp_path)
+    queue.close()
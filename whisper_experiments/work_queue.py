@@ -0,0 +1,572 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Optional, Union
+
+###############################################################################
+
+log = logging.getLogger(__name__)
+
+###############################################################################
+
+DEFAULT_LEASE_SECONDS = 300.0
+DEFAULT_MAX_ATTEMPTS = 3
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    worker_id TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL,
+    result TEXT,
+    error TEXT,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_expires);
+"""
+
+###############################################################################
+
+
+class TaskStatus:
+    pending = "pending"
+    leased = "leased"
+    done = "done"
+    failed = "failed"
+
+
+class Lease(NamedTuple):
+    # The claimed task
+    task_id: str
+    # The JSON payload the task was enqueued with
+    payload: Dict[str, Any]
+    # The worker holding the lease
+    worker_id: str
+    # Which attempt at the task this is (starting at 1)
+    attempt: int
+
+
+class QueueCounts(NamedTuple):
+    pending: int
+    leased: int
+    done: int
+    failed: int
+
+    @property
+    def total(self) -> int:
+        return self.pending + self.leased + self.done + self.failed
+
+    @property
+    def finished(self) -> bool:
+        """
+        Returns
+        -------
+        bool
+            Whether every task is either done or has permanently failed.
+        """
+        return self.pending == 0 and self.leased == 0
+
+
+def default_worker_id() -> str:
+    """
+    Returns
+    -------
+    str
+        A worker id unique across machines and processes: "{host}-{pid}-{random}".
+    """
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}"
+
+
+def _expired_lease_error(worker_id: str, attempt: int) -> str:
+    return (
+        f"Lease expired: worker {worker_id} stopped heartbeating on attempt {attempt}"
+    )
+
+
+class WorkQueue:
+    """
+    A lease-based task queue stored in a single SQLite database.
+
+    Any number of worker processes can claim tasks from the same queue. A
+    claimed task is leased to its worker for a fixed number of seconds and the
+    worker must heartbeat to keep it. Tasks whose lease expires (because the
+    worker crashed or hung) are handed to the next worker that asks for work.
+
+    Notes
+    -----
+    The database uses SQLite's rollback journal rather than WAL, because WAL
+    relies on shared memory that only works between processes on one host.
+    Workers on several machines can share the queue through a network
+    filesystem only if it implements POSIX advisory (fcntl) byte-range locks,
+    e.g. NFSv4 or NFSv3 with a working lockd. Filesystems that ignore or
+    emulate those locks (some SMB mounts, FUSE object-store mounts, NFS
+    mounted with nolock) can let two workers claim the same task.
+    """
+
+    def __init__(
+        self,
+        db_path: Union[str, Path],
+        lease_seconds: float = DEFAULT_LEASE_SECONDS,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        timeout: float = 60.0,
+    ):
+        """
+        Parameters
+        ----------
+        db_path: Union[str, Path]
+            The path to the queue database. Created if it doesn't exist.
+        lease_seconds: float
+            How long a claim (or heartbeat) holds a task before other workers
+            may reclaim it.
+            Default: 300
+        max_attempts: int
+            How many times a task is tried before it is marked as failed.
+            Default: 3
+        timeout: float
+            Seconds to wait for another process to release the database lock.
+            Default: 60
+        """
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        self._conn = sqlite3.connect(
+            self.db_path,
+            timeout=timeout,
+            isolation_level=None,
+            check_same_thread=False,
+        )
+        # WAL needs shared memory, which doesn't work across hosts
+        self._conn.execute("PRAGMA journal_mode=DELETE")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        # executescript manages its own transaction
+        self._conn.executescript(f"BEGIN IMMEDIATE;{_SCHEMA}COMMIT;")
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Cursor]:
+        # IMMEDIATE takes the write lock up front so two workers can never
+        # read the same pending task and both claim it
+        cursor = self._conn.cursor()
+        cursor.execute("BEGIN IMMEDIATE")
+        try:
+            yield cursor
+            cursor.execute("COMMIT")
+        except BaseException:
+            cursor.execute("ROLLBACK")
+            raise
+        finally:
+            cursor.close()
+
+    def enqueue(self, tasks: Dict[str, Dict[str, Any]]) -> int:
+        """
+        Add tasks to the queue. Tasks already in the queue are left untouched,
+        so enqueueing the same work twice is safe.
+
+        Parameters
+        ----------
+        tasks: Dict[str, Dict[str, Any]]
+            Mapping of unique task id to a JSON serializable payload.
+
+        Returns
+        -------
+        int
+            The number of newly added tasks.
+        """
+        now = time.time()
+        with self._transaction() as cursor:
+            cursor.executemany(
+                "INSERT OR IGNORE INTO tasks "
+                "(task_id, payload, status, attempts, updated) VALUES (?, ?, ?, 0, ?)",
+                [
+                    (task_id, json.dumps(payload), TaskStatus.pending, now)
+                    for task_id, payload in tasks.items()
+                ],
+            )
+            return cursor.rowcount
+
+    def claim(self, worker_id: str) -> Optional[Lease]:
+        """
+        Lease the next available task, reclaiming an expired lease if there are
+        no pending tasks.
+
+        Parameters
+        ----------
+        worker_id: str
+            The id of the worker claiming the task.
+
+        Returns
+        -------
+        Optional[Lease]
+            The claimed task. None if there is nothing available to claim.
+        """
+        now = time.time()
+        with self._transaction() as cursor:
+            return self._claim_next(cursor, worker_id, now)
+
+    def _claim_next(
+        self,
+        cursor: sqlite3.Cursor,
+        worker_id: str,
+        now: float,
+    ) -> Optional[Lease]:
+        while True:
+            row = cursor.execute(
+                "SELECT task_id, payload, attempts, status, worker_id FROM tasks "
+                "WHERE status = ? OR (status = ? AND lease_expires < ?) "
+                "ORDER BY status = ?, task_id LIMIT 1",
+                (TaskStatus.pending, TaskStatus.leased, now, TaskStatus.leased),
+            ).fetchone()
+            if row is None:
+                return None
+
+            task_id, payload, attempts, status, previous_worker_id = row
+            if status == TaskStatus.leased:
+                # The previous worker died or hung mid-task
+                cursor.execute(
+                    "UPDATE tasks SET error = ? WHERE task_id = ?",
+                    (_expired_lease_error(previous_worker_id, attempts), task_id),
+                )
+            if attempts < self.max_attempts:
+                return self._lease(cursor, worker_id, task_id, payload, attempts, now)
+
+            cursor.execute(
+                "UPDATE tasks SET status = ?, worker_id = NULL, "
+                "lease_expires = NULL, updated = ? WHERE task_id = ?",
+                (TaskStatus.failed, now, task_id),
+            )
+
+    def _lease(
+        self,
+        cursor: sqlite3.Cursor,
+        worker_id: str,
+        task_id: str,
+        payload: str,
+        attempts: int,
+        now: float,
+    ) -> Lease:
+        cursor.execute(
+            "UPDATE tasks SET status = ?, worker_id = ?, lease_expires = ?, "
+            "attempts = ?, updated = ? WHERE task_id = ?",
+            (
+                TaskStatus.leased,
+                worker_id,
+                now + self.lease_seconds,
+                attempts + 1,
+                now,
+                task_id,
+            ),
+        )
+        return Lease(
+            task_id=task_id,
+            payload=json.loads(payload),
+            worker_id=worker_id,
+            attempt=attempts + 1,
+        )
+
+    def _update_owned(self, lease: Lease, assignments: str, values: tuple) -> bool:
+        # Only the worker currently holding this attempt's lease may update the task
+        with self._transaction() as cursor:
+            cursor.execute(
+                f"UPDATE tasks SET {assignments}, updated = ? "
+                "WHERE task_id = ? AND status = ? AND worker_id = ? AND attempts = ?",
+                (
+                    *values,
+                    time.time(),
+                    lease.task_id,
+                    TaskStatus.leased,
+                    lease.worker_id,
+                    lease.attempt,
+                ),
+            )
+            return cursor.rowcount == 1
+
+    def heartbeat(self, lease: Lease) -> bool:
+        """
+        Extend a lease by another lease_seconds.
+
+        Parameters
+        ----------
+        lease: Lease
+            The lease to extend.
+
+        Returns
+        -------
+        bool
+            Whether the lease is still held. False if it expired and was
+            reclaimed by another worker.
+        """
+        return self._update_owned(
+            lease, "lease_expires = ?", (time.time() + self.lease_seconds,)
+        )
+
+    def complete(self, lease: Lease, result: Dict[str, Any]) -> bool:
+        """
+        Mark a leased task as done and store its result.
+
+        Parameters
+        ----------
+        lease: Lease
+            The lease of the finished task.
+        result: Dict[str, Any]
+            A JSON serializable result to store with the task.
+
+        Returns
+        -------
+        bool
+            Whether the result was stored. False if the lease was lost to another
+            worker, in which case the other worker's result will be kept.
+        """
+        return self._update_owned(
+            lease,
+            "status = ?, result = ?, lease_expires = NULL, error = NULL",
+            (TaskStatus.done, json.dumps(result)),
+        )
+
+    def fail(self, lease: Lease, error: str) -> bool:
+        """
+        Release a leased task after an error. The task goes back to pending
+        unless it has used all of its attempts.
+
+        Parameters
+        ----------
+        lease: Lease
+            The lease of the failed task.
+        error: str
+            A description of the error, stored with the task.
+
+        Returns
+        -------
+        bool
+            Whether the lease was still held when released.
+        """
+        status = (
+            TaskStatus.failed
+            if lease.attempt >= self.max_attempts
+            else TaskStatus.pending
+        )
+        return self._update_owned(
+            lease,
+            "status = ?, error = ?, worker_id = NULL, lease_expires = NULL",
+            (status, error),
+        )
+
+    def reclaim_expired(self) -> int:
+        """
+        Put every task with an expired lease back to pending (or failed if it
+        has used all of its attempts), storing which worker's lease expired as
+        the task's error.
+
+        Returns
+        -------
+        int
+            The number of reclaimed tasks.
+
+        Notes
+        -----
+        Workers reclaim expired leases on their own when claiming, this is only
+        needed to get accurate counts or to hand tasks back early.
+        """
+        now = time.time()
+        with self._transaction() as cursor:
+            expired = cursor.execute(
+                "SELECT task_id, worker_id, attempts FROM tasks "
+                "WHERE status = ? AND lease_expires < ?",
+                (TaskStatus.leased, now),
+            ).fetchall()
+            cursor.executemany(
+                "UPDATE tasks SET status = ?, worker_id = NULL, "
+                "lease_expires = NULL, error = ?, updated = ? WHERE task_id = ?",
+                [
+                    (
+                        TaskStatus.failed
+                        if attempts >= self.max_attempts
+                        else TaskStatus.pending,
+                        _expired_lease_error(worker_id, attempts),
+                        now,
+                        task_id,
+                    )
+                    for task_id, worker_id, attempts in expired
+                ],
+            )
+            return len(expired)
+
+    @property
+    def counts(self) -> QueueCounts:
+        """
+        Returns
+        -------
+        QueueCounts
+            The number of tasks in each status.
+        """
+        values = dict(
+            self._conn.execute(
+                "SELECT status, COUNT(*) FROM tasks GROUP BY status"
+            ).fetchall()
+        )
+        return QueueCounts(
+            pending=values.get(TaskStatus.pending, 0),
+            leased=values.get(TaskStatus.leased, 0),
+            done=values.get(TaskStatus.done, 0),
+            failed=values.get(TaskStatus.failed, 0),
+        )
+
+    def results(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Returns
+        -------
+        Dict[str, Dict[str, Any]]
+            Mapping of task id to stored result for every done task.
+        """
+        return {
+            task_id: json.loads(result)
+            for task_id, result in self._conn.execute(
+                "SELECT task_id, result FROM tasks WHERE status = ? ORDER BY task_id",
+                (TaskStatus.done,),
+            )
+        }
+
+    def errors(self) -> Dict[str, str]:
+        """
+        Returns
+        -------
+        Dict[str, str]
+            Mapping of task id to the last stored error for every failed task.
+        """
+        return dict(
+            self._conn.execute(
+                "SELECT task_id, error FROM tasks WHERE status = ? ORDER BY task_id",
+                (TaskStatus.failed,),
+            ).fetchall()
+        )
+
+    def close(self) -> None:
+        """
+        Close the connection to the queue database.
+        """
+        self._conn.close()
+
+
+###############################################################################
+
+
+def _heartbeat_until_stopped(
+    db_path: Path,
+    lease_seconds: float,
+    lease: Lease,
+    interval: float,
+    stopped: threading.Event,
+) -> None:
+    # Own connection, the worker's connection is busy in the main thread
+    queue = WorkQueue(db_path, lease_seconds=lease_seconds)
+    try:
+        while not stopped.wait(interval):
+            if not queue.heartbeat(lease):
+                log.warning(f"Lost lease on task {lease.task_id} to another worker")
+                return
+    finally:
+        queue.close()
+
+
+def run_worker(
+    db_path: Union[str, Path],
+    handler: Callable[[str, Dict[str, Any]], Dict[str, Any]],
+    worker_id: Optional[str] = None,
+    lease_seconds: float = DEFAULT_LEASE_SECONDS,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    heartbeat_interval: Optional[float] = None,
+    poll_interval: float = 5.0,
+    max_tasks: Optional[int] = None,
+) -> List[str]:
+    """
+    Claim and process tasks from a queue until no work is left.
+
+    Parameters
+    ----------
+    db_path: Union[str, Path]
+        The path to the queue database.
+    handler: Callable[[str, Dict[str, Any]], Dict[str, Any]]
+        The function to process a task with. Called with the task id and
+        payload, returns the JSON serializable result to store.
+        Any exception fails the attempt and the task is retried later.
+    worker_id: Optional[str]
+        The id to claim tasks with.
+        Default: None (use default_worker_id())
+    lease_seconds: float
+        How long a claim (or heartbeat) holds a task.
+        Default: 300
+    max_attempts: int
+        How many times a task is tried before it is marked as failed.
+        Default: 3
+    heartbeat_interval: Optional[float]
+        Seconds between heartbeats while a task is processed.
+        Default: None (a third of lease_seconds)
+    poll_interval: float
+        Seconds to wait before checking again when nothing can be claimed
+        but other workers still hold leases that may expire.
+        Default: 5
+    max_tasks: Optional[int]
+        Stop after processing this many tasks.
+        Default: None (run until the queue is finished)
+
+    Returns
+    -------
+    List[str]
+        The ids of the tasks this worker completed.
+    """
+    db_path = Path(db_path)
+    if worker_id is None:
+        worker_id = default_worker_id()
+    if heartbeat_interval is None:
+        heartbeat_interval = lease_seconds / 3
+
+    queue = WorkQueue(db_path, lease_seconds=lease_seconds, max_attempts=max_attempts)
+    completed: List[str] = []
+    n_processed = 0
+    try:
+        while max_tasks is None or n_processed < max_tasks:
+            lease = queue.claim(worker_id)
+            if lease is None:
+                # Other workers may still die and leave their tasks behind
+                if queue.counts.finished:
+                    break
+                time.sleep(poll_interval)
+                continue
+
+            n_processed += 1
+            log.debug(f"{worker_id} claimed {lease.task_id} (attempt {lease.attempt})")
+            stopped = threading.Event()
+            heartbeat = threading.Thread(
+                target=_heartbeat_until_stopped,
+                args=(db_path, lease_seconds, lease, heartbeat_interval, stopped),
+                daemon=True,
+            )
+            heartbeat.start()
+            try:
+                result = handler(lease.task_id, lease.payload)
+            except Exception as e:
+                log.error(f"{worker_id} failed {lease.task_id}: {e!r}")
+                queue.fail(lease, repr(e))
+                continue
+            finally:
+                stopped.set()
+                heartbeat.join()
+
+            if queue.complete(lease, result):
+                completed.append(lease.task_id)
+    finally:
+        queue.close()
+
+    return completed